@@ -0,0 +1,68 @@
+# Configuración de gunicorn para servir la API (docker-compose, Dockerfile)
+# Todos los valores se pueden ajustar por variables de entorno.
+# ``config`` es a su vez un ajuste de gunicorn: no usar ese nombre aquí
+from decouple import config as env
+import math
+import os
+
+
+def _cpus_disponibles():
+    """CPUs asignadas al contenedor: cpuset y cuota de cgroup (v2 o v1), no las del host"""
+    cpus = len(os.sched_getaffinity(0))
+    try:
+        with open('/sys/fs/cgroup/cpu.max') as archivo:
+            cuota, periodo = archivo.read().split()
+        if cuota != 'max':
+            cpus = min(cpus, math.ceil(int(cuota) / int(periodo)))
+    except (OSError, ValueError):
+        try:
+            with open('/sys/fs/cgroup/cpu/cpu.cfs_quota_us') as archivo:
+                cuota = int(archivo.read())
+            with open('/sys/fs/cgroup/cpu/cpu.cfs_period_us') as archivo:
+                periodo = int(archivo.read())
+            if cuota > 0:
+                cpus = min(cpus, math.ceil(cuota / periodo))
+        except (OSError, ValueError):
+            pass
+    return max(cpus, 1)
+
+
+bind = env('GUNICORN_BIND', default='0.0.0.0:8000')
+
+# Workers por CPU del contenedor, con tope; gthread atiende varias peticiones
+# por worker mientras esperan a la base o a Redis (la API es casi toda E/S).
+#
+# Presupuesto de conexiones a Postgres: cada hilo usa a lo sumo una conexión
+# (persistente con DB_POOL_MODE=persistent, del pool del proceso con 'pool'),
+# así que cada réplica web abre hasta workers × threads. El total
+#   réplicas web × workers × threads + réplicas celery × concurrency + beat
+# debe quedar por debajo de max_connections (100 por defecto) menos las
+# reservadas; docker-compose.prod.yml fija estos valores explícitamente.
+workers = env('GUNICORN_WORKERS', default=min(_cpus_disponibles() * 2 + 1, env('GUNICORN_MAX_WORKERS', default=8, cast=int)), cast=int)
+worker_class = env('GUNICORN_WORKER_CLASS', default='gthread')
+threads = env('GUNICORN_THREADS', default=4, cast=int)
+
+# Reciclar workers periódicamente (fugas de memoria de Pillow/imágenes)
+max_requests = env('GUNICORN_MAX_REQUESTS', default=1000, cast=int)
+max_requests_jitter = env('GUNICORN_MAX_REQUESTS_JITTER', default=100, cast=int)
+
+timeout = env('GUNICORN_TIMEOUT', default=30, cast=int)
+graceful_timeout = env('GUNICORN_GRACEFUL_TIMEOUT', default=30, cast=int)
+keepalive = env('GUNICORN_KEEPALIVE', default=5, cast=int)
+
+# En desarrollo se recarga al cambiar el código; preload no es compatible con reload
+reload = env('GUNICORN_RELOAD', default=False, cast=bool)
+preload_app = not reload
+
+# Heartbeat de workers en memoria (evita bloqueos con /tmp en overlayfs)
+worker_tmp_dir = '/dev/shm'
+
+accesslog = '-'
+errorlog = '-'
+loglevel = env('GUNICORN_LOGLEVEL', default='info')
+
+
+def post_fork(server, worker):
+    # Con preload cada worker abre sus propias conexiones, nunca las del master
+    from django.db import connections
+    connections.close_all()
@@ -1,9 +1,12 @@
 from django.contrib import admin
+from django.core.files.storage import default_storage
 from django.utils.html import format_html
 from django.db.models import Count, Q
 from django.urls import reverse
 from django.utils.safestring import mark_safe
-from .models import TipoProducto, Producto, FechaProducto
+from django.utils import timezone
+from .models import TipoProducto, Producto, FechaProducto, SyncCheckpoint, DescargaFallida, BackfillProgreso, AnimacionWRF
+from .derivadas import imagen_urls
 import datetime
 
 @admin.register(TipoProducto)
@@ -14,7 +17,7 @@ class TipoProductoAdmin(admin.ModelAdmin):
     
     fieldsets = (
         ('📊 Información General', {
-            'fields': ('nombre', 'descripcion', 'url')
+            'fields': ('nombre', 'descripcion', 'url', 'prioridad', 'retencion_dias')
         }),
         ('📈 Estadísticas', {
             'fields': ('productos_count', 'ultima_actualizacion'),
@@ -136,10 +139,13 @@ class ProductoAdmin(admin.ModelAdmin):
     variable_badge.short_description = 'Variable'
     
     def imagen_preview_small(self, obj):
-        if obj.url_imagen:
+        # Miniatura generada si existe; si no, la imagen guardada o la externa
+        urls = imagen_urls(obj)
+        src = urls['thumb'] if urls else (obj.foto.url if obj.foto else obj.url_imagen)
+        if src:
             return format_html(
                 '<img src="{}" style="width: 50px; height: 50px; object-fit: cover; border-radius: 4px;" onerror="this.style.display=\'none\'" />',
-                obj.url_imagen
+                src
             )
         return "📷"
     imagen_preview_small.short_description = 'Vista Previa'
@@ -249,6 +255,50 @@ class FechaProductoAdmin(admin.ModelAdmin):
         return "-"
     tiempo_transcurrido.short_description = 'Creado'
 
+@admin.register(SyncCheckpoint)
+class SyncCheckpointAdmin(admin.ModelAdmin):
+    list_display = ['tipo_producto', 'fecha', 'corrida', 'variable', 'progreso', 'completo', 'actualizado']
+    list_filter = ['tipo_producto', 'completo', 'corrida', 'variable']
+    date_hierarchy = 'fecha'
+    list_per_page = 50
+    
+    def progreso(self, obj):
+        color = '#4caf50' if obj.completo else '#ff9800'
+        return format_html(
+            '<span style="color: {};">{}/{}</span>',
+            color, obj.frames_descargados, obj.frames_esperados
+        )
+    progreso.short_description = 'Frames'
+
+@admin.register(DescargaFallida)
+class DescargaFallidaAdmin(admin.ModelAdmin):
+    list_display = ['url', 'intentos', 'ultimo_estado', 'ultimo_intento', 'proximo_intento', 'abandonada']
+    list_filter = ['abandonada', 'ultimo_estado']
+    search_fields = ['url']
+    actions = ['reintentar']
+    
+    @admin.action(description='🔁 Reintentar en la próxima sincronización')
+    def reintentar(self, request, queryset):
+        actualizadas = queryset.update(abandonada=False, proximo_intento=timezone.now())
+        self.message_user(request, f'{actualizadas} URLs habilitadas para reintentar')
+
+@admin.register(BackfillProgreso)
+class BackfillProgresoAdmin(admin.ModelAdmin):
+    list_display = ['iniciado', 'terminado', 'motivo', 'procesados', 'descargados', 'bytes']
+    list_filter = ['motivo']
+    readonly_fields = ['iniciado', 'actualizado', 'terminado', 'motivo', 'cursor', 'procesados', 'descargados', 'bytes']
+
+@admin.register(AnimacionWRF)
+class AnimacionWRFAdmin(admin.ModelAdmin):
+    list_display = ['variable', 'fecha_corrida', 'corrida', 'frames', 'ver_animacion', 'actualizada']
+    list_filter = ['variable', 'corrida']
+    date_hierarchy = 'fecha_corrida'
+    readonly_fields = ['actualizada']
+    
+    def ver_animacion(self, obj):
+        return format_html('<a href="{}" target="_blank">🎞️ Ver</a>', default_storage.url(obj.imagen))
+    ver_animacion.short_description = 'Animación'
+
 # Personalizar el admin principal
 admin.site.site_header = "🌤️ OHMC - Observatorio Hidrometeorológico"
 admin.site.site_title = "OHMC Admin"
@@ -0,0 +1,84 @@
+from io import BytesIO
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.storage import default_storage
+from PIL import Image, features
+from .models import AnimacionWRF, ForecastFrame
+from .storage import store_bytes
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def nombre_animacion(fecha_corrida, corrida, variable):
+    return f"{variable}-{fecha_corrida:%Y-%m-%d}_{int(corrida):02d}.{settings.WRF_ANIMACION_FORMATO}"
+
+
+def _cargar_frame(imagen):
+    """Abrir un frame guardado, reducido al ancho máximo configurado"""
+    with default_storage.open(imagen, 'rb') as archivo:
+        frame = Image.open(archivo)
+        frame.load()
+    frame = frame.convert('RGBA')
+    ancho_max = settings.WRF_ANIMACION_ANCHO_MAX
+    if ancho_max and frame.width > ancho_max:
+        frame = frame.resize((ancho_max, round(frame.height * ancho_max / frame.width)), Image.LANCZOS)
+    return frame
+
+
+def codificar_animacion(imagenes):
+    """Armar la animación en el formato de WRF_ANIMACION_FORMATO (WebP animado o GIF)"""
+    formato = settings.WRF_ANIMACION_FORMATO
+    if formato == 'webp' and not features.check('webp_anim'):
+        raise ImproperlyConfigured("Pillow no soporta WebP animado: usar WRF_ANIMACION_FORMATO='gif'")
+    frames = [_cargar_frame(imagen) for imagen in imagenes]
+    buffer = BytesIO()
+    opciones = {
+        'save_all': True,
+        'append_images': frames[1:],
+        'duration': settings.WRF_ANIMACION_FRAME_MS,
+        'loop': 0,
+    }
+    if formato == 'webp':
+        frames[0].save(buffer, format='WEBP', quality=settings.WRF_ANIMACION_CALIDAD, method=4, **opciones)
+    else:
+        frames[0].save(buffer, format='GIF', optimize=True, **opciones)
+    return buffer.getvalue()
+
+
+def construir_animacion(fecha_corrida, corrida, variable):
+    """Generar y registrar la animación de una corrida WRF.
+
+    Usa los frames ya descargados de la corrida (en orden de plazo) y guarda el
+    resultado en el almacén por hash. Se registra en AnimacionWRF, fuera de
+    los productos publicados: sólo se expone en /api/wrf/animacion/. Devuelve
+    la AnimacionWRF o None si la corrida no tiene frames con imagen.
+    """
+    imagenes = list(
+        ForecastFrame.objects.filter(
+            variable=variable, fecha_corrida=fecha_corrida, corrida=int(corrida)
+        ).exclude(imagen='').order_by('lead').values_list('imagen', flat=True)
+    )
+    if not imagenes:
+        return None
+
+    nombre = nombre_animacion(fecha_corrida, corrida, variable)
+    name, sha256, size = store_bytes(codificar_animacion(imagenes), nombre)
+
+    # La animación anterior, si cambió, la borra el barrido de huérfanos
+    animacion, _ = AnimacionWRF.objects.update_or_create(
+        variable=variable,
+        fecha_corrida=fecha_corrida,
+        corrida=int(corrida),
+        defaults={'imagen': name, 'frames': len(imagenes)},
+    )
+
+    logger.info(f"Animación {nombre}: {len(imagenes)} frames, {size} bytes")
+    return animacion
+
+
+def url_animacion(fecha_corrida, corrida, variable):
+    """Ruta guardada de la animación de una corrida, si ya fue generada"""
+    return AnimacionWRF.objects.filter(
+        variable=variable, fecha_corrida=fecha_corrida, corrida=int(corrida)
+    ).values_list('imagen', flat=True).first()
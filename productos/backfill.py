@@ -0,0 +1,160 @@
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Exists, F, OuterRef, Q, Value
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+from .downloader import download_batch
+from .models import SIN_FECHA, Producto, DescargaFallida, BackfillProgreso
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# Clave del pg_advisory_xact_lock que serializa el inicio de las pasadas
+BACKFILL_LOCK = 0x5b4cf11
+
+def candidatos(desde=None):
+    """Productos sin imagen, del día más reciente al más antiguo y por prioridad del tipo.
+
+    Excluye las URLs que el registro de descargas fallidas mantiene en espera.
+    ``desde`` es el cursor del último producto procesado. El orden por día y
+    hora válida sale del índice parcial ``producto_sin_foto_idx``.
+    """
+    en_espera = DescargaFallida.objects.filter(url=OuterRef('url_imagen')).filter(
+        Q(abandonada=True) | Q(proximo_intento__gt=timezone.now())
+    )
+    queryset = (
+        Producto.objects.filter(Q(foto__isnull=True) | Q(foto=''))
+        .exclude(Exists(en_espera))
+        .annotate(
+            valida=Coalesce('ultima_valida', Value(SIN_FECHA)),
+            dia=TruncDate('valida', tzinfo=dt_timezone.utc),
+            prioridad=F('tipo_producto__prioridad'),
+        )
+        .order_by('-dia', '-prioridad', '-valida', '-id')
+    )
+    if desde:
+        dia, prioridad, valida, pk = clave_cursor(desde)
+        # dia <= cursor permite empezar el recorrido del índice en la posición del cursor
+        queryset = queryset.filter(dia__lte=dia).filter(
+            Q(dia__lt=dia)
+            | Q(dia=dia, prioridad__lt=prioridad)
+            | Q(dia=dia, prioridad=prioridad, valida__lt=valida)
+            | Q(dia=dia, prioridad=prioridad, valida=valida, id__lt=pk)
+        )
+    return queryset
+
+
+def cursor(producto):
+    return [producto.dia.isoformat(), producto.prioridad, producto.valida.isoformat(), producto.pk]
+
+
+def clave_cursor(desde):
+    """Cursor guardado como tupla comparable ``(día, prioridad, válida, id)``"""
+    return date.fromisoformat(desde[0]), desde[1], datetime.fromisoformat(desde[2]), desde[3]
+
+
+def hay_mas_recientes(desde):
+    """Si la cola tiene candidatos antes del cursor (publicados después de que se guardó)"""
+    primero = candidatos().first()
+    return primero is not None and clave_cursor(cursor(primero)) > clave_cursor(desde)
+
+
+def iniciar():
+    """Reanudar la pasada interrumpida más reciente o empezar una nueva.
+
+    Devuelve None si hay otra pasada en curso (actualizada hace poco). La
+    consulta y la creación van bajo un advisory lock: el backfill se encola
+    tras cada sincronización y también desde beat, y dos workers no deben
+    abrir pasadas a la vez. Si desde el corte se publicaron frames que van
+    antes del cursor, se cierra la pasada y se empieza otra desde el frente.
+    """
+    with transaction.atomic():
+        with connection.cursor() as db:
+            db.execute('SELECT pg_advisory_xact_lock(%s)', [BACKFILL_LOCK])
+
+        anterior = BackfillProgreso.objects.filter(terminado__isnull=True).first()
+        if anterior is None:
+            return BackfillProgreso.objects.create()
+        if timezone.now() - anterior.actualizado < timedelta(seconds=settings.BACKFILL_MAX_SEGUNDOS * 2):
+            return None
+
+        if anterior.cursor and hay_mas_recientes(anterior.cursor):
+            logger.info(f"Backfill interrumpido de {anterior.iniciado} superado por candidatos nuevos, se reinicia")
+            anterior.motivo = 'reiniciado'
+            anterior.terminado = timezone.now()
+            anterior.save(update_fields=['motivo', 'terminado', 'actualizado'])
+            return BackfillProgreso.objects.create()
+
+        logger.info(f"Reanudando backfill interrumpido de {anterior.iniciado} en {anterior.cursor}")
+        # Tomarla: otro worker la verá actualizada y no la reanudará también
+        anterior.save(update_fields=['actualizado'])
+        return anterior
+
+
+def ejecutar_backfill(max_bytes=None, max_segundos=None, chunk_size=None):
+    """Descargar imágenes faltantes por lotes hasta vaciar la cola o agotar el presupuesto.
+
+    El cursor se guarda después de cada lote: si el proceso se corta, la
+    próxima pasada sigue desde ahí. Devuelve el BackfillProgreso o None si
+    otra pasada está en curso.
+    """
+    max_bytes = max_bytes or settings.BACKFILL_MAX_BYTES
+    max_segundos = max_segundos or settings.BACKFILL_MAX_SEGUNDOS
+    chunk_size = chunk_size or settings.BACKFILL_CHUNK_SIZE
+
+    progreso = iniciar()
+    if progreso is None:
+        return None
+
+    inicio = time.monotonic()
+    motivo = None
+    lote = []
+    # Corridas WRF con frames recién descargados: su animación quedó incompleta
+    celdas = set()
+
+    def procesar(lote):
+        resultado = download_batch(lote)
+        celdas.update(resultado.celdas)
+        progreso.procesados += len(lote)
+        progreso.descargados += resultado.cambiados
+        progreso.bytes += resultado.bytes
+        progreso.cursor = cursor(lote[-1])
+        progreso.save(update_fields=['procesados', 'descargados', 'bytes', 'cursor', 'actualizado'])
+
+    def agotado():
+        if progreso.bytes >= max_bytes:
+            return 'bytes'
+        if time.monotonic() - inicio >= max_segundos:
+            return 'tiempo'
+        return None
+
+    try:
+        for producto in candidatos(progreso.cursor).iterator(chunk_size=chunk_size):
+            lote.append(producto)
+            if len(lote) == chunk_size:
+                procesar(lote)
+                lote = []
+                motivo = agotado()
+                if motivo:
+                    break
+        else:
+            if lote:
+                procesar(lote)
+            motivo = 'completo'
+    finally:
+        # Un error deja la pasada abierta para reanudarla desde el cursor
+        progreso.motivo = motivo or 'error'
+        if motivo:
+            progreso.terminado = timezone.now()
+        progreso.save(update_fields=['motivo', 'terminado', 'actualizado'])
+        if celdas:
+            from .tasks import build_wrf_animations
+            build_wrf_animations.delay([[fecha.isoformat(), corrida, variable] for fecha, corrida, variable in sorted(celdas)])
+
+    logger.info(
+        f"Backfill ({motivo}): {progreso.descargados}/{progreso.procesados} imágenes, "
+        f"{progreso.bytes} bytes en {time.monotonic() - inicio:.1f}s"
+    )
+    return progreso
@@ -0,0 +1,104 @@
+from functools import wraps
+from datetime import date
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.response import Response
+import hashlib
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# Versión compartida por los endpoints que agregan todos los tipos de producto
+TODOS = '__todos__'
+
+
+# Hasta cuándo (reloj monotónico) se saltea Redis tras un error en este proceso
+_principal_caida_hasta = 0.0
+
+
+def _principal_disponible():
+    return time.monotonic() >= _principal_caida_hasta
+
+
+def _marcar_caida(e):
+    """Abrir el circuito: con Redis colgado cada operación esperaría el timeout del socket"""
+    global _principal_caida_hasta
+    _principal_caida_hasta = time.monotonic() + settings.CACHE_FALLBACK_SECONDS
+    logger.warning(
+        f"Caché principal no disponible ({e}), usando la local por {settings.CACHE_FALLBACK_SECONDS}s"
+    )
+
+
+def _get(key):
+    """Leer de la caché principal (Redis) y, si no responde, de la local"""
+    if _principal_disponible():
+        try:
+            return caches['default'].get(key)
+        except Exception as e:
+            _marcar_caida(e)
+    return caches['local'].get(key)
+
+
+def _set(key, value, timeout):
+    if _principal_disponible():
+        try:
+            caches['default'].set(key, value, timeout)
+            return
+        except Exception as e:
+            _marcar_caida(e)
+    caches['local'].set(key, value, min(timeout or settings.CACHE_LOCAL_TIMEOUT, settings.CACHE_LOCAL_TIMEOUT))
+
+
+def _version_key(tipo):
+    return f"productos:version:{tipo}"
+
+
+def version(tipo=TODOS):
+    """Versión actual de los datos de un tipo de producto"""
+    actual = _get(_version_key(tipo))
+    if actual is None:
+        # Si la versión se perdió (reinicio o desalojo) se arranca una nueva
+        actual = time.time_ns()
+        _set(_version_key(tipo), actual, None)
+    return actual
+
+
+def invalidar(*tipos):
+    """Publicar una versión nueva para esos tipos (y la global) tras una sincronización"""
+    nueva = time.time_ns()
+    for tipo in {*tipos, TODOS}:
+        _set(_version_key(tipo), nueva, None)
+    logger.info(f"Caché invalidada para {', '.join(sorted(tipos)) or 'todos los tipos'}")
+
+
+def cache_key(nombre, tipo, request, diario=False):
+    params = sorted(request.query_params.lists())
+    firma = hashlib.md5(f"{request.get_host()}|{params}".encode()).hexdigest()
+    dia = f":{date.today().isoformat()}" if diario else ''
+    return f"productos:{nombre}:{tipo}:{version(tipo)}{dia}:{firma}"
+
+
+def cached_endpoint(nombre, tipo_param=None, default_tipo=None, diario=False):
+    """Cachear la respuesta de un endpoint GET hasta la próxima sincronización.
+
+    Si se indica ``tipo_param`` la clave usa la versión del tipo de producto
+    pedido; si no, la versión global. ``diario`` agrega la fecha a la clave
+    para los endpoints que dependen del día actual.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            tipo = request.query_params.get(tipo_param, default_tipo) if tipo_param else default_tipo
+            key = cache_key(nombre, tipo or TODOS, request, diario)
+
+            data = _get(key)
+            if data is not None:
+                return Response(data)
+
+            response = view(request, *args, **kwargs)
+            if response.status_code == 200:
+                _set(key, response.data, settings.CACHE_TIMEOUT)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,88 @@
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+from PIL import Image
+from .models import Producto
+from .storage import _tmp_dir
+import logging
+import os
+import tempfile
+
+logger = logging.getLogger(__name__)
+
+
+def nombre_derivada(sha256, tamano):
+    """Ruta de una variante: derivadas/ab/abcdef...-thumb.webp"""
+    return f"derivadas/{sha256[:2]}/{sha256}-{tamano}.webp"
+
+
+def generar_derivadas(sha256, forzar=False):
+    """Generar las variantes WebP de un contenido y marcar sus productos.
+
+    Las variantes se derivan del hash, así que los productos que comparten la
+    misma imagen comparten también sus miniaturas. Devuelve cuántas se crearon.
+    """
+    origen = Producto.objects.filter(sha256=sha256).exclude(foto='').values_list('foto', flat=True).first()
+    if not origen:
+        return 0
+
+    creadas = 0
+    with default_storage.open(origen, 'rb') as archivo:
+        imagen = Image.open(archivo)
+        imagen.load()
+    imagen = imagen.convert('RGBA')
+
+    for tamano, ancho in settings.IMAGEN_DERIVADAS.items():
+        destino = default_storage.path(nombre_derivada(sha256, tamano))
+        if not forzar:
+            try:
+                # Renovar el mtime: el barrido de huérfanos respeta el período de gracia
+                os.utime(destino)
+                continue
+            except FileNotFoundError:
+                pass
+
+        variante = imagen.copy()
+        variante.thumbnail((ancho, ancho), Image.LANCZOS)
+        fd, tmp_path = tempfile.mkstemp(dir=_tmp_dir(), suffix='.part')
+        try:
+            with os.fdopen(fd, 'wb') as tmp:
+                variante.save(tmp, format='WEBP', quality=settings.IMAGEN_DERIVADAS_CALIDAD, method=4)
+            os.makedirs(os.path.dirname(destino), exist_ok=True)
+            os.chmod(tmp_path, settings.FILE_UPLOAD_PERMISSIONS or 0o644)
+            os.replace(tmp_path, destino)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        creadas += 1
+
+    Producto.objects.filter(sha256=sha256).update(derivadas_sha=sha256)
+    return creadas
+
+
+def encolar_derivadas(productos):
+    """Programar la generación de variantes para las imágenes nuevas, al confirmar la transacción"""
+    pendientes = sorted({p.sha256 for p in productos if p.sha256 and p.derivadas_sha != p.sha256})
+    if not pendientes:
+        return 0
+
+    from .tasks import generate_image_derivatives
+
+    lote = settings.IMAGEN_DERIVADAS_LOTE
+    for inicio in range(0, len(pendientes), lote):
+        shas = pendientes[inicio:inicio + lote]
+        transaction.on_commit(lambda shas=shas: generate_image_derivatives.delay(shas))
+    return len(pendientes)
+
+
+def imagen_urls(producto, request=None):
+    """URLs de las variantes disponibles por tamaño, o None si aún no se generaron"""
+    if not producto.sha256 or producto.derivadas_sha != producto.sha256:
+        return None
+
+    urls = {}
+    for tamano in settings.IMAGEN_DERIVADAS:
+        url = default_storage.url(nombre_derivada(producto.sha256, tamano))
+        urls[tamano] = request.build_absolute_uri(url) if request else url
+    return urls
@@ -0,0 +1,124 @@
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from urllib.parse import unquote
+from django.conf import settings
+from . import ohmc_client
+from .downloader import HostLimiter
+import logging
+import re
+import requests
+
+logger = logging.getLogger(__name__)
+
+HREF = re.compile(r'href="([^"?#]+)"', re.IGNORECASE)
+
+
+def url_corrida(url_base, fecha, corrida):
+    """Directorio de una corrida WRF: CBA/YYYY_MM/DD_HH/"""
+    return f"{url_base}{fecha.year}_{fecha.month:02d}/{fecha.day:02d}_{corrida}/"
+
+
+def nombre_frame(variable, fecha, corrida, lead):
+    return f"{variable}-{fecha:%Y-%m-%d}_{corrida}+{int(lead):02d}.png"
+
+
+def _limite(limiter, url):
+    return limiter(url) if limiter else nullcontext()
+
+
+def listar_directorio(url, limiter=None):
+    """Entradas de un índice de Apache (los subdirectorios terminan en '/').
+
+    Devuelve un conjunto vacío si el directorio no existe (404) y None si el
+    servidor no ofrece índice o no respondió, es decir, si no se sabe nada.
+    """
+    try:
+        with _limite(limiter, url):
+            response = ohmc_client.get(url)
+    except requests.RequestException as e:
+        logger.warning(f"No se pudo listar {url}: {str(e)}")
+        return None
+    if response.status_code == 404:
+        return set()
+    if response.status_code != 200 or 'html' not in response.headers.get('Content-Type', ''):
+        return None
+
+    entradas = set()
+    for href in HREF.findall(response.text):
+        # Enlaces de orden, al directorio padre o absolutos
+        if href.startswith(('/', '..', 'http:', 'https:')):
+            continue
+        entradas.add(unquote(href))
+    return entradas
+
+
+def existe(url, limiter=None):
+    """Sonda HEAD: True o False, o None si la respuesta no es concluyente"""
+    try:
+        with _limite(limiter, url):
+            response = ohmc_client.head(url)
+    except requests.RequestException as e:
+        logger.warning(f"No se pudo sondear {url}: {str(e)}")
+        return None
+    if response.status_code == 200:
+        return True
+    if response.status_code in (404, 410):
+        return False
+    return None
+
+
+def leads_publicados(url_base, fecha, corrida, variable, leads, limiter=None):
+    """Plazos de ``leads`` publicados para una variable de una corrida.
+
+    Con ``OHMC_DISCOVERY='auto'`` se lista el directorio de la variable; si el
+    servidor no ofrece índice (o con ``'head'``) se sondea con HEAD el primer
+    plazo como centinela y, si existe, se asumen todos. Con ``'off'`` o ante
+    una respuesta no concluyente se devuelven todos los plazos.
+    """
+    leads = list(leads)
+    if not leads or settings.OHMC_DISCOVERY == 'off':
+        return leads
+
+    directorio = f"{url_corrida(url_base, fecha, corrida)}{variable}/"
+    if settings.OHMC_DISCOVERY == 'auto':
+        entradas = listar_directorio(directorio, limiter)
+        if entradas is not None:
+            return [lead for lead in leads if nombre_frame(variable, fecha, corrida, lead) in entradas]
+
+    centinela = existe(directorio + nombre_frame(variable, fecha, corrida, leads[0]), limiter)
+    return [] if centinela is False else leads
+
+
+def descubrir_celdas(url_base, celdas, leads, limiter=None):
+    """{(fecha, corrida, variable): [plazos publicados]} consultando las celdas en paralelo.
+
+    Las consultas respetan el mismo límite por host que las descargas.
+    """
+    celdas, leads = list(celdas), list(leads)
+    if not celdas:
+        return {}
+    limiter = limiter or HostLimiter(settings.OHMC_DOWNLOAD_PER_HOST)
+
+    def descubrir(celda):
+        return leads_publicados(url_base, *celda, leads, limiter=limiter)
+
+    with ThreadPoolExecutor(max_workers=min(settings.OHMC_DOWNLOAD_WORKERS, len(celdas))) as executor:
+        publicados = dict(zip(celdas, executor.map(descubrir, celdas)))
+
+    total = sum(len(plazos) for plazos in publicados.values())
+    logger.info(f"Descubrimiento: {total}/{len(celdas) * len(leads)} frames publicados en {len(celdas)} celdas")
+    return publicados
+
+
+def descubrir_corrida(url_base, fecha, corrida, variables, leads):
+    """Variables publicadas de una corrida con sus plazos: {variable: [plazos]}"""
+    variables = list(variables)
+    limiter = HostLimiter(settings.OHMC_DOWNLOAD_PER_HOST)
+    if settings.OHMC_DISCOVERY == 'auto':
+        # Un solo listado descarta las variables que la corrida todavía no tiene
+        entradas = listar_directorio(url_corrida(url_base, fecha, corrida), limiter)
+        if entradas is not None:
+            variables = [variable for variable in variables if f"{variable}/" in entradas]
+
+    celdas = descubrir_celdas(url_base, [(fecha, corrida, variable) for variable in variables], leads, limiter)
+    return {variable: plazos for (_, _, variable), plazos in celdas.items() if plazos}
@@ -0,0 +1,198 @@
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Optional
+from urllib.parse import urlparse
+from django.conf import settings
+from .derivadas import encolar_derivadas
+from .fallidas import no_elegibles, registrar_resultados
+from .ingest import actualizar_imagen_frames
+from .models import Producto
+from . import ohmc_client
+from .storage import CAMPOS_IMAGEN, ImageTooLarge, assign_image, conditional_headers, stream_to_store
+import requests
+import threading
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class DownloadResult:
+    """Resultado de la descarga de una URL"""
+    url: str
+    status: Optional[int] = None
+    name: Optional[str] = None
+    sha256: str = ''
+    size: int = 0
+    etag: str = ''
+    last_modified: str = ''
+    error: Optional[str] = None
+
+    @property
+    def ok(self):
+        return self.status == 200 and self.name is not None
+
+    @property
+    def not_modified(self):
+        return self.status == 304
+
+
+@dataclass
+class ResultadoLote:
+    """Resultado de descargar y persistir un lote de productos"""
+    cambiados: int = 0
+    bytes: int = 0
+    omitidas: int = 0
+    celdas: set = field(default_factory=set)  # (fecha_corrida, corrida, variable) con frames nuevos
+
+
+class HostLimiter:
+    """Semáforos por host para limitar la concurrencia contra un mismo servidor"""
+
+    def __init__(self, per_host):
+        self.per_host = per_host
+        self._lock = threading.Lock()
+        self._semaforos = {}
+
+    def __call__(self, url):
+        host = urlparse(url).netloc
+        with self._lock:
+            if host not in self._semaforos:
+                self._semaforos[host] = threading.BoundedSemaphore(self.per_host)
+            return self._semaforos[host]
+
+
+def _fetch(url, limiter, headers, timeout):
+    with limiter(url):
+        try:
+            with ohmc_client.get(url, headers=headers, timeout=timeout, stream=True) as response:
+                if response.status_code != 200:
+                    return DownloadResult(url, status=response.status_code)
+
+                # El cuerpo se escribe por bloques directamente al almacén
+                name, sha256, size = stream_to_store(response, os.path.basename(urlparse(url).path))
+                return DownloadResult(
+                    url,
+                    status=200,
+                    name=name,
+                    sha256=sha256,
+                    size=size,
+                    etag=response.headers.get('ETag', ''),
+                    last_modified=response.headers.get('Last-Modified', ''),
+                )
+        except ImageTooLarge as e:
+            return DownloadResult(url, error=f'too large: {e}')
+        except requests.exceptions.Timeout:
+            return DownloadResult(url, error='timeout')
+        except requests.exceptions.ConnectionError:
+            return DownloadResult(url, error='connection')
+        except Exception as e:
+            return DownloadResult(url, error=str(e))
+
+
+def download_many(urls, max_workers=None, per_host=None, headers=None, timeout=None, conditional=None):
+    """Descargar un conjunto de URLs en paralelo y devolver {url: DownloadResult}.
+
+    ``conditional`` permite pasar cabeceras de revalidación por URL
+    (If-None-Match / If-Modified-Since); esas URLs pueden responder 304.
+    """
+    max_workers = max_workers or settings.OHMC_DOWNLOAD_WORKERS
+    limiter = HostLimiter(per_host or settings.OHMC_DOWNLOAD_PER_HOST)
+    conditional = conditional or {}
+    urls = list(dict.fromkeys(urls))
+    if not urls:
+        return {}
+
+    timeout = timeout or ohmc_client.default_timeout()
+
+    def fetch(url):
+        return _fetch(url, limiter, {**(headers or {}), **conditional.get(url, {})}, timeout)
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(urls))) as executor:
+        return {resultado.url: resultado for resultado in executor.map(fetch, urls)}
+
+
+def save_results(productos, resultados):
+    """Guardar en disco y en la base las imágenes descargadas correctamente.
+
+    Se ejecuta en el hilo principal: los archivos ya quedaron en el almacén por
+    hash durante la descarga y aquí sólo se actualizan las filas con un único
+    ``bulk_update`` (y la ruta desnormalizada de sus ForecastFrame). Devuelve
+    ``(imágenes cuyo contenido cambió, celdas WRF con frames actualizados)``.
+    """
+    guardados = []
+    cambiados = 0
+    celdas = set()
+    for producto in productos:
+        resultado = resultados.get(producto.url_imagen)
+        if resultado is None or resultado.not_modified:
+            continue
+        if not resultado.ok:
+            if resultado.status:
+                logger.warning(f"⚠️ Error HTTP {resultado.status} para {resultado.url}")
+            else:
+                logger.warning(f"⚠️ Error descargando {resultado.url}: {resultado.error}")
+            continue
+
+        # Misma URL con contenido nuevo (FWI.png, ráfagas): el archivo anterior
+        # queda huérfano y lo borra storage.barrer_huerfanos en la purga nocturna
+        if assign_image(producto, resultado.name, resultado.sha256, resultado.etag, resultado.last_modified):
+            cambiados += 1
+        guardados.append(producto)
+
+    if guardados:
+        Producto.objects.bulk_update(guardados, CAMPOS_IMAGEN)
+        celdas = actualizar_imagen_frames(guardados)
+        encolar_derivadas(guardados)
+    return cambiados, celdas
+
+
+def download_batch(lote, **kwargs):
+    """Descargar un lote en paralelo y persistirlo; devuelve un ``ResultadoLote``.
+
+    Las imágenes faltantes cuya URL falló hace poco (o demasiadas veces) se
+    omiten según el registro de ``DescargaFallida``.
+    """
+    faltantes = {p.url_imagen for p in lote if not p.foto}
+    en_espera = no_elegibles(faltantes)
+    if en_espera:
+        lote = [p for p in lote if p.url_imagen not in en_espera]
+        faltantes -= en_espera
+
+    resultados = download_many(
+        [p.url_imagen for p in lote],
+        conditional={p.url_imagen: conditional_headers(p) for p in lote},
+        **kwargs
+    )
+    cambiados, celdas = save_results(lote, resultados)
+    abandonadas = registrar_resultados({url: resultados[url] for url in faltantes if url in resultados})
+    if abandonadas:
+        logger.warning(f"⚠️ {abandonadas} URLs abandonadas tras {settings.OHMC_FALLAS_MAX_INTENTOS} intentos")
+    return ResultadoLote(
+        cambiados=cambiados,
+        bytes=sum(r.size for r in resultados.values() if r.ok),
+        omitidas=len(en_espera),
+        celdas=celdas,
+    )
+
+
+def download_images(productos, batch_size=None, **kwargs):
+    """Descargar las imágenes de varios productos por lotes.
+
+    Cada lote se descarga en paralelo, escribiendo las imágenes a disco por
+    bloques, y luego se persiste en bloque. Los productos que ya tienen imagen se revalidan con peticiones condicionales.
+    Devuelve la cantidad de imágenes nuevas o modificadas.
+    """
+    batch_size = batch_size or settings.OHMC_DOWNLOAD_BATCH_SIZE
+    productos = list(productos)
+    total = 0
+    omitidas = 0
+
+    for inicio in range(0, len(productos), batch_size):
+        resultado = download_batch(productos[inicio:inicio + batch_size], **kwargs)
+        total += resultado.cambiados
+        omitidas += resultado.omitidas
+
+    logger.info(f"Descarga concurrente: {total}/{len(productos)} imágenes guardadas, {omitidas} omitidas por backoff")
+    return total
@@ -0,0 +1,64 @@
+from datetime import timedelta
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from .models import DescargaFallida
+
+
+def espera(intentos):
+    """Backoff exponencial tras ``intentos`` fallos consecutivos"""
+    segundos = settings.OHMC_FALLAS_BACKOFF_BASE * 2 ** (intentos - 1)
+    return timedelta(seconds=min(segundos, settings.OHMC_FALLAS_BACKOFF_MAX))
+
+
+def no_elegibles(urls):
+    """URLs que todavía esperan su próximo intento o fueron abandonadas"""
+    urls = list(urls)
+    if not urls:
+        return set()
+    return set(
+        DescargaFallida.objects.filter(url__in=urls)
+        .filter(Q(abandonada=True) | Q(proximo_intento__gt=timezone.now()))
+        .values_list('url', flat=True)
+    )
+
+
+def abandonadas(urls):
+    """URLs que superaron OHMC_FALLAS_MAX_INTENTOS y ya no se reintentan"""
+    urls = list(urls)
+    if not urls:
+        return set()
+    return set(DescargaFallida.objects.filter(url__in=urls, abandonada=True).values_list('url', flat=True))
+
+
+def registrar_resultados(resultados):
+    """Actualizar el registro con {url: DownloadResult}: los fallos suman un intento, los éxitos lo borran"""
+    exitos = [url for url, resultado in resultados.items() if resultado.ok or resultado.not_modified]
+    fallos = {url: resultado for url, resultado in resultados.items() if not (resultado.ok or resultado.not_modified)}
+
+    if exitos:
+        DescargaFallida.objects.filter(url__in=exitos).delete()
+    if not fallos:
+        return 0
+
+    ahora = timezone.now()
+    previos = dict(DescargaFallida.objects.filter(url__in=list(fallos)).values_list('url', 'intentos'))
+    filas = []
+    for url, resultado in fallos.items():
+        intentos = previos.get(url, 0) + 1
+        filas.append(DescargaFallida(
+            url=url,
+            intentos=intentos,
+            ultimo_estado=str(resultado.status) if resultado.status else (resultado.error or '')[:100],
+            ultimo_intento=ahora,
+            proximo_intento=ahora + espera(intentos),
+            abandonada=intentos >= settings.OHMC_FALLAS_MAX_INTENTOS,
+        ))
+    DescargaFallida.objects.bulk_create(
+        filas,
+        batch_size=settings.PRODUCTOS_BULK_BATCH_SIZE,
+        update_conflicts=True,
+        unique_fields=['url'],
+        update_fields=['intentos', 'ultimo_estado', 'ultimo_intento', 'proximo_intento', 'abandonada'],
+    )
+    return sum(1 for fila in filas if fila.abandonada)
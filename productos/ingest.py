@@ -0,0 +1,232 @@
+from collections import Counter
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+from django.conf import settings
+from django.db import connection
+from django.db.models import Case, CharField, DateTimeField, ExpressionWrapper, F, OuterRef, Subquery, Value, When
+from .models import Producto, FechaProducto, ForecastFrame, SyncCheckpoint
+from .resumenes import refrescar_fechas, sumar_estadisticas
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Sólo devuelve las filas que insertó esta sentencia: si otro shard insertó la
+# misma clave en paralelo, la fila no se cuenta dos veces en las estadísticas
+INSERTAR_FECHAS = """
+    INSERT INTO productos_fechaproducto (fecha, hora, producto_id, fecha_creacion)
+    VALUES {valores}
+    ON CONFLICT (fecha, hora, producto_id) DO NOTHING
+    RETURNING fecha, producto_id
+"""
+
+
+def valido_pronostico(fecha_corrida, hora_corrida, lead):
+    """Instante (UTC) en el que es válido un pronóstico de la corrida"""
+    return datetime.combine(fecha_corrida, time(int(hora_corrida)), tzinfo=dt_timezone.utc) + timedelta(hours=lead)
+
+
+def fecha_hora_pronostico(fecha_corrida, hora_corrida, lead):
+    """Fecha y hora válidas de un pronóstico a partir de la corrida y el plazo"""
+    valido = valido_pronostico(fecha_corrida, hora_corrida, lead)
+    return valido.date(), valido.time()
+
+
+def upsert_productos(tipo, productos):
+    """Crear o actualizar en bloque los productos de un tipo.
+
+    ``productos`` son instancias sin guardar. Se comparan contra las filas
+    existentes (una sola consulta) y sólo se escriben las nuevas o las que
+    cambiaron de URL/variable, con ``bulk_create(update_conflicts=True)``.
+
+    Devuelve ``({nombre_archivo: Producto}, creados)`` con todos los
+    productos objetivo ya persistidos.
+    """
+    objetivos = {p.nombre_archivo: p for p in productos}
+    if not objetivos:
+        return {}, 0
+
+    existentes = {
+        p.nombre_archivo: p
+        for p in Producto.objects.filter(tipo_producto=tipo, nombre_archivo__in=list(objetivos))
+    }
+
+    a_escribir = []
+    creados = 0
+    for nombre, producto in objetivos.items():
+        actual = existentes.get(nombre)
+        if actual is None:
+            creados += 1
+        elif (actual.variable, actual.url_imagen) == (producto.variable, producto.url_imagen):
+            continue
+        producto.tipo_producto = tipo
+        a_escribir.append(producto)
+
+    if a_escribir:
+        Producto.objects.bulk_create(
+            a_escribir,
+            batch_size=settings.PRODUCTOS_BULK_BATCH_SIZE,
+            update_conflicts=True,
+            unique_fields=['tipo_producto', 'nombre_archivo'],
+            update_fields=['variable', 'url_imagen'],
+        )
+        # bulk_create con update_conflicts no devuelve las PKs en Django 4.2
+        existentes.update({
+            p.nombre_archivo: p
+            for p in Producto.objects.filter(
+                tipo_producto=tipo,
+                nombre_archivo__in=[p.nombre_archivo for p in a_escribir]
+            )
+        })
+
+    if creados:
+        sumar_estadisticas(productos_por_tipo={tipo.nombre: creados})
+
+    logger.info(f"upsert_productos {tipo.nombre}: {creados} nuevos, {len(a_escribir) - creados} actualizados")
+    return {nombre: existentes[nombre] for nombre in objetivos}, creados
+
+
+def upsert_fechas(fechas):
+    """Insertar en bloque las fechas de producto que todavía no existen"""
+    objetivos = {(f.fecha, f.hora, f.producto_id): f for f in fechas}
+    if not objetivos:
+        return 0
+
+    producto_ids = {producto_id for _, _, producto_id in objetivos}
+    existentes = set(
+        FechaProducto.objects.filter(producto_id__in=producto_ids).values_list('fecha', 'hora', 'producto_id')
+    )
+
+    nuevas = [f for clave, f in objetivos.items() if clave not in existentes]
+    insertadas = _insertar_fechas(nuevas) if nuevas else []
+    if insertadas:
+        tipos = {f.producto_id: f.producto.tipo_producto_id for f in nuevas}
+        actualizar_ultima_valida({producto_id for _, producto_id in insertadas})
+        refrescar_fechas({(tipos[producto_id], fecha) for fecha, producto_id in insertadas})
+        sumar_estadisticas(fechas_por_dia=Counter(fecha for fecha, _ in insertadas), refrescar_wrf=True)
+    return len(insertadas)
+
+
+def _insertar_fechas(nuevas):
+    """Insertar ignorando conflictos y devolver ``(fecha, producto_id)`` de lo efectivamente insertado"""
+    insertadas = []
+    lote = settings.PRODUCTOS_BULK_BATCH_SIZE
+    with connection.cursor() as cursor:
+        for inicio in range(0, len(nuevas), lote):
+            filas = nuevas[inicio:inicio + lote]
+            cursor.execute(
+                INSERTAR_FECHAS.format(valores=', '.join(['(%s, %s, %s, %s)'] * len(filas))),
+                [valor for f in filas for valor in (f.fecha, f.hora, f.producto_id, f.fecha_creacion)],
+            )
+            insertadas.extend(cursor.fetchall())
+    return insertadas
+
+
+def actualizar_ultima_valida(producto_ids):
+    """Recalcular ``Producto.ultima_valida`` desde sus fechas con un UPDATE por lote"""
+    ultima = FechaProducto.objects.filter(
+        producto=OuterRef('pk')
+    ).order_by('-fecha', '-hora').annotate(
+        valida=ExpressionWrapper(F('fecha') + F('hora'), output_field=DateTimeField())
+    ).values('valida')[:1]
+
+    producto_ids = list(producto_ids)
+    lote = settings.PRODUCTOS_BULK_BATCH_SIZE
+    for inicio in range(0, len(producto_ids), lote):
+        Producto.objects.filter(pk__in=producto_ids[inicio:inicio + lote]).update(ultima_valida=Subquery(ultima))
+
+
+def fechas_frames(frames):
+    """FechaProducto válidas de cada frame WRF ``(producto, fecha_corrida, hora_corrida, lead)``"""
+    for producto, fecha_corrida, hora_corrida, lead in frames:
+        fecha, hora = fecha_hora_pronostico(fecha_corrida, hora_corrida, lead)
+        yield FechaProducto(fecha=fecha, hora=hora, producto=producto)
+
+
+def upsert_frames(frames):
+    """Crear o actualizar los ForecastFrame de productos WRF ya persistidos.
+
+    ``frames`` son tuplas ``(producto, fecha_corrida, hora_corrida, lead)``.
+    La ruta de imagen se toma de ``producto.foto``, por lo que conviene
+    llamarla después de descargar. Sólo se escriben frames nuevos o cuya
+    imagen cambió.
+    """
+    objetivos = {}
+    for producto, fecha_corrida, hora_corrida, lead in frames:
+        objetivos[producto.pk] = ForecastFrame(
+            producto=producto,
+            variable=producto.variable,
+            fecha_corrida=fecha_corrida,
+            corrida=int(hora_corrida),
+            lead=lead,
+            valido=valido_pronostico(fecha_corrida, hora_corrida, lead),
+            imagen=producto.foto.name or '',
+        )
+    if not objetivos:
+        return 0
+
+    existentes = dict(
+        ForecastFrame.objects.filter(producto_id__in=list(objetivos)).values_list('producto_id', 'imagen')
+    )
+    a_escribir = [
+        frame for producto_id, frame in objetivos.items()
+        if existentes.get(producto_id) != frame.imagen
+    ]
+    if a_escribir:
+        ForecastFrame.objects.bulk_create(
+            a_escribir,
+            batch_size=settings.PRODUCTOS_BULK_BATCH_SIZE,
+            update_conflicts=True,
+            unique_fields=['variable', 'fecha_corrida', 'corrida', 'lead'],
+            update_fields=['producto', 'valido', 'imagen'],
+        )
+    return len(a_escribir)
+
+
+def actualizar_imagen_frames(productos):
+    """Copiar ``foto`` a los ForecastFrame existentes de esos productos.
+
+    Cubre las imágenes que llegan fuera de la sincronización (backfill,
+    revalidación), que no pasan por ``upsert_frames``. Devuelve las celdas
+    ``(fecha_corrida, corrida, variable)`` cuyos frames cambiaron.
+    """
+    imagenes = {p.pk: p.foto.name for p in productos if p.foto}
+    if not imagenes:
+        return set()
+    imagen = Case(*[When(producto_id=pk, then=Value(nombre)) for pk, nombre in imagenes.items()], output_field=CharField())
+    frames = ForecastFrame.objects.filter(producto_id__in=list(imagenes)).exclude(imagen=imagen)
+    celdas = set(frames.values_list('fecha_corrida', 'corrida', 'variable'))
+    if celdas:
+        frames.update(imagen=imagen)
+    return celdas
+
+
+def celdas_completas(tipo, fechas):
+    """Celdas (fecha, corrida, variable) ya ingeridas por completo para esas fechas"""
+    return set(
+        SyncCheckpoint.objects.filter(tipo_producto=tipo, fecha__in=list(fechas), completo=True)
+        .values_list('fecha', 'corrida', 'variable')
+    )
+
+
+def registrar_celdas(tipo, conteos):
+    """Guardar el avance de cada celda a partir de {celda: (esperados, descargados)}"""
+    checkpoints = [
+        SyncCheckpoint(
+            tipo_producto=tipo,
+            fecha=fecha,
+            corrida=corrida,
+            variable=variable,
+            frames_esperados=esperados,
+            frames_descargados=descargados,
+            completo=descargados >= esperados,
+        )
+        for (fecha, corrida, variable), (esperados, descargados) in conteos.items()
+    ]
+    if checkpoints:
+        SyncCheckpoint.objects.bulk_create(
+            checkpoints,
+            batch_size=settings.PRODUCTOS_BULK_BATCH_SIZE,
+            update_conflicts=True,
+            unique_fields=['tipo_producto', 'fecha', 'corrida', 'variable'],
+            update_fields=['frames_esperados', 'frames_descargados', 'completo', 'actualizado'],
+        )
+    return sum(1 for c in checkpoints if c.completo)
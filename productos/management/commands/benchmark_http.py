@@ -0,0 +1,114 @@
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+import os
+import requests
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+ENDPOINTS = [
+    '/api/productos/',
+    '/api/productos/?tipo=wrf_cba&cursor=',
+    '/api/ultimos/',
+    '/api/estadisticas/',
+    '/api/fechas-disponibles/',
+    '/api/disponibilidad/',
+]
+
+SERVIDORES = {
+    'runserver': [sys.executable, 'manage.py', 'runserver', '--noreload', '--nothreading'],
+    'runserver-threaded': [sys.executable, 'manage.py', 'runserver', '--noreload'],
+    'gunicorn': [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'weather_api.wsgi:application'],
+}
+
+
+class Command(BaseCommand):
+    help = 'Prueba de carga HTTP de los endpoints de productos (runserver vs gunicorn)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--server',
+            choices=[*SERVIDORES, 'all', 'none'],
+            default='all',
+            help='Servidor a levantar para medir; "none" mide --url ya en ejecución (default: all)',
+        )
+        parser.add_argument('--url', default='http://127.0.0.1:8010', help='URL base del servidor')
+        parser.add_argument('--requests', type=int, default=500, help='Peticiones por endpoint (default: 500)')
+        parser.add_argument('--concurrency', type=int, default=16, help='Peticiones simultáneas (default: 16)')
+        parser.add_argument('--endpoint', action='append', help='Endpoint a medir (repetible; default: los de productos)')
+
+    def handle(self, *args, **options):
+        endpoints = options['endpoint'] or ENDPOINTS
+        url = options['url'].rstrip('/')
+
+        if options['server'] == 'none':
+            self.run_load(url, endpoints, options)
+            return
+
+        servidores = list(SERVIDORES) if options['server'] == 'all' else [options['server']]
+        for nombre in servidores:
+            self.stdout.write(self.style.SUCCESS(f'\n🚀 {nombre}'))
+            proceso = self.start_server(nombre, url)
+            try:
+                self.run_load(url, endpoints, options)
+            finally:
+                proceso.terminate()
+                proceso.wait(timeout=30)
+
+    def start_server(self, nombre, url):
+        """Levantar el servidor en el puerto de --url y esperar a que responda"""
+        host_port = url.split('://', 1)[-1]
+        comando = SERVIDORES[nombre] + ([host_port] if nombre.startswith('runserver') else ['--bind', host_port])
+        env = {**os.environ, 'GUNICORN_RELOAD': 'False', 'GUNICORN_LOGLEVEL': 'warning'}
+        proceso = subprocess.Popen(
+            comando, cwd=settings.BASE_DIR, env=env,
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+
+        limite = time.monotonic() + 30
+        while time.monotonic() < limite:
+            if proceso.poll() is not None:
+                raise CommandError(f'{nombre} terminó al iniciar (código {proceso.returncode})')
+            try:
+                requests.get(f'{url}/api/tipos/', timeout=1)
+                return proceso
+            except requests.exceptions.RequestException:
+                time.sleep(0.3)
+        proceso.terminate()
+        raise CommandError(f'{nombre} no respondió en 30s')
+
+    def run_load(self, url, endpoints, options):
+        total = options['requests']
+        concurrencia = options['concurrency']
+        sesiones = {}
+
+        def pedir(endpoint):
+            # Una sesión keep-alive por hilo, como un cliente real
+            sesion = sesiones.setdefault(threading.get_ident(), requests.Session())
+            inicio = time.perf_counter()
+            try:
+                ok = sesion.get(url + endpoint, timeout=30).status_code == 200
+            except requests.exceptions.RequestException:
+                ok = False
+            return time.perf_counter() - inicio, ok
+
+        for endpoint in endpoints:
+            # Calentar conexiones y cachés de cada worker antes de medir
+            with ThreadPoolExecutor(max_workers=concurrencia) as executor:
+                list(executor.map(pedir, [endpoint] * concurrencia * 2))
+            inicio = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=concurrencia) as executor:
+                resultados = list(executor.map(pedir, [endpoint] * total))
+            duracion = time.perf_counter() - inicio
+
+            tiempos = sorted(t * 1000 for t, _ in resultados)
+            errores = sum(1 for _, ok in resultados if not ok)
+            percentil = lambda p: tiempos[min(len(tiempos) - 1, int(len(tiempos) * p))]
+            self.stdout.write(
+                f'  📊 {endpoint:45} {total / duracion:8.1f} req/s  '
+                f'p50 {statistics.median(tiempos):7.1f}ms  p95 {percentil(0.95):7.1f}ms  '
+                f'p99 {percentil(0.99):7.1f}ms  errores {errores}'
+            )
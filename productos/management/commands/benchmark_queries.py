@@ -0,0 +1,179 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from productos.models import TipoProducto, Producto, FechaProducto
+from productos import views
+from productos.cache import invalidar
+from productos.resumenes import refrescar_disponibilidad
+import time
+
+
+class Rollback(Exception):
+    """Descartar los datos sintéticos al terminar"""
+
+
+class Command(BaseCommand):
+    help = 'Mostrar los planes de consulta (EXPLAIN ANALYZE) de los endpoints de disponibilidad'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--productos',
+            type=int,
+            default=0,
+            help='Productos WRF sintéticos a generar antes de medir (default: 0, usar datos reales)',
+        )
+        parser.add_argument(
+            '--fechas-por-producto',
+            type=int,
+            default=20,
+            help='Fechas sintéticas por producto generado (default: 20)',
+        )
+        parser.add_argument(
+            '--compare',
+            action='store_true',
+            help='Medir también sin los índices compuestos para comparar los planes',
+        )
+        parser.add_argument(
+            '--keep',
+            action='store_true',
+            help='Conservar los datos sintéticos (por defecto se descartan con un rollback)',
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            self.stdout.write(self.style.ERROR('❌ El benchmark requiere PostgreSQL'))
+            return
+
+        try:
+            with transaction.atomic():
+                if options['productos']:
+                    self.seed(options['productos'], options['fechas_por_producto'])
+
+                with connection.cursor() as cursor:
+                    cursor.execute('ANALYZE productos_producto')
+                    cursor.execute('ANALYZE productos_fechaproducto')
+                    cursor.execute('ANALYZE productos_disponibilidad')
+
+                if options['compare']:
+                    punto = transaction.savepoint()
+                    self.drop_indexes()
+                    self.stdout.write(self.style.WARNING('\n🐢 SIN ÍNDICES COMPUESTOS'))
+                    self.run_endpoints()
+                    transaction.savepoint_rollback(punto)
+
+                self.stdout.write(self.style.SUCCESS('\n🚀 CON ÍNDICES COMPUESTOS'))
+                self.run_endpoints()
+
+                if not options['keep']:
+                    raise Rollback()
+        except Rollback:
+            self.stdout.write('\n🧹 Datos sintéticos descartados')
+
+    def seed(self, total, fechas_por_producto):
+        """Generar productos WRF y fechas sintéticas"""
+        self.stdout.write(f'🌱 Generando {total} productos y {total * fechas_por_producto} fechas...')
+        inicio = time.monotonic()
+
+        tipo, _ = TipoProducto.objects.get_or_create(
+            nombre='wrf_cba',
+            defaults={'descripcion': 'benchmark', 'url': 'https://yaku.ohmc.ar/public/wrf/img/CBA/'}
+        )
+        lote = 10000
+        for desde in range(0, total, lote):
+            Producto.objects.bulk_create([
+                Producto(
+                    tipo_producto=tipo,
+                    variable=f'bench{i % 15}',
+                    nombre_archivo=f'bench-{i}.png',
+                    url_imagen=f'https://bench.invalid/bench-{i}.png',
+                )
+                for i in range(desde, min(desde + lote, total))
+            ], batch_size=lote)
+
+        # Las fechas se generan en el servidor para no mover millones de filas
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                INSERT INTO {FechaProducto._meta.db_table} (fecha, hora, producto_id, fecha_creacion)
+                SELECT DATE '2025-01-01' + ((p.id + g) %% 365)::int,
+                       make_time(((p.id + g) %% 24)::int, 0, 0),
+                       p.id,
+                       now()
+                FROM {Producto._meta.db_table} p
+                CROSS JOIN generate_series(0, %s - 1) g
+                WHERE p.nombre_archivo LIKE 'bench-%%'
+                ON CONFLICT DO NOTHING
+                """,
+                [fechas_por_producto]
+            )
+            cursor.execute(
+                f"""
+                UPDATE {Producto._meta.db_table} p
+                SET ultima_valida = ultima.valida
+                FROM (
+                    SELECT producto_id, MAX((fecha + hora) AT TIME ZONE 'UTC') AS valida
+                    FROM {FechaProducto._meta.db_table}
+                    GROUP BY producto_id
+                ) ultima
+                WHERE ultima.producto_id = p.id AND p.nombre_archivo LIKE 'bench-%%'
+                """
+            )
+
+        refrescar_disponibilidad(tipo.pk)
+
+        self.stdout.write(f'  ✅ Datos generados en {time.monotonic() - inicio:.1f}s')
+
+    def drop_indexes(self):
+        """Eliminar (dentro de la transacción) los índices compuestos de los modelos"""
+        with connection.schema_editor() as editor:
+            for model in (Producto, FechaProducto):
+                for index in model._meta.indexes:
+                    editor.remove_index(model, index)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE productos_producto')
+            cursor.execute('ANALYZE productos_fechaproducto')
+
+    def sample_params(self):
+        ultima = FechaProducto.objects.filter(
+            producto__tipo_producto__nombre='wrf_cba'
+        ).order_by('-fecha', '-hora').values('fecha', 'hora', 'producto__variable').first()
+        if not ultima:
+            return None
+        return {
+            'fecha': ultima['fecha'].isoformat(),
+            'hora': ultima['hora'].strftime('%H:%M'),
+            'variable': ultima['producto__variable'] or '',
+        }
+
+    def run_endpoints(self):
+        params = self.sample_params()
+        if params is None:
+            self.stdout.write(self.style.WARNING('  ⚠️ No hay datos WRF; usar --productos para generar'))
+            return
+
+        factory = RequestFactory()
+        endpoints = [
+            ('fechas-disponibles', views.fechas_disponibles, {'tipo': 'wrf_cba'}),
+            ('horas-disponibles', views.horas_disponibles, {'fecha': params['fecha']}),
+            ('variables-disponibles', views.variables_disponibles, {'fecha': params['fecha']}),
+            ('productos/fecha-hora', views.productos_por_fecha_hora, {
+                'fecha': params['fecha'], 'hora': params['hora'], 'variable': params['variable']
+            }),
+            ('ultimos', views.ultimos_productos, {}),
+        ]
+
+        for nombre, view, query in endpoints:
+            # Nueva versión de caché para medir siempre las consultas reales
+            invalidar()
+            with CaptureQueriesContext(connection) as capturadas:
+                view(factory.get('/', query))
+
+            self.stdout.write(self.style.SUCCESS(f'\n📊 {nombre} ({len(capturadas)} consultas)'))
+            for consulta in capturadas.captured_queries:
+                if not consulta['sql'].lstrip().upper().startswith('SELECT'):
+                    continue
+                with connection.cursor() as cursor:
+                    cursor.execute('EXPLAIN (ANALYZE, BUFFERS) ' + consulta['sql'])
+                    for (linea,) in cursor.fetchall():
+                        self.stdout.write(f'  {linea}')
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from django.db.models import F
+from productos.cache import invalidar
+from productos.derivadas import generar_derivadas
+from productos.models import Producto
+
+
+class Command(BaseCommand):
+    help = 'Generar las variantes WebP (miniaturas) de las imágenes ya guardadas'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Regenerar también las variantes existentes (por ejemplo tras cambiar los tamaños)',
+        )
+
+    def handle(self, *args, **options):
+        productos = Producto.objects.exclude(foto='').exclude(sha256='')
+        if not options['force']:
+            productos = productos.exclude(derivadas_sha=F('sha256'))
+        shas = list(productos.values_list('sha256', flat=True).distinct())
+
+        self.stdout.write(f'🖼️ Generando variantes para {len(shas)} imágenes...')
+        creadas = 0
+        for sha256 in shas:
+            try:
+                creadas += generar_derivadas(sha256, forzar=options['force'])
+            except Exception as e:
+                self.stdout.write(self.style.WARNING(f'  ⚠️ {sha256}: {e}'))
+
+        invalidar()
+        self.stdout.write(self.style.SUCCESS(f'✅ {creadas} variantes generadas'))
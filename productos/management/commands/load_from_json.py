@@ -1,12 +1,13 @@
 from django.core.management.base import BaseCommand
-from django.core.files.base import ContentFile
 from productos.models import TipoProducto, Producto, FechaProducto
+from productos.cache import invalidar
+from productos.discovery import descubrir_corrida
+from productos.downloader import download_images as download_images_bulk
+from productos.ingest import upsert_productos, upsert_fechas, fechas_frames, upsert_frames
 from datetime import datetime, date, timedelta
 import json
 import os
-import requests
 import logging
-from urllib.parse import urlparse
 
 logger = logging.getLogger(__name__)
 
@@ -88,58 +89,14 @@ class Command(BaseCommand):
             total_imagenes += imagenes_descargadas
             self.stdout.write(self.style.SUCCESS(f'  ✅ {productos_creados} productos creados, {imagenes_descargadas} imágenes descargadas'))
         
-        # 3. Mostrar resumen
+        # 3. Invalidar la caché de los endpoints y mostrar resumen
+        invalidar(*data['proyectos'])
         self.show_summary()
         
         self.stdout.write(self.style.SUCCESS(f'\n🎉 ¡Carga completada!'))
         self.stdout.write(self.style.SUCCESS(f'📊 Total productos: {total_productos}'))
         self.stdout.write(self.style.SUCCESS(f'📸 Total imágenes descargadas: {total_imagenes}'))
     
-    def download_and_save_image(self, producto, url):
-        """Descargar imagen desde URL y guardarla físicamente"""
-        try:
-            self.stdout.write(f'    📥 Descargando: {os.path.basename(url)}')
-            
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-            }
-            
-            response = requests.get(url, headers=headers, timeout=30, stream=True)
-            
-            if response.status_code == 200:
-                # Obtener nombre del archivo desde la URL
-                parsed_url = urlparse(url)
-                filename = os.path.basename(parsed_url.path)
-                
-                # Si no hay extensión, usar .png por defecto
-                if not filename or '.' not in filename:
-                    filename = f"{producto.nombre_archivo}"
-                
-                # Guardar imagen en el campo foto
-                producto.foto.save(
-                    filename,
-                    ContentFile(response.content),
-                    save=True
-                )
-                self.stdout.write(self.style.SUCCESS(f'      ✅ Guardada: {filename} ({len(response.content)} bytes)'))
-                return True
-            elif response.status_code == 404:
-                self.stdout.write(self.style.WARNING(f'      ⚠️ No encontrada (404): {os.path.basename(url)}'))
-                return False
-            else:
-                self.stdout.write(self.style.WARNING(f'      ⚠️ Error HTTP {response.status_code}: {os.path.basename(url)}'))
-                return False
-                
-        except requests.exceptions.Timeout:
-            self.stdout.write(self.style.WARNING(f'      ⏰ Timeout: {os.path.basename(url)}'))
-            return False
-        except requests.exceptions.ConnectionError:
-            self.stdout.write(self.style.WARNING(f'      🔌 Error de conexión: {os.path.basename(url)}'))
-            return False
-        except Exception as e:
-            self.stdout.write(self.style.WARNING(f'      ❌ Error: {str(e)[:50]}...'))
-            return False
-    
     def create_tipos_productos(self, data):
         """Crear tipos de productos desde el JSON"""
         self.stdout.write('📋 Creando tipos de productos...')
@@ -198,12 +155,15 @@ class Command(BaseCommand):
             
             for hora_corrida in corridas:
                 self.stdout.write(f'    🕐 Corrida: {hora_corrida}:00 UTC')
+                objetivos = []
+                
+                # Listar qué variables y plazos publicó la corrida en lugar de probar cada URL
+                publicados = descubrir_corrida(proyecto_data['url_base'], fecha_actual, hora_corrida, variables, horas_pronostico)
+                frames_publicados = sum(len(plazos) for plazos in publicados.values())
+                self.stdout.write(f'      🔎 {len(publicados)}/{len(variables)} variables, {frames_publicados}/{len(variables) * len(horas_pronostico)} frames publicados')
                 
-                for variable in variables:
-                    variable_productos = 0
-                    variable_imagenes = 0
-                    
-                    for hora_offset in horas_pronostico:
+                for variable, plazos in publicados.items():
+                    for hora_offset in plazos:
                         # Generar URL según la estructura del JSON
                         # CBA/YYYY_MM/DD_HH/{variable}/{variable}-YYYY-MM-DD_HH+HH.png
                         url = (f"{proyecto_data['url_base']}"
@@ -214,48 +174,28 @@ class Command(BaseCommand):
                         
                         nombre_archivo = f"{variable}-{fecha_actual.strftime('%Y-%m-%d')}_{hora_corrida}+{hora_offset:02d}.png"
                         
-                        # Crear producto
-                        producto, created = Producto.objects.get_or_create(
-                            tipo_producto=tipo_wrf,
-                            variable=variable,
-                            nombre_archivo=nombre_archivo,
-                            defaults={'url_imagen': url}
-                        )
-                        
-                        if not created:
-                            producto.url_imagen = url
-                            producto.save()
-                        else:
-                            productos_creados += 1
-                            variable_productos += 1
-                        
-                        # Descargar imagen si está habilitado y no existe
-                        if download_images and not producto.foto:
-                            if self.download_and_save_image(producto, url):
-                                imagenes_descargadas += 1
-                                variable_imagenes += 1
-                        
-                        # Calcular fecha y hora del pronóstico
-                        hora_total = int(hora_corrida) + hora_offset
-                        
-                        if hora_total >= 24:
-                            fecha_pronostico = fecha_actual + timedelta(days=1)
-                            hora_final = hora_total - 24
-                        else:
-                            fecha_pronostico = fecha_actual
-                            hora_final = hora_total
-                        
-                        hora_obj = datetime.strptime(f"{hora_final:02d}:00", "%H:%M").time()
-                        
-                        # Crear fecha de producto
-                        FechaProducto.objects.get_or_create(
-                            fecha=fecha_pronostico,
-                            hora=hora_obj,
-                            producto=producto
-                        )
-                    
-                    if variable_productos > 0 or variable_imagenes > 0:
-                        self.stdout.write(f'      📊 {variable}: {variable_productos} productos, {variable_imagenes} imágenes')
+                        objetivos.append((
+                            Producto(variable=variable, nombre_archivo=nombre_archivo, url_imagen=url),
+                            fecha_actual,
+                            hora_corrida,
+                            hora_offset,
+                        ))
+                
+                # Crear productos y fechas de la corrida en bloque
+                productos, creados = upsert_productos(tipo_wrf, [p for p, *_ in objetivos])
+                frames = [(productos[p.nombre_archivo], *corrida) for p, *corrida in objetivos]
+                upsert_fechas(fechas_frames(frames))
+                productos_creados += creados
+                if creados > 0:
+                    self.stdout.write(f'      📊 {creados} productos nuevos')
+                
+                # Descargar en paralelo todas las imágenes de la corrida
+                pendientes = [p for p in productos.values() if not p.foto] if download_images else []
+                if pendientes:
+                    descargadas = download_images_bulk(pendientes)
+                    imagenes_descargadas += descargadas
+                    self.stdout.write(f'      📸 {descargadas}/{len(pendientes)} imágenes descargadas')
+                upsert_frames(frames)
         
         return productos_creados, imagenes_descargadas
     
@@ -272,9 +212,9 @@ class Command(BaseCommand):
         
         tipo_aire = TipoProducto.objects.get(nombre='MedicionAire')
         archivos = proyecto_data['archivos']
-        productos_creados = 0
         imagenes_descargadas = 0
         
+        objetivos = []
         for dias_atras in range(days):
             fecha_actual = start_date - timedelta(days=dias_atras)
             
@@ -286,69 +226,50 @@ class Command(BaseCommand):
                       f"{archivo}")
                 
                 nombre_archivo_con_fecha = f"{fecha_actual.strftime('%Y-%m-%d')}_{archivo}"
-                
-                producto, created = Producto.objects.get_or_create(
-                    tipo_producto=tipo_aire,
-                    nombre_archivo=nombre_archivo_con_fecha,
-                    defaults={'url_imagen': url}
-                )
-                
-                if not created:
-                    producto.url_imagen = url
-                    producto.save()
-                else:
-                    productos_creados += 1
-                
-                # Descargar imagen si está habilitado y no existe
-                if download_images and not producto.foto:
-                    if self.download_and_save_image(producto, url):
-                        imagenes_descargadas += 1
-                
-                # Crear fecha (hora típica de actualización: 10:30)
-                FechaProducto.objects.get_or_create(
-                    fecha=fecha_actual,
-                    hora=datetime.strptime("10:30", "%H:%M").time(),
-                    producto=producto
-                )
+                objetivos.append((Producto(nombre_archivo=nombre_archivo_con_fecha, url_imagen=url), fecha_actual))
+        
+        productos, productos_creados = upsert_productos(tipo_aire, [p for p, _ in objetivos])
+        
+        # Crear fechas (hora típica de actualización: 10:30)
+        hora_medicion = datetime.strptime("10:30", "%H:%M").time()
+        upsert_fechas(
+            FechaProducto(fecha=fecha, hora=hora_medicion, producto=productos[p.nombre_archivo])
+            for p, fecha in objetivos
+        )
+        
+        # Descargar en paralelo las imágenes que faltan (con backoff de fallidas y variantes)
+        pendientes = [p for p in productos.values() if not p.foto] if download_images else []
+        if pendientes:
+            imagenes_descargadas = download_images_bulk(pendientes)
+            self.stdout.write(f'    📸 {imagenes_descargadas}/{len(pendientes)} imágenes descargadas')
         
         return productos_creados, imagenes_descargadas
     
     def load_static_data(self, proyecto_name, proyecto_data, download_images):
         """Cargar datos estáticos (FWI, rutas_caminera) con descarga de imágenes"""
         tipo = TipoProducto.objects.get(nombre=proyecto_name)
-        productos_creados = 0
         imagenes_descargadas = 0
         
-        for archivo in proyecto_data['archivos']:
-            url = f"{proyecto_data['url_base']}{archivo}"
-            
-            producto, created = Producto.objects.get_or_create(
-                tipo_producto=tipo,
-                nombre_archivo=archivo,
-                defaults={'url_imagen': url}
-            )
-            
-            if not created:
-                producto.url_imagen = url
-                producto.save()
-            else:
-                productos_creados += 1
-            
-            # Descargar imagen si está habilitado y no existe
-            if download_images and not producto.foto:
-                if self.download_and_save_image(producto, url):
-                    imagenes_descargadas += 1
-            
-            # Usar fecha de última actualización del JSON
-            ultima_actualizacion = datetime.fromisoformat(
-                proyecto_data['ultima_actualizacion'].replace('Z', '+00:00')
-            )
-            
-            FechaProducto.objects.get_or_create(
-                fecha=ultima_actualizacion.date(),
-                hora=ultima_actualizacion.time(),
-                producto=producto
-            )
+        productos, productos_creados = upsert_productos(tipo, [
+            Producto(nombre_archivo=archivo, url_imagen=f"{proyecto_data['url_base']}{archivo}")
+            for archivo in proyecto_data['archivos']
+        ])
+        
+        # Descargar en paralelo las imágenes que faltan (con backoff de fallidas y variantes)
+        pendientes = [p for p in productos.values() if not p.foto] if download_images else []
+        if pendientes:
+            imagenes_descargadas = download_images_bulk(pendientes)
+            self.stdout.write(f'    📸 {imagenes_descargadas}/{len(pendientes)} imágenes descargadas')
+        
+        # Usar fecha de última actualización del JSON
+        ultima_actualizacion = datetime.fromisoformat(
+            proyecto_data['ultima_actualizacion'].replace('Z', '+00:00')
+        )
+        
+        upsert_fechas(
+            FechaProducto(fecha=ultima_actualizacion.date(), hora=ultima_actualizacion.time(), producto=producto)
+            for producto in productos.values()
+        )
         
         return productos_creados, imagenes_descargadas
     
@@ -1,11 +1,10 @@
 from django.core.management.base import BaseCommand
-from django.core.files.base import ContentFile
 from productos.models import TipoProducto, Producto, FechaProducto
+from productos.cache import invalidar
+from productos.downloader import download_images as download_images_bulk
+from productos.ingest import upsert_productos, upsert_fechas, fechas_frames, upsert_frames
 from datetime import datetime, date, timedelta
-import requests
 import logging
-from urllib.parse import urlparse
-import os
 
 logger = logging.getLogger(__name__)
 
@@ -55,55 +54,22 @@ class Command(BaseCommand):
         self.load_fwi_data(download_images)
         self.load_rutas_data(download_images)
         
-        # 3. Mostrar resumen
+        # 3. Invalidar la caché de los endpoints y mostrar resumen
+        invalidar('wrf_cba', 'MedicionAire', 'FWI', 'rutas_caminera')
         self.show_summary()
         
         self.stdout.write(self.style.SUCCESS('✅ Carga de datos completada!'))
     
-    def download_and_save_image(self, producto, url):
-        """Descargar imagen desde URL y guardarla en el modelo"""
-        try:
-            self.stdout.write(f'  📥 Intentando: {os.path.basename(url)}')
-            
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-            }
-            
-            response = requests.get(url, headers=headers, timeout=15, stream=True)
-            
-            if response.status_code == 200:
-                # Obtener nombre del archivo desde la URL
-                parsed_url = urlparse(url)
-                filename = os.path.basename(parsed_url.path)
-                
-                # Si no hay extensión, usar .png por defecto
-                if not filename or '.' not in filename:
-                    filename = f"{producto.nombre_archivo}.png"
-                
-                # Guardar imagen en el campo foto
-                producto.foto.save(
-                    filename,
-                    ContentFile(response.content),
-                    save=True
-                )
-                self.stdout.write(self.style.SUCCESS(f'    ✅ Guardada: {filename}'))
-                return True
-            elif response.status_code == 404:
-                self.stdout.write(self.style.WARNING(f'    ⚠️ No encontrada (404): {os.path.basename(url)}'))
-                return False
-            else:
-                self.stdout.write(self.style.WARNING(f'    ⚠️ Error HTTP {response.status_code}'))
-                return False
-                
-        except requests.exceptions.Timeout:
-            self.stdout.write(self.style.WARNING(f'    ⏰ Timeout: {os.path.basename(url)}'))
-            return False
-        except requests.exceptions.ConnectionError:
-            self.stdout.write(self.style.WARNING(f'    🔌 Error de conexión: {os.path.basename(url)}'))
-            return False
-        except Exception as e:
-            self.stdout.write(self.style.WARNING(f'    ❌ Error: {str(e)[:50]}...'))
-            return False
+    def download_missing(self, productos, download_images=True):
+        """Descargar las imágenes que faltan; devuelve (descargadas, intentadas)"""
+        if not download_images:
+            return 0, 0
+        
+        pendientes = [producto for producto in productos if not producto.foto]
+        if not pendientes:
+            return 0, 0
+        # Descarga en paralelo con backoff de fallidas y variantes, como la sincronización
+        return download_images_bulk(pendientes), len(pendientes)
     
     def create_tipos_productos(self):
         """Crear los tipos de productos iniciales"""
@@ -154,9 +120,7 @@ class Command(BaseCommand):
         # Variables principales del JSON
         variables = ['t2', 'ppn', 'wspd10', 'rh2', 'ppnaccum']
         
-        productos_creados = 0
-        imagenes_descargadas = 0
-        imagenes_intentadas = 0
+        objetivos = []
         
         for dias_atras in range(days):
             fecha_actual = start_date - timedelta(days=dias_atras)
@@ -174,46 +138,21 @@ class Command(BaseCommand):
                         
                         nombre_archivo = f"{variable}-{fecha_actual.strftime('%Y-%m-%d')}_{hora_corrida}+{hora_str}.png"
                         
-                        # Crear producto
-                        producto, created = Producto.objects.get_or_create(
-                            tipo_producto=tipo_wrf,
-                            variable=variable,
-                            nombre_archivo=nombre_archivo,
-                            defaults={'url_imagen': url}
-                        )
-                        
-                        if not created:
-                            producto.url_imagen = url
-                            producto.save()
-                        else:
-                            productos_creados += 1
-                        
-                        # Descargar imagen si está habilitado y no existe
-                        if download_images and not producto.foto:
-                            imagenes_intentadas += 1
-                            if self.download_and_save_image(producto, url):
-                                imagenes_descargadas += 1
-                        
-                        # Crear fecha de producto
-                        try:
-                            hora_total = int(hora_corrida) + hora_pronostico
-                            
-                            if hora_total >= 24:
-                                fecha_pronostico = fecha_actual + timedelta(days=1)
-                                hora_final = hora_total - 24
-                            else:
-                                fecha_pronostico = fecha_actual
-                                hora_final = hora_total
-                            
-                            hora_obj = datetime.strptime(f"{hora_final:02d}:00", "%H:%M").time()
-                            
-                            FechaProducto.objects.get_or_create(
-                                fecha=fecha_pronostico,
-                                hora=hora_obj,
-                                producto=producto
-                            )
-                        except Exception as e:
-                            continue
+                        objetivos.append((
+                            Producto(variable=variable, nombre_archivo=nombre_archivo, url_imagen=url),
+                            fecha_actual,
+                            hora_corrida,
+                            hora_pronostico,
+                        ))
+        
+        # Crear productos, fechas y frames en bloque
+        productos, productos_creados = upsert_productos(tipo_wrf, [p for p, *_ in objetivos])
+        frames = [(productos[p.nombre_archivo], *corrida) for p, *corrida in objetivos]
+        upsert_fechas(fechas_frames(frames))
+        
+        # Descargar imágenes si está habilitado y no existen
+        imagenes_descargadas, imagenes_intentadas = self.download_missing(productos.values(), download_images)
+        upsert_frames(frames)
         
         self.stdout.write(self.style.SUCCESS(f'  ✅ WRF: {productos_creados} productos creados'))
         self.stdout.write(self.style.SUCCESS(f'  📸 Imágenes: {imagenes_descargadas}/{imagenes_intentadas} descargadas'))
@@ -224,9 +163,7 @@ class Command(BaseCommand):
         
         tipo_aire = TipoProducto.objects.get(nombre='MedicionAire')
         archivos = ['CH4_webvisualizer_v4.png', 'CO2_webvisualizer_v4.png']
-        productos_creados = 0
-        imagenes_descargadas = 0
-        imagenes_intentadas = 0
+        objetivos = []
         
         for dias_atras in range(days):
             fecha_actual = start_date - timedelta(days=dias_atras)
@@ -235,30 +172,17 @@ class Command(BaseCommand):
                 # Estructura según el JSON: MM/DD/archivo.png
                 url = f"https://yaku.ohmc.ar/public/MedicionAire/{fecha_actual.month:02d}/{fecha_actual.day:02d}/{archivo}"
                 nombre_archivo_con_fecha = f"{fecha_actual.strftime('%Y-%m-%d')}_{archivo}"
-                
-                producto, created = Producto.objects.get_or_create(
-                    tipo_producto=tipo_aire,
-                    nombre_archivo=nombre_archivo_con_fecha,
-                    defaults={'url_imagen': url}
-                )
-                
-                if not created:
-                    producto.url_imagen = url
-                    producto.save()
-                else:
-                    productos_creados += 1
-                
-                # Descargar imagen
-                if download_images and not producto.foto:
-                    imagenes_intentadas += 1
-                    if self.download_and_save_image(producto, url):
-                        imagenes_descargadas += 1
-                
-                FechaProducto.objects.get_or_create(
-                    fecha=fecha_actual,
-                    hora=datetime.strptime("10:30", "%H:%M").time(),
-                    producto=producto
-                )
+                objetivos.append((Producto(nombre_archivo=nombre_archivo_con_fecha, url_imagen=url), fecha_actual))
+        
+        productos, productos_creados = upsert_productos(tipo_aire, [p for p, _ in objetivos])
+        hora_medicion = datetime.strptime("10:30", "%H:%M").time()
+        upsert_fechas(
+            FechaProducto(fecha=fecha, hora=hora_medicion, producto=productos[p.nombre_archivo])
+            for p, fecha in objetivos
+        )
+        
+        # Descargar imágenes
+        imagenes_descargadas, imagenes_intentadas = self.download_missing(productos.values(), download_images)
         
         self.stdout.write(self.style.SUCCESS(f'  ✅ MedicionAire: {productos_creados} productos creados'))
         self.stdout.write(self.style.SUCCESS(f'  📸 Imágenes: {imagenes_descargadas}/{imagenes_intentadas} descargadas'))
@@ -270,26 +194,14 @@ class Command(BaseCommand):
         tipo_fwi = TipoProducto.objects.get(nombre='FWI')
         url = "https://yaku.ohmc.ar/public/FWI/FWI.png"
         
-        producto, created = Producto.objects.get_or_create(
-            tipo_producto=tipo_fwi,  # Corregido: era tipo_fwi
-            nombre_archivo='FWI.png',
-            defaults={'url_imagen': url}
-        )
-        
-        if not created:
-            producto.url_imagen = url
-            producto.save()
+        productos, _ = upsert_productos(tipo_fwi, [Producto(nombre_archivo='FWI.png', url_imagen=url)])
+        imagenes_descargadas, _ = self.download_missing(productos.values(), download_images)
         
-        imagenes_descargadas = 0
-        if download_images and not producto.foto:
-            if self.download_and_save_image(producto, url):
-                imagenes_descargadas = 1
-        
-        FechaProducto.objects.get_or_create(
+        upsert_fechas([FechaProducto(
             fecha=date(2025, 6, 26),  # Fecha de última actualización conocida
             hora=datetime.strptime("11:00", "%H:%M").time(),
-            producto=producto
-        )
+            producto=productos['FWI.png']
+        )])
         
         self.stdout.write(self.style.SUCCESS(f'  ✅ FWI: 1 producto creado, {imagenes_descargadas} imágenes descargadas'))
     
@@ -300,26 +212,14 @@ class Command(BaseCommand):
         tipo_rutas = TipoProducto.objects.get(nombre='rutas_caminera')
         url = "https://yaku.ohmc.ar/public/rutas_caminera/rafagas_rutas.gif"
         
-        producto, created = Producto.objects.get_or_create(
-            tipo_producto=tipo_rutas,
-            nombre_archivo='rafagas_rutas.gif',
-            defaults={'url_imagen': url}
-        )
-        
-        if not created:
-            producto.url_imagen = url
-            producto.save()
+        productos, _ = upsert_productos(tipo_rutas, [Producto(nombre_archivo='rafagas_rutas.gif', url_imagen=url)])
+        imagenes_descargadas, _ = self.download_missing(productos.values(), download_images)
         
-        imagenes_descargadas = 0
-        if download_images and not producto.foto:
-            if self.download_and_save_image(producto, url):
-                imagenes_descargadas = 1
-        
-        FechaProducto.objects.get_or_create(
+        upsert_fechas([FechaProducto(
             fecha=date(2025, 6, 26),  # Fecha de última actualización conocida
             hora=datetime.strptime("11:00", "%H:%M").time(),
-            producto=producto
-        )
+            producto=productos['rafagas_rutas.gif']
+        )])
         
         self.stdout.write(self.style.SUCCESS(f'  ✅ Rutas: 1 producto creado, {imagenes_descargadas} imágenes descargadas'))
     
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+from productos.models import TipoProducto
+from productos.retencion import dias_retencion, purgar_tipo
+from productos.storage import barrer_huerfanos
+
+
+class Command(BaseCommand):
+    help = 'Purgar fechas, productos e imágenes fuera de la retención de cada tipo'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--tipo',
+            type=str,
+            help='Purgar sólo este tipo de producto (default: todos)',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Sólo contar lo que se purgaría',
+        )
+
+    def handle(self, *args, **options):
+        tipos = TipoProducto.objects.all()
+        if options['tipo']:
+            tipos = tipos.filter(nombre=options['tipo'])
+
+        for tipo in tipos:
+            dias = dias_retencion(tipo)
+            if not dias:
+                self.stdout.write(f'  ♾️ {tipo.nombre}: sin retención')
+                continue
+            resultado = purgar_tipo(tipo, dry_run=options['dry_run'])
+            self.stdout.write(
+                f"  🗑️ {tipo.nombre} ({dias} días): {resultado['fechas']} fechas, "
+                f"{resultado['productos']} productos"
+            )
+
+        archivos = barrer_huerfanos(dry_run=options['dry_run'])
+        self.stdout.write(f'  🧹 {archivos} archivos huérfanos')
+
+        verbo = 'a purgar' if options['dry_run'] else 'purgados'
+        self.stdout.write(self.style.SUCCESS(f'✅ Datos vencidos {verbo}'))
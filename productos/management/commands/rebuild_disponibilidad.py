@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from productos.cache import invalidar
+from productos.models import TipoProducto
+from productos.resumenes import refrescar_disponibilidad
+
+
+class Command(BaseCommand):
+    help = 'Reconstruir el resumen de disponibilidad (fechas × horas × variables)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--tipo',
+            type=str,
+            help='Reconstruir sólo este tipo de producto (default: todos)',
+        )
+
+    def handle(self, *args, **options):
+        tipos = TipoProducto.objects.all()
+        if options['tipo']:
+            tipos = tipos.filter(nombre=options['tipo'])
+
+        for tipo in tipos:
+            filas = refrescar_disponibilidad(tipo.pk)
+            self.stdout.write(f'  📅 {tipo.nombre}: {filas} filas de disponibilidad')
+
+        invalidar(*[tipo.nombre for tipo in tipos])
+        self.stdout.write(self.style.SUCCESS('✅ Disponibilidad reconstruida'))
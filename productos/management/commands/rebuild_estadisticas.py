@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from productos.cache import invalidar
+from productos.models import EstadisticaSnapshot
+from productos.resumenes import datos_estadisticas, reconstruir_estadisticas
+
+
+class Command(BaseCommand):
+    help = 'Reconstruir desde cero el snapshot de estadísticas y reportar diferencias'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Sólo comparar el snapshot actual con un recálculo, sin guardarlo',
+        )
+
+    def handle(self, *args, **options):
+        anterior = EstadisticaSnapshot.objects.filter(pk=1).first()
+        datos_anteriores = datos_estadisticas(anterior) if anterior else None
+
+        if options['check']:
+            # El recálculo se descarta: sólo interesa la comparación
+            with transaction.atomic():
+                datos_nuevos = datos_estadisticas(reconstruir_estadisticas())
+                transaction.set_rollback(True)
+        else:
+            datos_nuevos = datos_estadisticas(reconstruir_estadisticas())
+            invalidar()
+
+        if datos_anteriores is None:
+            self.stdout.write(self.style.WARNING('⚠️ No había snapshot previo'))
+        else:
+            diferencias = [clave for clave in datos_nuevos if datos_nuevos[clave] != datos_anteriores.get(clave)]
+            if diferencias:
+                for clave in diferencias:
+                    self.stdout.write(self.style.WARNING(
+                        f'  ⚠️ {clave}: snapshot={datos_anteriores.get(clave)!r} recalculado={datos_nuevos[clave]!r}'
+                    ))
+            else:
+                self.stdout.write(self.style.SUCCESS('  ✅ El snapshot coincide con el recálculo'))
+
+        if not options['check']:
+            self.stdout.write(self.style.SUCCESS(f'✅ Estadísticas reconstruidas: {datos_nuevos["total_productos"]} productos'))
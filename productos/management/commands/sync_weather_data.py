@@ -10,16 +10,22 @@ class Command(BaseCommand):
             type=str,
             help='Tipo específico a sincronizar (wrf, aire, fwi, rutas)',
         )
+        parser.add_argument(
+            '--completo',
+            action='store_true',
+            help='Reprocesar todas las celdas WRF aunque el checkpoint las marque completas',
+        )
     
     def handle(self, *args, **options):
         tipo = options.get('type')
+        completo = options['completo']
         
         # Ejecutar sincronización sin Celery para el comando inicial
         from productos.tasks import sync_wrf_data, sync_medicion_aire, sync_fwi_data, sync_rutas_caminera
         results = []
         try:
             if tipo == 'wrf':
-                result = sync_wrf_data()
+                result = sync_wrf_data(completo=completo)
                 self.stdout.write(self.style.SUCCESS(f'WRF sync: {result}'))
             elif tipo == 'aire':
                 result = sync_medicion_aire()
@@ -31,7 +37,7 @@ class Command(BaseCommand):
                 result = sync_rutas_caminera()
                 self.stdout.write(self.style.SUCCESS(f'Rutas sync: {result}'))
             else:
-                results.append(sync_wrf_data())
+                results.append(sync_wrf_data(completo=completo))
                 results.append(sync_medicion_aire())
                 results.append(sync_fwi_data())
                 results.append(sync_rutas_caminera())
@@ -0,0 +1,112 @@
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.http import http_date, parse_etags
+from django.views.decorators.http import require_http_methods
+import mimetypes
+import os
+import re
+
+# productos/ab/<sha256>.png, derivadas/ab/<sha256>-thumb.webp: el contenido nunca cambia
+RUTA_POR_HASH = re.compile(r'^(productos|derivadas)/[0-9a-f]{2}/(?P<etag>[0-9a-f]{64}(-\w+)?)\.\w+$')
+RANGO = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def _cabeceras(path, stat):
+    """Cache-Control, ETag y Last-Modified según el tipo de ruta"""
+    match = RUTA_POR_HASH.match(path)
+    if match:
+        etag = f'"{match["etag"]}"'
+        cache_control = f'public, max-age={settings.MEDIA_CACHE_MAX_AGE}, immutable'
+    else:
+        # Rutas antiguas (productos/FWI.png) pueden cambiar de contenido
+        etag = f'"{int(stat.st_mtime):x}-{stat.st_size:x}"'
+        cache_control = f'public, max-age={settings.MEDIA_CACHE_MAX_AGE_MUTABLE}'
+    return {
+        'ETag': etag,
+        'Cache-Control': cache_control,
+        'Last-Modified': http_date(stat.st_mtime),
+        'Accept-Ranges': 'bytes',
+    }
+
+
+def _rango(header, size):
+    """Interpretar un único rango ``bytes=a-b``; None si no aplica, False si es inválido"""
+    match = RANGO.match(header or '')
+    if not match or size == 0:
+        return None
+    inicio, fin = match.groups()
+    if not inicio and not fin:
+        return False
+    if not inicio:
+        # bytes=-N: los últimos N bytes
+        inicio, fin = max(size - int(fin), 0), size - 1
+    else:
+        inicio, fin = int(inicio), min(int(fin), size - 1) if fin else size - 1
+    if inicio >= size or inicio > fin:
+        return False
+    return inicio, fin
+
+
+def _leer(path, inicio, largo, chunk_size=64 * 1024):
+    with open(path, 'rb') as archivo:
+        archivo.seek(inicio)
+        while largo > 0:
+            bloque = archivo.read(min(chunk_size, largo))
+            if not bloque:
+                break
+            largo -= len(bloque)
+            yield bloque
+
+
+@require_http_methods(['GET', 'HEAD'])
+def serve_media(request, path):
+    """Servir MEDIA_ROOT con caché inmutable, ETag y Range.
+
+    Con ``MEDIA_SERVING='x-accel'`` o ``'x-sendfile'`` Django sólo resuelve
+    la ruta y las cabeceras; nginx/Apache envían los bytes (y los rangos).
+    """
+    if path.startswith('tmp/'):
+        # Descargas en curso (ver storage._tmp_dir)
+        raise Http404('Archivo no encontrado')
+    try:
+        absoluta = safe_join(settings.MEDIA_ROOT, path)
+        stat = os.stat(absoluta)
+    except (SuspiciousFileOperation, OSError):
+        raise Http404('Archivo no encontrado')
+    if not os.path.isfile(absoluta):
+        raise Http404('Archivo no encontrado')
+
+    cabeceras = _cabeceras(path, stat)
+    if cabeceras['ETag'] in parse_etags(request.headers.get('If-None-Match', '')):
+        respuesta = HttpResponseNotModified()
+        for nombre in ('ETag', 'Cache-Control', 'Last-Modified'):
+            respuesta[nombre] = cabeceras[nombre]
+        return respuesta
+
+    content_type = mimetypes.guess_type(absoluta)[0] or 'application/octet-stream'
+
+    if settings.MEDIA_SERVING == 'x-accel':
+        respuesta = HttpResponse(content_type=content_type)
+        respuesta['X-Accel-Redirect'] = settings.MEDIA_ACCEL_PREFIX.rstrip('/') + '/' + path
+    elif settings.MEDIA_SERVING == 'x-sendfile':
+        respuesta = HttpResponse(content_type=content_type)
+        respuesta['X-Sendfile'] = absoluta
+    else:
+        rango = _rango(request.headers.get('Range'), stat.st_size)
+        if rango is False:
+            respuesta = HttpResponse(status=416)
+            respuesta['Content-Range'] = f'bytes */{stat.st_size}'
+            return respuesta
+        if rango:
+            inicio, fin = rango
+            respuesta = StreamingHttpResponse(_leer(absoluta, inicio, fin - inicio + 1), status=206, content_type=content_type)
+            respuesta['Content-Range'] = f'bytes {inicio}-{fin}/{stat.st_size}'
+            respuesta['Content-Length'] = str(fin - inicio + 1)
+        else:
+            respuesta = FileResponse(open(absoluta, 'rb'), content_type=content_type)
+
+    for nombre, valor in cabeceras.items():
+        respuesta[nombre] = valor
+    return respuesta
@@ -0,0 +1,51 @@
+# Generated by Django 4.2.7 on 2026-10-17 22:51
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def fusionar_duplicados(apps, schema_editor):
+    """Fusionar los productos repetidos por (tipo, nombre_archivo) antes de la restricción única.
+
+    Sobrevive el producto con imagen (o el más antiguo); sus fechas se
+    completan con las de los duplicados y luego éstos se borran.
+    """
+    Producto = apps.get_model('productos', 'Producto')
+    FechaProducto = apps.get_model('productos', 'FechaProducto')
+
+    grupos = Producto.objects.values('tipo_producto', 'nombre_archivo').annotate(total=Count('id')).filter(total__gt=1)
+    for grupo in grupos:
+        productos = sorted(
+            Producto.objects.filter(tipo_producto=grupo['tipo_producto'], nombre_archivo=grupo['nombre_archivo']),
+            key=lambda p: (not p.foto, p.pk),
+        )
+        superviviente, duplicados = productos[0], [p.pk for p in productos[1:]]
+
+        existentes = set(FechaProducto.objects.filter(producto=superviviente).values_list('fecha', 'hora'))
+        for fecha in FechaProducto.objects.filter(producto_id__in=duplicados).order_by('pk'):
+            if (fecha.fecha, fecha.hora) in existentes:
+                continue
+            existentes.add((fecha.fecha, fecha.hora))
+            fecha.producto = superviviente
+            fecha.save(update_fields=['producto'])
+
+        Producto.objects.filter(pk__in=duplicados).delete()
+
+    if schema_editor.connection.vendor == 'postgresql':
+        # Las FK diferidas dejan eventos pendientes que impiden el ALTER TABLE siguiente
+        schema_editor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(fusionar_duplicados, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='producto',
+            constraint=models.UniqueConstraint(fields=('tipo_producto', 'nombre_archivo'), name='unique_tipo_producto_nombre_archivo'),
+        ),
+    ]
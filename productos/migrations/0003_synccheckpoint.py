@@ -0,0 +1,36 @@
+# Generated by Django 4.2.7 on 2026-10-17 22:55
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0002_producto_unique_nombre_archivo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('corrida', models.CharField(max_length=2)),
+                ('variable', models.CharField(max_length=50)),
+                ('frames_esperados', models.PositiveSmallIntegerField()),
+                ('frames_descargados', models.PositiveSmallIntegerField(default=0)),
+                ('completo', models.BooleanField(default=False)),
+                ('actualizado', models.DateTimeField(auto_now=True)),
+                ('tipo_producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='checkpoints', to='productos.tipoproducto')),
+            ],
+            options={
+                'verbose_name': 'Checkpoint de Sincronización',
+                'verbose_name_plural': 'Checkpoints de Sincronización',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='synccheckpoint',
+            constraint=models.UniqueConstraint(fields=('tipo_producto', 'fecha', 'corrida', 'variable'), name='unique_checkpoint_celda'),
+        ),
+    ]
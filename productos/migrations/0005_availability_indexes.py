@@ -0,0 +1,21 @@
+# Generated by Django 4.2.7 on 2026-10-17 22:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0004_producto_content_hash'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='fechaproducto',
+            index=models.Index(fields=['producto', 'fecha', 'hora'], include=('fecha_creacion',), name='fechaprod_prod_fecha_hora_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(fields=['tipo_producto', 'variable'], name='producto_tipo_variable_idx'),
+        ),
+    ]
@@ -0,0 +1,72 @@
+# Generated by Django 4.2.7 on 2026-10-17 23:03
+
+from datetime import datetime, time, timedelta, timezone
+from django.db import migrations, models
+import django.db.models.deletion
+import re
+
+# {variable}-YYYY-MM-DD_HH+LL.png
+NOMBRE_WRF = re.compile(r'^(?P<variable>.+)-(?P<fecha>\d{4}-\d{2}-\d{2})_(?P<corrida>\d{2})\+(?P<lead>\d{2,3})\.png$')
+
+
+def poblar_frames(apps, schema_editor):
+    """Crear los frames de los productos WRF ya ingeridos a partir de su nombre de archivo"""
+    Producto = apps.get_model('productos', 'Producto')
+    ForecastFrame = apps.get_model('productos', 'ForecastFrame')
+
+    lote = []
+    productos = Producto.objects.filter(tipo_producto__nombre='wrf_cba').values_list('id', 'nombre_archivo', 'foto')
+    for producto_id, nombre, foto in productos.iterator(chunk_size=2000):
+        match = NOMBRE_WRF.match(nombre)
+        if not match:
+            continue
+        fecha_corrida = datetime.strptime(match['fecha'], '%Y-%m-%d').date()
+        corrida, lead = int(match['corrida']), int(match['lead'])
+        lote.append(ForecastFrame(
+            producto_id=producto_id,
+            variable=match['variable'],
+            fecha_corrida=fecha_corrida,
+            corrida=corrida,
+            lead=lead,
+            valido=datetime.combine(fecha_corrida, time(corrida), tzinfo=timezone.utc) + timedelta(hours=lead),
+            imagen=foto or '',
+        ))
+        if len(lote) >= 2000:
+            ForecastFrame.objects.bulk_create(lote, ignore_conflicts=True)
+            lote = []
+    if lote:
+        ForecastFrame.objects.bulk_create(lote, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0005_availability_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ForecastFrame',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('variable', models.CharField(max_length=50)),
+                ('fecha_corrida', models.DateField()),
+                ('corrida', models.PositiveSmallIntegerField()),
+                ('lead', models.PositiveSmallIntegerField()),
+                ('valido', models.DateTimeField()),
+                ('imagen', models.CharField(blank=True, default='', max_length=255)),
+                ('producto', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='frame', to='productos.producto')),
+            ],
+            options={
+                'verbose_name': 'Frame de Pronóstico',
+                'verbose_name_plural': 'Frames de Pronóstico',
+                'ordering': ['variable', 'fecha_corrida', 'corrida', 'lead'],
+                'indexes': [models.Index(fields=['valido', 'variable'], name='frame_valido_variable_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='forecastframe',
+            constraint=models.UniqueConstraint(fields=('variable', 'fecha_corrida', 'corrida', 'lead'), name='unique_forecast_frame'),
+        ),
+        migrations.RunPython(poblar_frames, migrations.RunPython.noop),
+    ]
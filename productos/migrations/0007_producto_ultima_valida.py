@@ -0,0 +1,35 @@
+# Generated by Django 4.2.7 on 2026-10-17 23:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0006_forecastframe'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='producto',
+            name='ultima_valida',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunSQL(
+            """
+            UPDATE productos_producto p
+            SET ultima_valida = ultima.valida
+            FROM (
+                SELECT producto_id, MAX((fecha + hora) AT TIME ZONE 'UTC') AS valida
+                FROM productos_fechaproducto
+                GROUP BY producto_id
+            ) ultima
+            WHERE ultima.producto_id = p.id
+            """,
+            migrations.RunSQL.noop,
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(models.OrderBy(models.F('ultima_valida'), descending=True, nulls_last=True), models.OrderBy(models.F('id'), descending=True), name='producto_ultima_valida_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-17 23:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0007_producto_ultima_valida'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(models.F('tipo_producto'), models.OrderBy(models.F('ultima_valida'), descending=True, nulls_last=True), models.OrderBy(models.F('id'), descending=True), name='producto_tipo_ultima_idx'),
+        ),
+    ]
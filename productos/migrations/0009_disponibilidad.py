@@ -0,0 +1,41 @@
+# Generated by Django 4.2.7 on 2026-10-17 23:08
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0008_producto_tipo_ultima_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Disponibilidad',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('hora', models.TimeField()),
+                ('variable', models.CharField(blank=True, max_length=50, null=True)),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('tipo_producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='disponibilidad', to='productos.tipoproducto')),
+            ],
+            options={
+                'verbose_name': 'Disponibilidad',
+                'verbose_name_plural': 'Disponibilidad',
+                'ordering': ['-fecha', 'hora', 'variable'],
+                'indexes': [models.Index(fields=['tipo_producto', 'fecha', 'hora'], name='disponibilidad_tipo_fecha_idx')],
+            },
+        ),
+        migrations.RunSQL(
+            """
+            INSERT INTO productos_disponibilidad (tipo_producto_id, fecha, hora, variable, total)
+            SELECT p.tipo_producto_id, f.fecha, f.hora, p.variable, COUNT(*)
+            FROM productos_fechaproducto f
+            JOIN productos_producto p ON p.id = f.producto_id
+            GROUP BY p.tipo_producto_id, f.fecha, f.hora, p.variable
+            """,
+            migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.7 on 2026-10-17 23:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0009_disponibilidad'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EstadisticaSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_productos', models.PositiveIntegerField(default=0)),
+                ('productos_por_tipo', models.JSONField(default=list)),
+                ('variables_wrf', models.JSONField(default=list)),
+                ('fechas_por_dia', models.JSONField(default=dict)),
+                ('datos_por_fecha', models.JSONField(default=list)),
+                ('actualizado', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Snapshot de Estadísticas',
+                'verbose_name_plural': 'Snapshot de Estadísticas',
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-17 23:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0010_estadisticasnapshot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='producto',
+            name='derivadas_sha',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+    ]
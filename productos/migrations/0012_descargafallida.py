@@ -0,0 +1,31 @@
+# Generated by Django 4.2.7 on 2026-10-17 23:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0011_producto_derivadas_sha'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DescargaFallida',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('url', models.URLField(max_length=500, unique=True)),
+                ('intentos', models.PositiveIntegerField(default=0)),
+                ('ultimo_estado', models.CharField(blank=True, max_length=100)),
+                ('primer_fallo', models.DateTimeField(auto_now_add=True)),
+                ('ultimo_intento', models.DateTimeField()),
+                ('proximo_intento', models.DateTimeField()),
+                ('abandonada', models.BooleanField(default=False)),
+            ],
+            options={
+                'verbose_name': 'Descarga Fallida',
+                'verbose_name_plural': 'Descargas Fallidas',
+                'ordering': ['-ultimo_intento'],
+            },
+        ),
+    ]
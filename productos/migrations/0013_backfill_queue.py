@@ -0,0 +1,41 @@
+# Generated by Django 4.2.7 on 2026-10-17 23:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0012_descargafallida'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BackfillProgreso',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('iniciado', models.DateTimeField(auto_now_add=True)),
+                ('actualizado', models.DateTimeField(auto_now=True)),
+                ('terminado', models.DateTimeField(blank=True, null=True)),
+                ('motivo', models.CharField(blank=True, max_length=20)),
+                ('cursor', models.JSONField(blank=True, null=True)),
+                ('procesados', models.PositiveIntegerField(default=0)),
+                ('descargados', models.PositiveIntegerField(default=0)),
+                ('bytes', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Progreso de Backfill',
+                'verbose_name_plural': 'Progreso de Backfill',
+                'ordering': ['-iniciado'],
+            },
+        ),
+        migrations.AddField(
+            model_name='tipoproducto',
+            name='prioridad',
+            field=models.SmallIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(condition=models.Q(('foto', ''), ('foto__isnull', True), _connector='OR'), fields=['ultima_valida'], name='producto_sin_foto_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-17 23:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0013_backfill_queue'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tipoproducto',
+            name='retencion_dias',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
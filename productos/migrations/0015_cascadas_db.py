@@ -0,0 +1,42 @@
+# Generated by Django 4.2.7 on 2026-10-17 23:40
+
+from django.db import migrations
+
+# Django 4.2 emula on_delete=CASCADE recorriendo las filas relacionadas desde
+# Python. Las FK de fechas y frames pasan a ON DELETE CASCADE en la base para
+# los borrados con SQL directo. Una migración futura que altere estas FK lo
+# pierde: la purga (retencion.py) no depende de esto y borra fechas y frames
+# explícitamente antes que los productos.
+FK_PRODUCTO = """
+DO $$
+DECLARE r record;
+BEGIN
+    FOR r IN
+        SELECT c.conname, c.conrelid::regclass AS tabla
+        FROM pg_constraint c
+        WHERE c.contype = 'f'
+          AND c.confrelid = 'productos_producto'::regclass
+          AND c.conrelid IN ('productos_fechaproducto'::regclass, 'productos_forecastframe'::regclass)
+    LOOP
+        EXECUTE format('ALTER TABLE %s DROP CONSTRAINT %I', r.tabla, r.conname);
+        EXECUTE format(
+            'ALTER TABLE %s ADD CONSTRAINT %I FOREIGN KEY (producto_id) REFERENCES productos_producto (id) {accion} DEFERRABLE INITIALLY DEFERRED',
+            r.tabla, r.conname
+        );
+    END LOOP;
+END $$;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0014_tipoproducto_retencion_dias'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            FK_PRODUCTO.format(accion='ON DELETE CASCADE'),
+            FK_PRODUCTO.format(accion=''),
+        ),
+    ]
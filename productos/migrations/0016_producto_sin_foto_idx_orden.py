@@ -0,0 +1,45 @@
+# Generated by Django 4.2.7 on 2026-10-17 23:52
+
+import datetime
+from django.db import migrations, models
+import django.db.models.functions.comparison
+import django.db.models.functions.datetime
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0015_cascadas_db'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='producto',
+            name='producto_sin_foto_idx',
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(
+                models.OrderBy(
+                    django.db.models.functions.datetime.TruncDate(
+                        django.db.models.functions.comparison.Coalesce(
+                            models.F('ultima_valida'),
+                            models.Value(datetime.datetime(1970, 1, 1, 0, 0, tzinfo=datetime.timezone.utc)),
+                        ),
+                        tzinfo=datetime.timezone.utc,
+                    ),
+                    descending=True,
+                ),
+                models.OrderBy(
+                    django.db.models.functions.comparison.Coalesce(
+                        models.F('ultima_valida'),
+                        models.Value(datetime.datetime(1970, 1, 1, 0, 0, tzinfo=datetime.timezone.utc)),
+                    ),
+                    descending=True,
+                ),
+                models.OrderBy(models.F('id'), descending=True),
+                condition=models.Q(('foto', ''), ('foto__isnull', True), _connector='OR'),
+                name='producto_sin_foto_idx',
+            ),
+        ),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 4.2.7 on 2026-10-18 00:12
+
+from django.db import migrations, models
+
+
+def mover_animaciones(apps, schema_editor):
+    """Pasar las animaciones guardadas como productos 'wrf_cba_animacion' a su tabla y borrar ese tipo.
+
+    El snapshot de estadísticas los contaba: se borra para que se reconstruya.
+    """
+    TipoProducto = apps.get_model('productos', 'TipoProducto')
+    FechaProducto = apps.get_model('productos', 'FechaProducto')
+    ForecastFrame = apps.get_model('productos', 'ForecastFrame')
+    AnimacionWRF = apps.get_model('productos', 'AnimacionWRF')
+    EstadisticaSnapshot = apps.get_model('productos', 'EstadisticaSnapshot')
+
+    tipo = TipoProducto.objects.filter(nombre='wrf_cba_animacion').first()
+    if tipo is None:
+        return
+
+    animaciones = []
+    for fecha in FechaProducto.objects.filter(producto__tipo_producto=tipo).exclude(
+        producto__foto=''
+    ).exclude(producto__foto__isnull=True).select_related('producto'):
+        producto = fecha.producto
+        animaciones.append(AnimacionWRF(
+            variable=producto.variable,
+            fecha_corrida=fecha.fecha,
+            corrida=fecha.hora.hour,
+            imagen=producto.foto,
+            frames=ForecastFrame.objects.filter(
+                variable=producto.variable, fecha_corrida=fecha.fecha, corrida=fecha.hora.hour
+            ).exclude(imagen='').count(),
+        ))
+    AnimacionWRF.objects.bulk_create(animaciones, ignore_conflicts=True)
+
+    tipo.delete()
+    EstadisticaSnapshot.objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0016_producto_sin_foto_idx_orden'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnimacionWRF',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('variable', models.CharField(max_length=50)),
+                ('fecha_corrida', models.DateField()),
+                ('corrida', models.PositiveSmallIntegerField()),
+                ('imagen', models.CharField(max_length=255)),
+                ('frames', models.PositiveSmallIntegerField(default=0)),
+                ('actualizada', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Animación WRF',
+                'verbose_name_plural': 'Animaciones WRF',
+                'ordering': ['variable', 'fecha_corrida', 'corrida'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='animacionwrf',
+            constraint=models.UniqueConstraint(fields=('variable', 'fecha_corrida', 'corrida'), name='unique_animacion_wrf'),
+        ),
+        migrations.RunPython(mover_animaciones, migrations.RunPython.noop),
+    ]
@@ -1,10 +1,19 @@
+from datetime import datetime, timezone as dt_timezone
 from django.db import models
+from django.db.models.functions import Coalesce, TruncDate
 from django.utils import timezone
 
+# Los productos sin fecha válida van al final de la cola de backfill
+SIN_FECHA = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
 class TipoProducto(models.Model):
     nombre = models.CharField(max_length=100, unique=True)
     descripcion = models.TextField()
     url = models.URLField()
+    # Dentro de un mismo día, el backfill de imágenes atiende primero los tipos de mayor prioridad
+    prioridad = models.SmallIntegerField(default=0)
+    # Días que se conservan sus productos; vacío = RETENCION_DIAS_DEFAULT, 0 = sin purga
+    retencion_dias = models.PositiveIntegerField(null=True, blank=True)
     
     class Meta:
         verbose_name = "Tipo de Producto"
@@ -13,16 +22,59 @@ class TipoProducto(models.Model):
     def __str__(self):
         return self.nombre
 
+class ProductoQuerySet(models.QuerySet):
+    def con_ultima_fecha(self):
+        """Anotar la fecha/hora más reciente de cada producto con subconsultas"""
+        ultima = FechaProducto.objects.filter(producto=models.OuterRef('pk')).order_by('-fecha', '-hora')
+        return self.annotate(
+            ultima_fecha_dia=models.Subquery(ultima.values('fecha')[:1]),
+            ultima_fecha_hora=models.Subquery(ultima.values('hora')[:1]),
+            ultima_fecha_creacion=models.Subquery(ultima.values('fecha_creacion')[:1]),
+        )
+
 class Producto(models.Model):
     foto = models.ImageField(upload_to='productos/', null=True, blank=True)
     url_imagen = models.URLField(max_length=500)
     tipo_producto = models.ForeignKey(TipoProducto, on_delete=models.CASCADE)
     variable = models.CharField(max_length=50, null=True, blank=True)  # Para WRF
     nombre_archivo = models.CharField(max_length=200)
+    sha256 = models.CharField(max_length=64, blank=True, default='', db_index=True)
+    etag = models.CharField(max_length=200, blank=True, default='')
+    last_modified = models.CharField(max_length=100, blank=True, default='')
+    derivadas_sha = models.CharField(max_length=64, blank=True, default='')  # Hash cuyas variantes ya existen
+    ultima_valida = models.DateTimeField(null=True, blank=True)  # Fecha+hora (UTC) más reciente, mantenida por la ingesta
+    
+    objects = ProductoQuerySet.as_manager()
     
     class Meta:
         verbose_name = "Producto"
         verbose_name_plural = "Productos"
+        constraints = [
+            models.UniqueConstraint(fields=['tipo_producto', 'nombre_archivo'], name='unique_tipo_producto_nombre_archivo'),
+        ]
+        indexes = [
+            # Filtros por tipo + variable (variables_disponibles, productos_por_fecha_hora)
+            models.Index(fields=['tipo_producto', 'variable'], name='producto_tipo_variable_idx'),
+            # Paginación por cursor: ORDER BY ultima_valida DESC NULLS LAST, id DESC
+            models.Index(
+                models.F('ultima_valida').desc(nulls_last=True), models.F('id').desc(),
+                name='producto_ultima_valida_idx'
+            ),
+            # Último producto de cada tipo (DISTINCT ON tipo_producto)
+            models.Index(
+                models.F('tipo_producto'), models.F('ultima_valida').desc(nulls_last=True), models.F('id').desc(),
+                name='producto_tipo_ultima_idx'
+            ),
+            # Cola de backfill: sólo los productos sin imagen, en el orden de
+            # backfill.candidatos (la prioridad del tipo se ordena dentro de cada día)
+            models.Index(
+                TruncDate(Coalesce(models.F('ultima_valida'), models.Value(SIN_FECHA)), tzinfo=dt_timezone.utc).desc(),
+                Coalesce(models.F('ultima_valida'), models.Value(SIN_FECHA)).desc(),
+                models.F('id').desc(),
+                condition=models.Q(foto='') | models.Q(foto__isnull=True),
+                name='producto_sin_foto_idx'
+            ),
+        ]
     
     def __str__(self):
         return f"{self.tipo_producto.nombre} - {self.nombre_archivo}"
@@ -36,8 +88,156 @@ class FechaProducto(models.Model):
     class Meta:
         verbose_name = "Fecha de Producto"
         verbose_name_plural = "Fechas de Productos"
-        unique_together = ['fecha', 'hora', 'producto']
         ordering = ['-fecha', '-hora']
+        constraints = [
+            # También sirve como índice (fecha, hora) para los filtros por fecha/hora
+            models.UniqueConstraint(fields=['fecha', 'hora', 'producto'], name='unique_fecha_hora_producto'),
+        ]
+        indexes = [
+            # Fechas de un producto y "última fecha por producto" con index-only scan
+            models.Index(fields=['producto', 'fecha', 'hora'], include=['fecha_creacion'], name='fechaprod_prod_fecha_hora_idx'),
+        ]
     
     def __str__(self):
         return f"{self.producto} - {self.fecha} {self.hora}"
+
+class ForecastFrame(models.Model):
+    """Frame WRF desnormalizado: corrida, plazo y hora válida en columnas tipadas"""
+    producto = models.OneToOneField(Producto, on_delete=models.CASCADE, related_name='frame')
+    variable = models.CharField(max_length=50)
+    fecha_corrida = models.DateField()
+    corrida = models.PositiveSmallIntegerField()  # Hora UTC de inicio de la corrida
+    lead = models.PositiveSmallIntegerField()  # Horas de pronóstico desde el inicio
+    valido = models.DateTimeField()
+    imagen = models.CharField(max_length=255, blank=True, default='')  # Ruta dentro de MEDIA_ROOT
+    
+    class Meta:
+        verbose_name = "Frame de Pronóstico"
+        verbose_name_plural = "Frames de Pronóstico"
+        ordering = ['variable', 'fecha_corrida', 'corrida', 'lead']
+        constraints = [
+            # Animación: todos los plazos de una corrida en un único range scan
+            models.UniqueConstraint(fields=['variable', 'fecha_corrida', 'corrida', 'lead'], name='unique_forecast_frame'),
+        ]
+        indexes = [
+            # Slider: frames válidos en un instante, opcionalmente por variable
+            models.Index(fields=['valido', 'variable'], name='frame_valido_variable_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.variable} {self.fecha_corrida} {self.corrida:02d}+{self.lead:02d}"
+
+class AnimacionWRF(models.Model):
+    """Animación de una corrida WRF y variable, armada con sus frames (no es un producto publicado)"""
+    variable = models.CharField(max_length=50)
+    fecha_corrida = models.DateField()
+    corrida = models.PositiveSmallIntegerField()  # Hora UTC de inicio de la corrida
+    imagen = models.CharField(max_length=255)  # Ruta dentro de MEDIA_ROOT
+    frames = models.PositiveSmallIntegerField(default=0)
+    actualizada = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = "Animación WRF"
+        verbose_name_plural = "Animaciones WRF"
+        ordering = ['variable', 'fecha_corrida', 'corrida']
+        constraints = [
+            models.UniqueConstraint(fields=['variable', 'fecha_corrida', 'corrida'], name='unique_animacion_wrf'),
+        ]
+    
+    def __str__(self):
+        return f"{self.variable} {self.fecha_corrida} {self.corrida:02d} ({self.frames} frames)"
+
+class SyncCheckpoint(models.Model):
+    """Estado de ingesta de una celda (fecha de corrida, corrida, variable)"""
+    tipo_producto = models.ForeignKey(TipoProducto, on_delete=models.CASCADE, related_name='checkpoints')
+    fecha = models.DateField()
+    corrida = models.CharField(max_length=2)
+    variable = models.CharField(max_length=50)
+    frames_esperados = models.PositiveSmallIntegerField()
+    frames_descargados = models.PositiveSmallIntegerField(default=0)
+    completo = models.BooleanField(default=False)
+    actualizado = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = "Checkpoint de Sincronización"
+        verbose_name_plural = "Checkpoints de Sincronización"
+        constraints = [
+            models.UniqueConstraint(fields=['tipo_producto', 'fecha', 'corrida', 'variable'], name='unique_checkpoint_celda'),
+        ]
+    
+    def __str__(self):
+        return f"{self.tipo_producto} - {self.fecha} {self.corrida} {self.variable} ({self.frames_descargados}/{self.frames_esperados})"
+
+class Disponibilidad(models.Model):
+    """Resumen precalculado: cantidad de productos por tipo, fecha, hora y variable"""
+    tipo_producto = models.ForeignKey(TipoProducto, on_delete=models.CASCADE, related_name='disponibilidad')
+    fecha = models.DateField()
+    hora = models.TimeField()
+    variable = models.CharField(max_length=50, null=True, blank=True)
+    total = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        verbose_name = "Disponibilidad"
+        verbose_name_plural = "Disponibilidad"
+        ordering = ['-fecha', 'hora', 'variable']
+        indexes = [
+            models.Index(fields=['tipo_producto', 'fecha', 'hora'], name='disponibilidad_tipo_fecha_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.tipo_producto} - {self.fecha} {self.hora} {self.variable or ''}: {self.total}"
+
+class EstadisticaSnapshot(models.Model):
+    """Estadísticas generales mantenidas con deltas por la ingesta (una sola fila)"""
+    total_productos = models.PositiveIntegerField(default=0)
+    productos_por_tipo = models.JSONField(default=list)  # [{nombre, count}] en orden de tipo
+    variables_wrf = models.JSONField(default=list)
+    fechas_por_dia = models.JSONField(default=dict)  # {"YYYY-MM-DD": cantidad de FechaProducto}
+    datos_por_fecha = models.JSONField(default=list)  # Últimas 10 fechas WRF
+    actualizado = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = "Snapshot de Estadísticas"
+        verbose_name_plural = "Snapshot de Estadísticas"
+    
+    def __str__(self):
+        return f"Estadísticas ({self.total_productos} productos, {self.actualizado})"
+
+class DescargaFallida(models.Model):
+    """Registro de URLs de imagen que fallaron, con backoff entre reintentos"""
+    url = models.URLField(max_length=500, unique=True)
+    intentos = models.PositiveIntegerField(default=0)
+    ultimo_estado = models.CharField(max_length=100, blank=True)  # Código HTTP o error de red
+    primer_fallo = models.DateTimeField(auto_now_add=True)
+    ultimo_intento = models.DateTimeField()
+    proximo_intento = models.DateTimeField()
+    abandonada = models.BooleanField(default=False)
+    
+    class Meta:
+        verbose_name = "Descarga Fallida"
+        verbose_name_plural = "Descargas Fallidas"
+        ordering = ['-ultimo_intento']
+    
+    def __str__(self):
+        estado = 'abandonada' if self.abandonada else f"próximo intento {self.proximo_intento}"
+        return f"{self.url} ({self.intentos} intentos, {self.ultimo_estado}, {estado})"
+
+class BackfillProgreso(models.Model):
+    """Avance de una pasada de download_missing_images, para reanudarla si se corta"""
+    iniciado = models.DateTimeField(auto_now_add=True)
+    actualizado = models.DateTimeField(auto_now=True)
+    terminado = models.DateTimeField(null=True, blank=True)
+    motivo = models.CharField(max_length=20, blank=True)  # completo, bytes, tiempo, error o reiniciado
+    cursor = models.JSONField(null=True, blank=True)  # [día, prioridad, válida, id] del último procesado
+    procesados = models.PositiveIntegerField(default=0)
+    descargados = models.PositiveIntegerField(default=0)
+    bytes = models.BigIntegerField(default=0)
+    
+    class Meta:
+        verbose_name = "Progreso de Backfill"
+        verbose_name_plural = "Progreso de Backfill"
+        ordering = ['-iniciado']
+    
+    def __str__(self):
+        estado = self.motivo or 'en curso'
+        return f"Backfill {self.iniciado:%Y-%m-%d %H:%M} ({estado}, {self.descargados}/{self.procesados}, {self.bytes} bytes)"
@@ -0,0 +1,95 @@
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import requests
+import threading
+import logging
+import random
+import os
+
+logger = logging.getLogger(__name__)
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+
+_lock = threading.Lock()
+_sessions = {}
+
+
+class JitterRetry(Retry):
+    """Retry con backoff exponencial más un jitter aleatorio entre reintentos"""
+
+    def __init__(self, *args, jitter=0.0, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.jitter = jitter
+
+    def new(self, **kwargs):
+        retry = super().new(**kwargs)
+        retry.jitter = self.jitter
+        return retry
+
+    def get_backoff_time(self):
+        backoff = super().get_backoff_time()
+        if backoff <= 0:
+            return backoff
+        return min(getattr(self, 'backoff_max', self.DEFAULT_BACKOFF_MAX), backoff + random.uniform(0, self.jitter))
+
+
+def build_session():
+    """Sesión con keep-alive, pool de conexiones dimensionado y reintentos"""
+    retry = JitterRetry(
+        total=settings.OHMC_HTTP_RETRIES,
+        connect=settings.OHMC_HTTP_RETRIES,
+        read=settings.OHMC_HTTP_RETRIES,
+        status=settings.OHMC_HTTP_RETRIES,
+        status_forcelist=(500, 502, 503, 504),
+        allowed_methods=frozenset({'GET', 'HEAD'}),
+        backoff_factor=settings.OHMC_HTTP_BACKOFF,
+        jitter=settings.OHMC_HTTP_BACKOFF_JITTER,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=settings.OHMC_HTTP_POOL_CONNECTIONS,
+        pool_maxsize=max(settings.OHMC_HTTP_POOL_MAXSIZE, settings.OHMC_DOWNLOAD_WORKERS),
+        max_retries=retry,
+    )
+
+    session = requests.Session()
+    session.headers.update({'User-Agent': USER_AGENT})
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def get_session():
+    """Sesión compartida del proceso actual.
+
+    Se indexa por PID para que cada worker de Celery (prefork) abra su propio
+    pool en lugar de heredar sockets del proceso padre.
+    """
+    pid = os.getpid()
+    session = _sessions.get(pid)
+    if session is None:
+        with _lock:
+            session = _sessions.get(pid)
+            if session is None:
+                _sessions.clear()
+                session = _sessions[pid] = build_session()
+                logger.debug(f"Nueva sesión HTTP OHMC para el proceso {pid}")
+    return session
+
+
+def default_timeout():
+    return (settings.OHMC_HTTP_CONNECT_TIMEOUT, settings.OHMC_HTTP_READ_TIMEOUT)
+
+
+def get(url, **kwargs):
+    """GET contra OHMC con la sesión compartida y los timeouts por defecto"""
+    kwargs.setdefault('timeout', default_timeout())
+    return get_session().get(url, **kwargs)
+
+
+def head(url, **kwargs):
+    """HEAD contra OHMC con la sesión compartida y los timeouts por defecto"""
+    kwargs.setdefault('timeout', default_timeout())
+    kwargs.setdefault('allow_redirects', True)
+    return get_session().head(url, **kwargs)
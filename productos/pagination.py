@@ -0,0 +1,79 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime
+from django.db.models import F, Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class ProductoPagination(PageNumberPagination):
+    """Paginación por número de página o, con ``?cursor=``, por keyset.
+
+    El modo cursor recorre los productos por ``(ultima_valida, id)``
+    descendente filtrando a partir del último elemento de la página anterior,
+    por lo que la página 500 cuesta lo mismo que la primera. El total sólo se
+    calcula si se pide con ``?count=true``.
+    """
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+    ordering = (F('ultima_valida').desc(nulls_last=True), F('id').desc())
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_mode = self.cursor_query_param in request.query_params
+        if not self.cursor_mode:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        self.count = queryset.count() if request.query_params.get(self.count_query_param) == 'true' else None
+        page_size = self.get_page_size(request)
+
+        queryset = queryset.order_by(*self.ordering)
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            queryset = queryset.filter(self.after(*self.decode_cursor(cursor)))
+
+        # Un elemento extra indica si hay página siguiente sin contar
+        page = list(queryset[:page_size + 1])
+        self.has_next = len(page) > page_size
+        self.page = page[:page_size]
+        return self.page
+
+    def after(self, valida, pk):
+        """Productos que van después de (valida, pk) en el orden del cursor"""
+        if valida is None:
+            return Q(ultima_valida__isnull=True, id__lt=pk)
+        return (
+            Q(ultima_valida__lt=valida)
+            | Q(ultima_valida=valida, id__lt=pk)
+            | Q(ultima_valida__isnull=True)
+        )
+
+    def encode_cursor(self, producto):
+        valida = producto.ultima_valida.isoformat() if producto.ultima_valida else ''
+        return urlsafe_b64encode(f"{valida}|{producto.pk}".encode()).decode()
+
+    def decode_cursor(self, cursor):
+        try:
+            valida, pk = urlsafe_b64decode(cursor.encode()).decode().split('|')
+            return (datetime.fromisoformat(valida) if valida else None), int(pk)
+        except (ValueError, UnicodeDecodeError):
+            raise NotFound('Cursor inválido')
+
+    def get_next_link(self):
+        if not self.cursor_mode:
+            return super().get_next_link()
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.page[-1]))
+
+    def get_paginated_response(self, data):
+        if not self.cursor_mode:
+            return super().get_paginated_response(data)
+        respuesta = {'next': self.get_next_link(), 'results': data}
+        if self.count is not None:
+            respuesta = {'count': self.count, **respuesta}
+        return Response(respuesta)
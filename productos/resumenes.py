@@ -0,0 +1,154 @@
+from collections import defaultdict
+from datetime import date, timedelta
+from django.db import transaction
+from django.db.models import Count, Sum
+from .models import TipoProducto, Producto, FechaProducto, Disponibilidad, EstadisticaSnapshot
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def refrescar_disponibilidad(tipo_id, fechas=None):
+    """Recalcular el resumen de disponibilidad de un tipo para esas fechas (o todas)"""
+    origen = FechaProducto.objects.filter(producto__tipo_producto_id=tipo_id)
+    destino = Disponibilidad.objects.filter(tipo_producto_id=tipo_id)
+    if fechas is not None:
+        fechas = list(fechas)
+        origen = origen.filter(fecha__in=fechas)
+        destino = destino.filter(fecha__in=fechas)
+
+    with transaction.atomic():
+        # Serializar por tipo: los shards WRF de una misma fecha refrescan en paralelo
+        list(TipoProducto.objects.select_for_update().filter(pk=tipo_id).values_list('pk', flat=True))
+        filas = [
+            Disponibilidad(tipo_producto_id=tipo_id, fecha=f['fecha'], hora=f['hora'], variable=f['producto__variable'], total=f['total'])
+            for f in origen.values('fecha', 'hora', 'producto__variable').annotate(total=Count('id')).order_by()
+        ]
+        destino.delete()
+        Disponibilidad.objects.bulk_create(filas, batch_size=1000)
+    return len(filas)
+
+
+def refrescar_fechas(claves):
+    """Recalcular el resumen para pares (tipo_id, fecha) tocados por la ingesta"""
+    por_tipo = defaultdict(set)
+    for tipo_id, fecha in claves:
+        por_tipo[tipo_id].add(fecha)
+    for tipo_id, fechas in por_tipo.items():
+        refrescar_disponibilidad(tipo_id, fechas)
+
+
+def calendario(tipo):
+    """Calendario compacto de un tipo: fechas → horas → {variable: total}"""
+    filas = Disponibilidad.objects.filter(tipo_producto=tipo).order_by('-fecha', 'hora', 'variable').values_list(
+        'fecha', 'hora', 'variable', 'total'
+    )
+
+    dias = {}
+    variables = set()
+    for fecha, hora, variable, total in filas:
+        dia = dias.setdefault(fecha, {'fecha': fecha, 'total_productos': 0, 'horas': {}})
+        horas = dia['horas'].setdefault(hora.strftime('%H:%M'), {})
+        horas[variable or ''] = total
+        dia['total_productos'] += total
+        if variable:
+            variables.add(variable)
+
+    return {
+        'tipo': tipo.nombre,
+        'variables': sorted(variables),
+        'fechas': list(dias.values()),
+    }
+
+
+def _datos_por_fecha_wrf():
+    return [
+        {'fecha': d['fecha'].isoformat(), 'total': d['total'], 'variables': d['variables'], 'horas': d['horas']}
+        for d in Disponibilidad.objects.filter(tipo_producto__nombre='wrf_cba').values('fecha').annotate(
+            total=Sum('total'),
+            variables=Count('variable', distinct=True),
+            horas=Count('hora', distinct=True)
+        ).order_by('-fecha')[:10]
+    ]
+
+
+def _variables_wrf():
+    # Desde el resumen de disponibilidad: refleja también las variables purgadas
+    return sorted(
+        Disponibilidad.objects.filter(tipo_producto__nombre='wrf_cba', variable__isnull=False).exclude(
+            variable=''
+        ).order_by('variable').values_list('variable', flat=True).distinct()
+    )
+
+
+def reconstruir_estadisticas():
+    """Recalcular desde cero el snapshot de estadísticas"""
+    with transaction.atomic():
+        snapshot, _ = EstadisticaSnapshot.objects.select_for_update().get_or_create(pk=1)
+        snapshot.total_productos = Producto.objects.count()
+        snapshot.productos_por_tipo = list(
+            TipoProducto.objects.annotate(count=Count('producto')).order_by('pk').values('nombre', 'count')
+        )
+        snapshot.variables_wrf = _variables_wrf()
+        snapshot.fechas_por_dia = {
+            fecha.isoformat(): total
+            for fecha, total in FechaProducto.objects.values('fecha').annotate(total=Count('id')).values_list('fecha', 'total')
+        }
+        snapshot.datos_por_fecha = _datos_por_fecha_wrf()
+        snapshot.save()
+    return snapshot
+
+
+def sumar_estadisticas(productos_por_tipo=None, fechas_por_dia=None, refrescar_wrf=False):
+    """Aplicar deltas al snapshot; los valores negativos descuentan (purgas).
+
+    ``refrescar_wrf`` recalcula desde Disponibilidad las partes WRF (últimas
+    fechas y variables), que no se pueden mantener con deltas.
+    """
+    with transaction.atomic():
+        snapshot = EstadisticaSnapshot.objects.select_for_update().filter(pk=1).first()
+        if snapshot is None:
+            # Sin snapshot previo se construye completo, ya incluye estos cambios
+            reconstruir_estadisticas()
+            return
+
+        por_tipo = {t['nombre']: t for t in snapshot.productos_por_tipo}
+        for nombre, delta in (productos_por_tipo or {}).items():
+            if nombre not in por_tipo:
+                por_tipo[nombre] = {'nombre': nombre, 'count': 0}
+                snapshot.productos_por_tipo.append(por_tipo[nombre])
+            por_tipo[nombre]['count'] = max(por_tipo[nombre]['count'] + delta, 0)
+            snapshot.total_productos = max(snapshot.total_productos + delta, 0)
+
+        for fecha, delta in (fechas_por_dia or {}).items():
+            clave = fecha.isoformat()
+            total = snapshot.fechas_por_dia.get(clave, 0) + delta
+            if total > 0:
+                snapshot.fechas_por_dia[clave] = total
+            else:
+                snapshot.fechas_por_dia.pop(clave, None)
+
+        if refrescar_wrf:
+            snapshot.datos_por_fecha = _datos_por_fecha_wrf()
+            snapshot.variables_wrf = _variables_wrf()
+        snapshot.save()
+
+
+def datos_estadisticas(snapshot):
+    """Respuesta de /api/estadisticas/ a partir del snapshot"""
+    desde = (date.today() - timedelta(days=30)).isoformat()
+    # El snapshot sólo conoce los tipos con deltas: se listan todos, vacíos incluidos
+    conteos = {t['nombre']: t['count'] for t in snapshot.productos_por_tipo}
+    productos_por_tipo = [
+        {'nombre': nombre, 'count': conteos.get(nombre, 0)}
+        for nombre in TipoProducto.objects.order_by('pk').values_list('nombre', flat=True)
+    ]
+    return {
+        'total_productos': snapshot.total_productos,
+        'total_tipos': len(productos_por_tipo),
+        'productos_ultimo_mes': sum(total for fecha, total in snapshot.fechas_por_dia.items() if fecha >= desde),
+        'productos_por_tipo': productos_por_tipo,
+        'variables_wrf': snapshot.variables_wrf,
+        'fechas_disponibles': sorted(snapshot.fechas_por_dia, reverse=True)[:30],
+        'datos_por_fecha': snapshot.datos_por_fecha,
+    }
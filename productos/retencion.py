@@ -0,0 +1,149 @@
+from collections import Counter
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+from .cache import invalidar
+from .models import TipoProducto, Producto, FechaProducto, SyncCheckpoint, Disponibilidad, DescargaFallida, AnimacionWRF
+from .resumenes import sumar_estadisticas
+from .storage import barrer_huerfanos
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Borrados por lotes con SQL directo, sin el collector de Django. Las fechas y
+# frames de cada lote de productos se borran explícitamente antes que los
+# productos: no se depende del ON DELETE CASCADE de la migración 0015, que una
+# migración posterior sobre esas FK eliminaría sin avisar
+BORRAR_FECHAS = """
+    DELETE FROM productos_fechaproducto
+    WHERE id IN (
+        SELECT f.id FROM productos_fechaproducto f
+        JOIN productos_producto p ON p.id = f.producto_id
+        WHERE p.tipo_producto_id = %s AND f.fecha < %s
+        LIMIT %s
+    )
+    RETURNING fecha
+"""
+
+# Sin ultima_valida el producto nunca tuvo fechas: se purga si sigue sin tenerlas.
+# FOR UPDATE frena a la ingesta que quiera agregarle fechas mientras se borra
+SELECCIONAR_PRODUCTOS = """
+    SELECT p.id FROM productos_producto p
+    WHERE p.tipo_producto_id = %s
+      AND (
+        p.ultima_valida < %s
+        OR (p.ultima_valida IS NULL AND NOT EXISTS (
+            SELECT 1 FROM productos_fechaproducto f WHERE f.producto_id = p.id
+        ))
+      )
+    LIMIT %s
+    FOR UPDATE
+"""
+
+BORRAR_FECHAS_PRODUCTOS = "DELETE FROM productos_fechaproducto WHERE producto_id = ANY(%s) RETURNING fecha"
+
+BORRAR_FRAMES_PRODUCTOS = "DELETE FROM productos_forecastframe WHERE producto_id = ANY(%s)"
+
+BORRAR_PRODUCTOS = "DELETE FROM productos_producto WHERE id = ANY(%s) RETURNING url_imagen"
+
+
+def dias_retencion(tipo):
+    """Días a conservar de un tipo (0 = no se purga)"""
+    return settings.RETENCION_DIAS_DEFAULT if tipo.retencion_dias is None else tipo.retencion_dias
+
+
+def fecha_corte(dias):
+    """Medianoche UTC de hace ``dias`` días: se purga todo lo anterior"""
+    hoy = timezone.now().astimezone(dt_timezone.utc).date()
+    return datetime.combine(hoy - timedelta(days=dias), time.min, tzinfo=dt_timezone.utc)
+
+
+def _ejecutar(sql, params):
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall() if cursor.description else []
+
+
+def _borrar_lote(sql, params):
+    return _ejecutar(sql, [*params, settings.RETENCION_LOTE])
+
+
+def _restar_fechas(fechas):
+    por_dia = Counter(fecha for (fecha,) in fechas)
+    sumar_estadisticas(fechas_por_dia={fecha: -total for fecha, total in por_dia.items()})
+
+
+def purgar_tipo(tipo, dry_run=False):
+    """Purgar las fechas y productos de un tipo anteriores a su retención.
+
+    Primero se borran las fechas vencidas (así los productos de URL fija, como
+    FWI, conservan sólo las recientes) y luego los productos cuya última fecha
+    válida quedó fuera de la retención o que no tienen ninguna fecha, con sus
+    fechas y frames restantes. Cada lote se confirma por separado con
+    su delta en las estadísticas; los archivos que quedan sin referencias los
+    borra ``barrer_huerfanos`` al final de la purga.
+    """
+    resultado = {'tipo': tipo.nombre, 'fechas': 0, 'productos': 0}
+    dias = dias_retencion(tipo)
+    if not dias:
+        return resultado
+
+    corte = fecha_corte(dias)
+    if dry_run:
+        resultado['fechas'] = FechaProducto.objects.filter(producto__tipo_producto=tipo, fecha__lt=corte.date()).count()
+        sin_fechas = Q(ultima_valida__isnull=True) & ~Exists(FechaProducto.objects.filter(producto=OuterRef('pk')))
+        resultado['productos'] = Producto.objects.filter(tipo_producto=tipo).filter(
+            Q(ultima_valida__lt=corte) | sin_fechas
+        ).count()
+        return resultado
+
+    while True:
+        with transaction.atomic():
+            fechas = _borrar_lote(BORRAR_FECHAS, [tipo.pk, corte.date()])
+            if fechas:
+                _restar_fechas(fechas)
+        resultado['fechas'] += len(fechas)
+        if len(fechas) < settings.RETENCION_LOTE:
+            break
+
+    while True:
+        with transaction.atomic():
+            ids = [pk for (pk,) in _borrar_lote(SELECCIONAR_PRODUCTOS, [tipo.pk, corte])]
+            if ids:
+                fechas = _ejecutar(BORRAR_FECHAS_PRODUCTOS, [ids])
+                if fechas:
+                    _restar_fechas(fechas)
+                _ejecutar(BORRAR_FRAMES_PRODUCTOS, [ids])
+                urls = _ejecutar(BORRAR_PRODUCTOS, [ids])
+                DescargaFallida.objects.filter(url__in=[url for (url,) in urls]).delete()
+                sumar_estadisticas(productos_por_tipo={tipo.nombre: -len(ids)})
+        resultado['productos'] += len(ids)
+        if len(ids) < settings.RETENCION_LOTE:
+            break
+
+    SyncCheckpoint.objects.filter(tipo_producto=tipo, fecha__lt=corte.date()).delete()
+    Disponibilidad.objects.filter(tipo_producto=tipo, fecha__lt=corte.date()).delete()
+    if tipo.nombre == 'wrf_cba':
+        # Sus archivos quedan huérfanos y los borra el barrido
+        AnimacionWRF.objects.filter(fecha_corrida__lt=corte.date()).delete()
+    if resultado['fechas'] or resultado['productos']:
+        sumar_estadisticas(refrescar_wrf=True)
+        invalidar(tipo.nombre)
+
+    logger.info(
+        f"Purga {tipo.nombre} (< {corte:%Y-%m-%d}): {resultado['fechas']} fechas, "
+        f"{resultado['productos']} productos"
+    )
+    return resultado
+
+
+def purgar_expirados(tipos=None, dry_run=False):
+    """Aplicar la retención a todos los tipos (o a los indicados) y barrer los huérfanos.
+
+    Devuelve ``(resultados por tipo, archivos borrados)``.
+    """
+    tipos = TipoProducto.objects.all() if tipos is None else tipos
+    resultados = [purgar_tipo(tipo, dry_run=dry_run) for tipo in tipos]
+    return resultados, barrer_huerfanos(dry_run=dry_run)
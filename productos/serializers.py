@@ -1,5 +1,18 @@
 from rest_framework import serializers
 from .models import TipoProducto, Producto, FechaProducto
+from .derivadas import imagen_urls
+
+def ultima_fecha(obj):
+    """Fecha más reciente del producto: anotada por la vista o, si falta, consultada"""
+    if not hasattr(obj, 'ultima_fecha_dia'):
+        return obj.fechas.first()
+    if obj.ultima_fecha_dia is None:
+        return None
+    return FechaProducto(
+        fecha=obj.ultima_fecha_dia,
+        hora=obj.ultima_fecha_hora,
+        fecha_creacion=obj.ultima_fecha_creacion
+    )
 
 class TipoProductoSerializer(serializers.ModelSerializer):
     class Meta:
@@ -16,14 +29,15 @@ class ProductoSerializer(serializers.ModelSerializer):
     fechas = FechaProductoSerializer(many=True, read_only=True)
     ultima_fecha = serializers.SerializerMethodField()
     imagen_url = serializers.SerializerMethodField()
+    imagen_urls = serializers.SerializerMethodField()
     
     class Meta:
         model = Producto
-        fields = ['id', 'url_imagen', 'imagen_url', 'tipo_producto', 'variable', 
+        fields = ['id', 'url_imagen', 'imagen_url', 'imagen_urls', 'tipo_producto', 'variable', 
                  'nombre_archivo', 'fechas', 'ultima_fecha']
     
     def get_ultima_fecha(self, obj):
-        ultima = obj.fechas.first()
+        ultima = ultima_fecha(obj)
         if ultima:
             return {
                 'fecha': ultima.fecha,
@@ -40,19 +54,24 @@ class ProductoSerializer(serializers.ModelSerializer):
                 return request.build_absolute_uri(obj.foto.url)
             return obj.foto.url
         return obj.url_imagen  # Fallback a URL externa
+    
+    def get_imagen_urls(self, obj):
+        """Variantes reducidas por tamaño (thumb, small, medium) si ya se generaron"""
+        return imagen_urls(obj, self.context.get('request'))
 
 class ProductoListSerializer(serializers.ModelSerializer):
     tipo_producto_nombre = serializers.CharField(source='tipo_producto.nombre', read_only=True)
     ultima_fecha = serializers.SerializerMethodField()
     imagen_url = serializers.SerializerMethodField()
+    imagen_urls = serializers.SerializerMethodField()
     
     class Meta:
         model = Producto
-        fields = ['id', 'url_imagen', 'imagen_url', 'tipo_producto_nombre', 'variable', 
+        fields = ['id', 'url_imagen', 'imagen_url', 'imagen_urls', 'tipo_producto_nombre', 'variable', 
                  'nombre_archivo', 'ultima_fecha']
     
     def get_ultima_fecha(self, obj):
-        ultima = obj.fechas.first()
+        ultima = ultima_fecha(obj)
         if ultima:
             return f"{ultima.fecha} {ultima.hora}"
         return None
@@ -65,3 +84,7 @@ class ProductoListSerializer(serializers.ModelSerializer):
                 return request.build_absolute_uri(obj.foto.url)
             return obj.foto.url
         return obj.url_imagen  # Fallback a URL externa
+    
+    def get_imagen_urls(self, obj):
+        """Variantes reducidas por tamaño (thumb, small, medium) si ya se generaron"""
+        return imagen_urls(obj, self.context.get('request'))
@@ -0,0 +1,178 @@
+from django.conf import settings
+from django.core.files.storage import default_storage
+from .models import AnimacionWRF, Producto
+import hashlib
+import logging
+import os
+import tempfile
+import time
+
+logger = logging.getLogger(__name__)
+
+# Campos de Producto que cambian al guardar o revalidar una imagen
+CAMPOS_IMAGEN = ['foto', 'sha256', 'etag', 'last_modified']
+
+
+class ImageTooLarge(Exception):
+    """La imagen supera OHMC_MAX_IMAGE_BYTES"""
+
+
+def content_name(sha256, filename):
+    """Ruta direccionada por contenido: productos/ab/abcdef....png"""
+    extension = os.path.splitext(filename)[1].lower() or '.png'
+    return f"productos/{sha256[:2]}/{sha256}{extension}"
+
+
+def _tmp_dir():
+    # Dentro de MEDIA_ROOT para que el rename final sea atómico (mismo filesystem)
+    path = os.path.join(settings.MEDIA_ROOT, 'tmp')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def stream_to_store(response, filename, max_bytes=None, chunk_size=64 * 1024):
+    """Escribir una respuesta HTTP en el almacén por hash sin cargarla en memoria.
+
+    Los bloques se vuelcan a un temporal mientras se calcula el SHA-256; al
+    terminar se renombra atómicamente a su ruta final, o se descarta si ese
+    contenido ya estaba guardado. Devuelve ``(name, sha256, size)``.
+    """
+    max_bytes = max_bytes or settings.OHMC_MAX_IMAGE_BYTES
+    declarado = response.headers.get('Content-Length')
+    if declarado and declarado.isdigit() and int(declarado) > max_bytes:
+        raise ImageTooLarge(f"{declarado} bytes")
+
+    digest = hashlib.sha256()
+    size = 0
+    fd, tmp_path = tempfile.mkstemp(dir=_tmp_dir(), suffix='.part')
+    try:
+        with os.fdopen(fd, 'wb') as tmp:
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                size += len(chunk)
+                if size > max_bytes:
+                    raise ImageTooLarge(f"más de {max_bytes} bytes")
+                digest.update(chunk)
+                tmp.write(chunk)
+
+        sha256 = digest.hexdigest()
+        return _commit(tmp_path, sha256, filename), sha256, size
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def store_bytes(data, filename):
+    """Guardar contenido generado localmente en el almacén por hash.
+
+    Devuelve ``(name, sha256, size)`` igual que ``stream_to_store``.
+    """
+    sha256 = hashlib.sha256(data).hexdigest()
+    fd, tmp_path = tempfile.mkstemp(dir=_tmp_dir(), suffix='.part')
+    try:
+        with os.fdopen(fd, 'wb') as tmp:
+            tmp.write(data)
+        return _commit(tmp_path, sha256, filename), sha256, len(data)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _commit(tmp_path, sha256, filename):
+    """Mover un temporal a su ruta por hash, o descartarlo si ya existe.
+
+    Al reutilizar un archivo existente se renueva su mtime: el barrido de
+    huérfanos no borra lo usado dentro del período de gracia.
+    """
+    name = content_name(sha256, filename)
+    destino = default_storage.path(name)
+    try:
+        os.utime(destino)
+    except FileNotFoundError:
+        os.makedirs(os.path.dirname(destino), exist_ok=True)
+        os.chmod(tmp_path, settings.FILE_UPLOAD_PERMISSIONS or 0o644)
+        os.replace(tmp_path, destino)
+    else:
+        os.remove(tmp_path)
+    return name
+
+
+def assign_image(producto, name, sha256, etag='', last_modified=''):
+    """Asociar una imagen ya guardada al producto sin guardarlo.
+
+    Devuelve True si el contenido cambió respecto de la imagen anterior.
+    """
+    cambio = sha256 != producto.sha256 or producto.foto.name != name
+    producto.foto.name = name
+    producto.sha256 = sha256
+    producto.etag = etag or ''
+    producto.last_modified = last_modified or ''
+    return cambio
+
+
+def _borrar_si_vencido(path, limite):
+    """Borrar un archivo si nadie lo reutilizó desde ``limite`` (epoch).
+
+    Se aparta primero con un rename atómico: si ``_commit`` lo renovó antes
+    se devuelve a su lugar, y si llega después ya no lo encuentra y lo escribe.
+    """
+    apartado = f"{path}.borrando"
+    try:
+        os.rename(path, apartado)
+    except FileNotFoundError:
+        return False
+    if os.stat(apartado).st_mtime >= limite:
+        os.replace(apartado, path)
+        return False
+    os.remove(apartado)
+    return True
+
+
+def barrer_huerfanos(gracia_horas=None, dry_run=False):
+    """Borrar del almacén las imágenes y variantes que ningún producto ni animación referencia.
+
+    El almacén es por hash y varios shards pueden reutilizar el mismo archivo
+    antes de confirmar su producto, así que sólo se borra lo que además lleva
+    ``gracia_horas`` sin usarse. Corre con la purga nocturna. Devuelve la
+    cantidad de archivos borrados (o a borrar, con ``dry_run``).
+    """
+    gracia_horas = settings.HUERFANOS_GRACIA_HORAS if gracia_horas is None else gracia_horas
+    limite = time.time() - gracia_horas * 3600
+
+    fotos = set(Producto.objects.exclude(foto='').exclude(foto__isnull=True).values_list('foto', flat=True).iterator())
+    fotos.update(AnimacionWRF.objects.values_list('imagen', flat=True).iterator())
+    shas = set(Producto.objects.exclude(sha256='').values_list('sha256', flat=True).distinct().iterator())
+
+    borrados = 0
+    for carpeta, referenciado in (
+        ('productos', lambda nombre: nombre in fotos),
+        ('derivadas', lambda nombre: os.path.basename(nombre).split('-')[0] in shas),
+    ):
+        raiz = default_storage.path(carpeta)
+        for directorio, _, archivos in os.walk(raiz):
+            for archivo in archivos:
+                path = os.path.join(directorio, archivo)
+                nombre = os.path.relpath(path, settings.MEDIA_ROOT).replace(os.sep, '/')
+                if referenciado(nombre):
+                    continue
+                try:
+                    if dry_run:
+                        borrados += os.stat(path).st_mtime < limite
+                    elif _borrar_si_vencido(path, limite):
+                        borrados += 1
+                except OSError as e:
+                    logger.warning(f"No se pudo borrar {nombre}: {str(e)}")
+    return borrados
+
+
+def conditional_headers(producto):
+    """Cabeceras If-None-Match / If-Modified-Since para revalidar la imagen"""
+    headers = {}
+    if not producto.foto:
+        return headers
+    if producto.etag:
+        headers['If-None-Match'] = producto.etag
+    if producto.last_modified:
+        headers['If-Modified-Since'] = producto.last_modified
+    return headers
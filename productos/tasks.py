@@ -1,131 +1,184 @@
-from celery import shared_task
+from celery import chord, shared_task
+from django.conf import settings
 from django.utils import timezone
-from django.core.files.base import ContentFile
 from datetime import datetime, timedelta, date
-import requests
 import json
 from .models import TipoProducto, Producto, FechaProducto
+from .downloader import download_images
+from .animaciones import construir_animacion
+from .backfill import ejecutar_backfill
+from .cache import invalidar
+from .derivadas import generar_derivadas
+from .discovery import descubrir_celdas
+from .fallidas import abandonadas
+from .retencion import purgar_expirados
+from .ingest import (
+    upsert_productos, upsert_fechas, fechas_frames, upsert_frames, celdas_completas, registrar_celdas
+)
+from weather_api.db_pool.base import estadisticas as estadisticas_pool
 import logging
-from urllib.parse import urlparse
-import os
 
 logger = logging.getLogger(__name__)
 
-def download_and_save_image(producto, url):
-    """Descargar imagen desde URL y guardarla en el modelo"""
-    try:
-        logger.info(f"Descargando imagen: {url}")
-        response = requests.get(url, timeout=30, stream=True)
+# Variables principales para empezar
+WRF_VARIABLES = ['t2', 'ppn', 'wspd10', 'rh2', 'ppnaccum']
+# Solo procesar días con corridas (6 y 18 UTC)
+WRF_CORRIDAS = ['06', '18']
+WRF_HORAS_PRONOSTICO = [0, 6, 12, 18]
+WRF_URL_BASE = 'https://yaku.ohmc.ar/public/wrf/img/CBA/'
+
+def tipo_wrf():
+    tipo, _ = TipoProducto.objects.get_or_create(
+        nombre='wrf_cba',
+        defaults={
+            'descripcion': 'Productos horarios generados por el modelo WRF para Córdoba',
+            'url': WRF_URL_BASE
+        }
+    )
+    return tipo
+
+def celdas_wrf_pendientes(tipo, completo=False):
+    """Celdas (fecha, corrida, variable) de la última semana que el checkpoint no marca completas"""
+    hoy = date.today()
+    fechas = [hoy - timedelta(days=dias_atras) for dias_atras in range(7)]
+    completas = set() if completo else celdas_completas(tipo, fechas)
+    pendientes = [
+        (fecha, corrida, variable)
+        for fecha in fechas
+        for corrida in WRF_CORRIDAS
+        for variable in WRF_VARIABLES
+        if (fecha, corrida, variable) not in completas
+    ]
+    return pendientes, len(completas)
+
+def ingerir_celdas_wrf(tipo, celdas):
+    """Crear productos y fechas de esas celdas, descargar sus frames y registrar el avance"""
+    objetivos = []
+    nombres_por_celda = {}
+    
+    # Sólo se programan los frames que el servidor ya publicó
+    publicados = descubrir_celdas(WRF_URL_BASE, celdas, WRF_HORAS_PRONOSTICO)
+    
+    for celda in celdas:
+        fecha_actual, hora_corrida, variable = celda
+        nombres_por_celda[celda] = []
         
-        if response.status_code == 200:
-            # Obtener nombre del archivo desde la URL
-            parsed_url = urlparse(url)
-            filename = os.path.basename(parsed_url.path)
+        # Generar URLs para horas principales
+        for hora_pronostico in publicados[celda]:
+            hora_str = f"{hora_pronostico:02d}"
             
-            # Si no hay extensión, usar .png por defecto
-            if not filename or '.' not in filename:
-                filename = f"{producto.nombre_archivo}.png"
+            # Estructura correcta de URL
+            url = f"{WRF_URL_BASE}{fecha_actual.year}_{fecha_actual.month:02d}/{fecha_actual.day:02d}_{hora_corrida}/{variable}/{variable}-{fecha_actual.strftime('%Y-%m-%d')}_{hora_corrida}+{hora_str}.png"
             
-            # Guardar imagen en el campo foto
-            producto.foto.save(
-                filename,
-                ContentFile(response.content),
-                save=True
-            )
-            logger.info(f"✅ Imagen guardada: {filename}")
-            return True
-        else:
-            logger.warning(f"⚠️ Error HTTP {response.status_code} para {url}")
-            return False
+            nombre_archivo = f"{variable}-{fecha_actual.strftime('%Y-%m-%d')}_{hora_corrida}+{hora_str}.png"
             
-    except Exception as e:
-        logger.error(f"❌ Error descargando {url}: {str(e)}")
-        return False
+            objetivos.append((
+                Producto(variable=variable, nombre_archivo=nombre_archivo, url_imagen=url),
+                fecha_actual,
+                hora_corrida,
+                hora_pronostico,
+            ))
+            nombres_por_celda[celda].append(nombre_archivo)
+    
+    # Crear o actualizar productos y fechas en bloque
+    productos, productos_creados = upsert_productos(tipo, [p for p, *_ in objetivos])
+    frames = [(productos[p.nombre_archivo], *corrida) for p, *corrida in objetivos]
+    upsert_fechas(fechas_frames(frames))
+    
+    # Descargar todas las imágenes faltantes en paralelo
+    imagenes_descargadas = download_images(p for p in productos.values() if not p.foto)
+    upsert_frames(frames)
+    
+    # Registrar el avance de cada celda; los frames aún no publicados siguen pendientes.
+    # Un frame abandonado tras OHMC_FALLAS_MAX_INTENTOS no va a llegar: cuenta como
+    # resuelto para que la celda se cierre y no se vuelva a listar en cada sync
+    sin_imagen = abandonadas(p.url_imagen for p in productos.values() if not p.foto)
+    conteos = {
+        celda: (
+            len(WRF_HORAS_PRONOSTICO),
+            sum(1 for nombre in nombres if productos[nombre].foto or productos[nombre].url_imagen in sin_imagen),
+        )
+        for celda, nombres in nombres_por_celda.items()
+    }
+    celdas_cerradas = registrar_celdas(tipo, conteos)
+    
+    # Las corridas que quedaron completas se animan en segundo plano
+    completas_ahora = [
+        (fecha.isoformat(), corrida, variable)
+        for (fecha, corrida, variable), (esperados, descargados) in conteos.items()
+        if descargados >= esperados
+    ]
+    if completas_ahora:
+        build_wrf_animations.delay(completas_ahora)
+    
+    return {
+        'sync': 'wrf',
+        'tipo': tipo.nombre,
+        'productos_nuevos': productos_creados,
+        'imagenes_descargadas': imagenes_descargadas,
+        'celdas': len(conteos),
+        'celdas_completas': celdas_cerradas,
+    }
 
 @shared_task
-def sync_wrf_data():
-    """Sincronizar datos WRF y descargar imágenes"""
+def sync_wrf_data(completo=False, celdas=None):
+    """Sincronizar datos WRF y descargar imágenes.
+
+    Sólo se procesan las celdas (fecha, corrida, variable) que el checkpoint no
+    marca como completas, salvo que se pida ``completo=True``. Con ``celdas``
+    (lista de ``[fecha ISO, corrida, variable]``) se procesa sólo ese shard y
+    la caché la invalida el callback de ``sync_all_data``.
+    """
     try:
-        # Crear o obtener tipo de producto
-        tipo_wrf, created = TipoProducto.objects.get_or_create(
-            nombre='wrf_cba',
-            defaults={
-                'descripcion': 'Productos horarios generados por el modelo WRF para Córdoba',
-                'url': 'https://yaku.ohmc.ar/public/wrf/img/CBA/'
-            }
-        )
+        tipo = tipo_wrf()
+        if celdas is None:
+            pendientes, completas = celdas_wrf_pendientes(tipo, completo)
+            logger.info(f"WRF: {len(pendientes)} celdas pendientes, {completas} ya completas")
+        else:
+            pendientes = [(date.fromisoformat(fecha), corrida, variable) for fecha, corrida, variable in celdas]
         
-        # Variables principales para empezar
-        variables = ['t2', 'ppn', 'wspd10', 'rh2', 'ppnaccum']
+        resultado = ingerir_celdas_wrf(tipo, pendientes)
         
-        # Obtener datos de la última semana
-        hoy = date.today()
-        productos_creados = 0
-        imagenes_descargadas = 0
-        
-        for dias_atras in range(7):  # Última semana
-            fecha_actual = hoy - timedelta(days=dias_atras)
-            
-            # Solo procesar días con corridas (6 y 18 UTC)
-            for hora_corrida in ['06', '18']:
-                for variable in variables:
-                    # Generar URLs para horas principales
-                    for hora_pronostico in [0, 6, 12, 18]:
-                        hora_str = f"{hora_pronostico:02d}"
-                        
-                        # Estructura correcta de URL
-                        url = f"https://yaku.ohmc.ar/public/wrf/img/CBA/{fecha_actual.year}_{fecha_actual.month:02d}/{fecha_actual.day:02d}_{hora_corrida}/{variable}/{variable}-{fecha_actual.strftime('%Y-%m-%d')}_{hora_corrida}+{hora_str}.png"
-                        
-                        nombre_archivo = f"{variable}-{fecha_actual.strftime('%Y-%m-%d')}_{hora_corrida}+{hora_str}.png"
-                        
-                        # Crear o actualizar producto
-                        producto, created = Producto.objects.get_or_create(
-                            tipo_producto=tipo_wrf,
-                            variable=variable,
-                            nombre_archivo=nombre_archivo,
-                            defaults={'url_imagen': url}
-                        )
-                        
-                        if not created:
-                            producto.url_imagen = url
-                            producto.save()
-                        else:
-                            productos_creados += 1
-                        
-                        # Descargar imagen si no existe
-                        if not producto.foto:
-                            if download_and_save_image(producto, url):
-                                imagenes_descargadas += 1
-                        
-                        # Crear fecha de producto
-                        try:
-                            hora_total = int(hora_corrida) + hora_pronostico
-                            
-                            if hora_total >= 24:
-                                fecha_pronostico = fecha_actual + timedelta(days=1)
-                                hora_final = hora_total - 24
-                            else:
-                                fecha_pronostico = fecha_actual
-                                hora_final = hora_total
-                            
-                            hora_obj = datetime.strptime(f"{hora_final:02d}:00", "%H:%M").time()
-                            
-                            FechaProducto.objects.get_or_create(
-                                fecha=fecha_pronostico,
-                                hora=hora_obj,
-                                producto=producto
-                            )
-                        except Exception as e:
-                            logger.warning(f"Error creando fecha para {nombre_archivo}: {str(e)}")
-                            continue
-        
-        logger.info(f"Sincronización WRF completada: {productos_creados} productos nuevos, {imagenes_descargadas} imágenes descargadas")
-        return f"WRF sync completed: {productos_creados} new products, {imagenes_descargadas} images downloaded"
+        if celdas is None:
+            invalidar(tipo.nombre)
+        logger.info(f"Sincronización WRF completada: {resultado['productos_nuevos']} productos nuevos, {resultado['imagenes_descargadas']} imágenes descargadas, {resultado['celdas_completas']} celdas completas")
+        return resultado
         
     except Exception as e:
         logger.error(f"Error en sincronización WRF: {str(e)}")
         raise
 
+@shared_task
+def build_wrf_animations(celdas):
+    """Generar la animación de cada celda (fecha, corrida, variable) completa"""
+    generadas = 0
+    for fecha, corrida, variable in celdas:
+        try:
+            if construir_animacion(date.fromisoformat(fecha), corrida, variable):
+                generadas += 1
+        except Exception as e:
+            logger.error(f"Error generando animación {variable} {fecha} {corrida}: {str(e)}")
+    
+    if generadas:
+        invalidar('wrf_cba')
+    logger.info(f"Animaciones WRF generadas: {generadas}/{len(celdas)}")
+    return f"WRF animations built: {generadas}/{len(celdas)}"
+
+@shared_task
+def generate_image_derivatives(shas):
+    """Generar las variantes WebP (miniaturas) de un lote de imágenes por hash"""
+    creadas = 0
+    for sha256 in shas:
+        try:
+            creadas += generar_derivadas(sha256)
+        except Exception as e:
+            logger.error(f"Error generando variantes de {sha256}: {str(e)}")
+    
+    if creadas:
+        invalidar()
+    logger.info(f"Variantes de imagen generadas: {creadas} para {len(shas)} imágenes")
+    return f"Image derivatives generated: {creadas} for {len(shas)} images"
+
 @shared_task
 def sync_medicion_aire():
     """Sincronizar datos de medición de aire y descargar imágenes"""
@@ -140,8 +193,8 @@ def sync_medicion_aire():
         
         archivos = ['CH4_webvisualizer_v4.png', 'CO2_webvisualizer_v4.png']
         hoy = date.today()
-        productos_creados = 0
-        imagenes_descargadas = 0
+        hora_medicion = datetime.strptime("10:30", "%H:%M").time()
+        objetivos = []
         
         for dias_atras in range(7):  # Última semana
             fecha_actual = hoy - timedelta(days=dias_atras)
@@ -149,33 +202,23 @@ def sync_medicion_aire():
             for archivo in archivos:
                 url = f"https://yaku.ohmc.ar/public/MedicionAire/{fecha_actual.month:02d}/{fecha_actual.day:02d}/{archivo}"
                 nombre_archivo_con_fecha = f"{fecha_actual.strftime('%Y-%m-%d')}_{archivo}"
-                
-                producto, created = Producto.objects.get_or_create(
-                    tipo_producto=tipo_aire,
-                    nombre_archivo=nombre_archivo_con_fecha,
-                    defaults={'url_imagen': url}
-                )
-                
-                if not created:
-                    producto.url_imagen = url
-                    producto.save()
-                else:
-                    productos_creados += 1
-                
-                # Descargar imagen si no existe
-                if not producto.foto:
-                    if download_and_save_image(producto, url):
-                        imagenes_descargadas += 1
-                
-                # Crear fecha
-                FechaProducto.objects.get_or_create(
-                    fecha=fecha_actual,
-                    hora=datetime.strptime("10:30", "%H:%M").time(),
-                    producto=producto
-                )
+                objetivos.append((
+                    Producto(nombre_archivo=nombre_archivo_con_fecha, url_imagen=url),
+                    fecha_actual,
+                ))
+        
+        productos, productos_creados = upsert_productos(tipo_aire, [p for p, _ in objetivos])
+        upsert_fechas(
+            FechaProducto(fecha=fecha, hora=hora_medicion, producto=productos[p.nombre_archivo])
+            for p, fecha in objetivos
+        )
+        
+        # Descargar imágenes faltantes
+        imagenes_descargadas = download_images(p for p in productos.values() if not p.foto)
         
+        invalidar(tipo_aire.nombre)
         logger.info(f"Sincronización MedicionAire completada: {productos_creados} productos nuevos, {imagenes_descargadas} imágenes descargadas")
-        return f"MedicionAire sync completed: {productos_creados} new products, {imagenes_descargadas} images downloaded"
+        return {'sync': 'aire', 'tipo': tipo_aire.nombre, 'productos_nuevos': productos_creados, 'imagenes_descargadas': imagenes_descargadas}
         
     except Exception as e:
         logger.error(f"Error en sincronización MedicionAire: {str(e)}")
@@ -195,31 +238,22 @@ def sync_fwi_data():
         
         url = "https://yaku.ohmc.ar/public/FWI/FWI.png"
         
-        producto, created = Producto.objects.get_or_create(
-            tipo_producto=tipo_fwi,
-            nombre_archivo='FWI.png',
-            defaults={'url_imagen': url}
-        )
-        
-        if not created:
-            producto.url_imagen = url
-            producto.save()
+        productos, productos_creados = upsert_productos(tipo_fwi, [Producto(nombre_archivo='FWI.png', url_imagen=url)])
+        producto = productos['FWI.png']
         
-        # Descargar imagen si no existe
-        imagenes_descargadas = 0
-        if not producto.foto:
-            if download_and_save_image(producto, url):
-                imagenes_descargadas = 1
+        # Descargar o revalidar la imagen: la URL es fija pero el contenido cambia
+        imagenes_descargadas = download_images([producto])
         
         # Crear fecha de hoy
-        FechaProducto.objects.get_or_create(
+        upsert_fechas([FechaProducto(
             fecha=date.today(),
             hora=datetime.strptime("11:00", "%H:%M").time(),
             producto=producto
-        )
+        )])
         
+        invalidar(tipo_fwi.nombre)
         logger.info(f"Sincronización FWI completada: {imagenes_descargadas} imágenes descargadas")
-        return f"FWI sync completed: {imagenes_descargadas} images downloaded"
+        return {'sync': 'fwi', 'tipo': tipo_fwi.nombre, 'productos_nuevos': productos_creados, 'imagenes_descargadas': imagenes_descargadas}
         
     except Exception as e:
         logger.error(f"Error en sincronización FWI: {str(e)}")
@@ -239,30 +273,21 @@ def sync_rutas_caminera():
         
         url = "https://yaku.ohmc.ar/public/rutas_caminera/rafagas_rutas.gif"
         
-        producto, created = Producto.objects.get_or_create(
-            tipo_producto=tipo_rutas,
-            nombre_archivo='rafagas_rutas.gif',
-            defaults={'url_imagen': url}
-        )
+        productos, productos_creados = upsert_productos(tipo_rutas, [Producto(nombre_archivo='rafagas_rutas.gif', url_imagen=url)])
+        producto = productos['rafagas_rutas.gif']
         
-        if not created:
-            producto.url_imagen = url
-            producto.save()
+        # Descargar o revalidar la imagen: la URL es fija pero el contenido cambia
+        imagenes_descargadas = download_images([producto])
         
-        # Descargar imagen si no existe
-        imagenes_descargadas = 0
-        if not producto.foto:
-            if download_and_save_image(producto, url):
-                imagenes_descargadas = 1
-        
-        FechaProducto.objects.get_or_create(
+        upsert_fechas([FechaProducto(
             fecha=date.today(),
             hora=datetime.strptime("11:00", "%H:%M").time(),
             producto=producto
-        )
+        )])
         
+        invalidar(tipo_rutas.nombre)
         logger.info(f"Sincronización rutas_caminera completada: {imagenes_descargadas} imágenes descargadas")
-        return f"Rutas caminera sync completed: {imagenes_descargadas} images downloaded"
+        return {'sync': 'rutas', 'tipo': tipo_rutas.nombre, 'productos_nuevos': productos_creados, 'imagenes_descargadas': imagenes_descargadas}
         
     except Exception as e:
         logger.error(f"Error en sincronización rutas_caminera: {str(e)}")
@@ -270,39 +295,101 @@ def sync_rutas_caminera():
 
 @shared_task
 def download_missing_images():
-    """Descargar imágenes faltantes para productos existentes"""
+    """Descargar imágenes faltantes: cola priorizada por recencia, reanudable y con presupuesto"""
     try:
-        productos_sin_imagen = Producto.objects.filter(foto__isnull=True).exclude(foto='')
-        total_descargadas = 0
-        
-        logger.info(f"Encontrados {productos_sin_imagen.count()} productos sin imagen")
-        
-        for producto in productos_sin_imagen:
-            if download_and_save_image(producto, producto.url_imagen):
-                total_descargadas += 1
+        progreso = ejecutar_backfill()
+        if progreso is None:
+            logger.info("Backfill de imágenes faltantes en curso en otro worker, se omite")
+            return {'sync': 'faltantes', 'tipo': None, 'productos_nuevos': 0, 'imagenes_descargadas': 0}
         
-        logger.info(f"Descarga de imágenes faltantes completada: {total_descargadas} imágenes descargadas")
-        return f"Downloaded {total_descargadas} missing images"
+        if progreso.descargados:
+            invalidar()
+        logger.info(f"Descarga de imágenes faltantes completada ({progreso.motivo}): {progreso.descargados} imágenes descargadas, {progreso.bytes} bytes")
+        return {
+            'sync': 'faltantes',
+            'tipo': None,
+            'productos_nuevos': 0,
+            'imagenes_descargadas': progreso.descargados,
+            'bytes': progreso.bytes,
+            'motivo': progreso.motivo,
+        }
         
     except Exception as e:
         logger.error(f"Error descargando imágenes faltantes: {str(e)}")
         raise
 
 @shared_task
-def sync_all_data():
-    """Ejecutar todas las sincronizaciones"""
-    results = []
-    
+def purge_expired_data():
+    """Aplicar la política de retención: purgar fechas, productos y archivos vencidos"""
     try:
-        results.append(sync_wrf_data())
-        results.append(sync_medicion_aire())
-        results.append(sync_fwi_data())
-        results.append(sync_rutas_caminera())
-        results.append(download_missing_images())
+        resultados, archivos = purgar_expirados()
+        total = sum(r['productos'] for r in resultados)
+        logger.info(f"Purga completada: {total} productos, {archivos} archivos")
+        return {'tipos': resultados, 'archivos': archivos}
         
-        logger.info("Todas las sincronizaciones completadas")
-        return results
+    except Exception as e:
+        logger.error(f"Error purgando datos vencidos: {str(e)}")
+        raise
+
+SYNCS = {
+    'wrf': sync_wrf_data,
+    'aire': sync_medicion_aire,
+    'fwi': sync_fwi_data,
+    'rutas': sync_rutas_caminera,
+}
+
+@shared_task
+def sync_shard(sync, **kwargs):
+    """Ejecutar una sincronización como shard de sync_all_data; un error no corta el chord"""
+    try:
+        return SYNCS[sync](**kwargs)
+    except Exception as e:
+        return {'sync': sync, 'error': str(e), **kwargs}
+
+@shared_task
+def sync_all_data(completo=False):
+    """Repartir todas las sincronizaciones entre los workers como un chord.
+
+    Cada tipo es un shard y WRF se divide además por celda (fecha, corrida,
+    variable); ``finish_sync_all`` agrega los resultados al terminar.
+    """
+    try:
+        pendientes, completas = celdas_wrf_pendientes(tipo_wrf(), completo)
+        lote = settings.SYNC_WRF_CELDAS_POR_SHARD
+        celdas = [[fecha.isoformat(), corrida, variable] for fecha, corrida, variable in pendientes]
+        shards = [sync_shard.s('wrf', celdas=celdas[i:i + lote]) for i in range(0, len(celdas), lote)]
+        shards += [sync_shard.s(sync) for sync in SYNCS if sync != 'wrf']
+        
+        logger.info(f"Sincronización general: {len(shards)} shards ({len(pendientes)} celdas WRF pendientes, {completas} completas)")
+        resultado = chord(shards)(finish_sync_all.s())
+        return {'shards': len(shards), 'chord': resultado.id}
         
     except Exception as e:
         logger.error(f"Error en sincronización general: {str(e)}")
         raise
+
+@shared_task
+def finish_sync_all(resultados):
+    """Agregar los resultados de los shards, invalidar la caché y buscar imágenes faltantes"""
+    por_sync = {}
+    errores = []
+    for resultado in resultados:
+        if 'error' in resultado:
+            errores.append(resultado)
+            continue
+        totales = por_sync.setdefault(resultado['sync'], {'shards': 0})
+        totales['shards'] += 1
+        for clave, valor in resultado.items():
+            if isinstance(valor, int):
+                totales[clave] = totales.get(clave, 0) + valor
+    
+    # Los shards WRF no invalidan por su cuenta para no vaciar la caché una vez por celda
+    invalidar('wrf_cba')
+    download_missing_images.delay()
+    
+    logger.info(f"Todas las sincronizaciones completadas: {por_sync}, {len(errores)} shards con error")
+    for error in errores:
+        logger.error(f"Shard {error['sync']} falló: {error['error']}")
+    for alias, pool in estadisticas_pool().items():
+        logger.info(f"Pool de conexiones '{alias}': {pool}")
+    return {'por_sync': por_sync, 'errores': errores}
@@ -0,0 +1,374 @@
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+from unittest import mock
+import importlib
+import os
+import tempfile
+import time as reloj
+from io import BytesIO
+from PIL import Image
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from productos import cache, ingest
+from productos.storage import barrer_huerfanos, store_bytes
+from productos.animaciones import construir_animacion
+from productos.backfill import candidatos, cursor, iniciar
+from productos.retencion import purgar_tipo
+from productos.models import TipoProducto, Producto, FechaProducto, EstadisticaSnapshot, ForecastFrame, AnimacionWRF, BackfillProgreso
+from productos.resumenes import datos_estadisticas, reconstruir_estadisticas, refrescar_disponibilidad, sumar_estadisticas
+
+# Sin Redis: cada test arranca con la caché vacía
+CACHES_LOCALES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'tests-default'},
+    'local': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'tests-local'},
+}
+
+VALIDA = datetime(2025, 6, 26, 12, tzinfo=dt_timezone.utc)
+
+
+def crear_productos(tipo, cantidad, fechas_por_producto=3, valida=VALIDA):
+    """Productos de un tipo con varias fechas cada uno y la misma hora válida"""
+    productos = []
+    inicio = Producto.objects.filter(tipo_producto=tipo).count()
+    for i in range(inicio, inicio + cantidad):
+        producto = Producto.objects.create(
+            tipo_producto=tipo,
+            nombre_archivo=f'{tipo.nombre}-{i}.png',
+            url_imagen=f'https://example.com/{tipo.nombre}-{i}.png',
+            ultima_valida=valida,
+        )
+        FechaProducto.objects.bulk_create(
+            FechaProducto(producto=producto, fecha=date(2025, 6, 26) - timedelta(days=d), hora=time(12))
+            for d in range(fechas_por_producto)
+        )
+        productos.append(producto)
+    return productos
+
+
+@override_settings(CACHES=CACHES_LOCALES)
+class ProductoConsultasTests(TestCase):
+    """La lista y el detalle no vuelven a consultar las fechas producto por producto"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tipo = TipoProducto.objects.create(nombre='FWI', descripcion='FWI', url='https://example.com/')
+        cls.productos = crear_productos(cls.tipo, 5)
+
+    def test_lista_con_consultas_constantes(self):
+        # count + página (con la última fecha anotada por subconsulta)
+        with self.assertNumQueries(2):
+            respuesta = self.client.get('/api/productos/')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.json()['count'], 5)
+
+        crear_productos(TipoProducto.objects.create(nombre='otro', descripcion='', url=''), 10)
+        with self.assertNumQueries(2):
+            self.client.get('/api/productos/')
+
+    def test_detalle_con_consultas_constantes(self):
+        # producto (con tipo y última fecha) + fechas prefetch
+        with self.assertNumQueries(2):
+            respuesta = self.client.get(f'/api/productos/{self.productos[0].pk}/')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(len(respuesta.json()['fechas']), 3)
+
+    def test_orden_por_ultima_valida(self):
+        for horas, producto in enumerate(self.productos):
+            Producto.objects.filter(pk=producto.pk).update(ultima_valida=VALIDA - timedelta(hours=6 * horas))
+        esperados = [p.pk for p in self.productos]
+
+        for orden, ids in (('ultima_valida', esperados[::-1]), ('-ultima_valida', esperados)):
+            respuesta = self.client.get('/api/productos/', {'ordering': orden}).json()
+            self.assertEqual(respuesta['count'], 5)
+            self.assertEqual([p['id'] for p in respuesta['results']], ids)
+
+
+@override_settings(CACHES=CACHES_LOCALES)
+class ProductoCursorTests(TestCase):
+    """Paginación por keyset sobre (ultima_valida, id)"""
+
+    @classmethod
+    def setUpTestData(cls):
+        tipo = TipoProducto.objects.create(nombre='wrf_cba', descripcion='WRF', url='https://example.com/')
+        # Varios productos con la misma ultima_valida (el desempate es el id)
+        # y algunos sin ultima_valida, que van al final
+        grupos = [
+            crear_productos(tipo, 7, fechas_por_producto=1),
+            crear_productos(tipo, 2, fechas_por_producto=1, valida=VALIDA - timedelta(hours=6)),
+            crear_productos(tipo, 3, fechas_por_producto=1, valida=None),
+        ]
+        cls.esperados = [pk for grupo in grupos for pk in sorted((p.pk for p in grupo), reverse=True)]
+
+    def test_recorre_todo_en_orden_sin_repetir(self):
+        ids = []
+        url, params = '/api/productos/', {'cursor': '', 'page_size': 2}
+        # Con un cursor roto el recorrido no termina: se corta en más páginas de las necesarias
+        for _ in range(len(self.esperados)):
+            respuesta = self.client.get(url, params).json()
+            ids.extend(p['id'] for p in respuesta['results'])
+            url, params = respuesta['next'], None
+            if not url:
+                break
+        self.assertEqual(ids, self.esperados)
+
+    def test_cursor_invalido(self):
+        respuesta = self.client.get('/api/productos/', {'cursor': 'no-es-un-cursor'})
+        self.assertEqual(respuesta.status_code, 404)
+
+
+@override_settings(CACHES=CACHES_LOCALES)
+class UltimosProductosTests(TestCase):
+    """/api/ultimos/ devuelve el último producto de cada tipo con consultas constantes"""
+
+    def setUp(self):
+        # La respuesta se cachea por versión global: que no se filtre entre tests
+        caches['default'].clear()
+        caches['local'].clear()
+
+    def test_consultas_constantes(self):
+        for nombre in ('FWI', 'MedicionAire'):
+            crear_productos(TipoProducto.objects.create(nombre=nombre, descripcion='', url=''), 3)
+        # productos (último por tipo, subconsulta LIMIT 1) + fechas prefetch
+        with self.assertNumQueries(2):
+            respuesta = self.client.get('/api/ultimos/')
+        self.assertEqual(len(respuesta.json()), 2)
+
+        for nombre in ('wrf_cba', 'rutas_caminera', 'otro'):
+            crear_productos(TipoProducto.objects.create(nombre=nombre, descripcion='', url=''), 3)
+        caches['default'].clear()
+        with self.assertNumQueries(2):
+            respuesta = self.client.get('/api/ultimos/')
+        self.assertEqual(len(respuesta.json()), 5)
+
+    def test_devuelve_el_mas_reciente_de_cada_tipo(self):
+        esperados = set()
+        for nombre in ('FWI', 'wrf_cba'):
+            tipo = TipoProducto.objects.create(nombre=nombre, descripcion='', url='')
+            crear_productos(tipo, 2, valida=None)
+            crear_productos(tipo, 2, valida=VALIDA - timedelta(days=1))
+            # El último por ultima_valida (desempate por id), aunque otros tengan id mayor
+            esperados.add(crear_productos(tipo, 2)[-1].pk)
+            crear_productos(tipo, 1, valida=VALIDA - timedelta(days=2))
+        respuesta = self.client.get('/api/ultimos/')
+        self.assertEqual({p['id'] for p in respuesta.json()}, esperados)
+
+
+@override_settings(CACHES=CACHES_LOCALES, CACHE_FALLBACK_SECONDS=30)
+class CacheCircuitoTests(TestCase):
+    """Tras un error de Redis no se lo vuelve a intentar hasta que pase la ventana"""
+
+    def setUp(self):
+        cache._principal_caida_hasta = 0.0
+        self.addCleanup(setattr, cache, '_principal_caida_hasta', 0.0)
+
+    def test_saltea_la_principal_despues_de_un_error(self):
+        principal = mock.Mock()
+        principal.get.side_effect = ConnectionError('timeout')
+        with mock.patch.object(cache, 'caches', {'default': principal, 'local': caches['local']}):
+            cache._set('clave', 1, 10)
+            self.assertEqual(principal.set.call_count, 1)
+            self.assertIsNone(cache._get('otra'))
+            cache._set('clave', 2, 10)
+            self.assertEqual(cache._get('clave'), 2)
+        self.assertEqual(principal.get.call_count, 1)
+        self.assertEqual(principal.set.call_count, 1)
+
+
+class BarridoHuerfanosTests(TestCase):
+    """Sólo se borran los archivos sin referencias que llevan el período de gracia sin usarse"""
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        ajustes = override_settings(MEDIA_ROOT=media.name, HUERFANOS_GRACIA_HORAS=24)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        self.tipo = TipoProducto.objects.create(nombre='FWI', descripcion='', url='')
+
+    def guardar(self, contenido, horas_atras):
+        nombre, sha256, _ = store_bytes(contenido, 'FWI.png')
+        viejo = reloj.time() - horas_atras * 3600
+        os.utime(os.path.join(settings.MEDIA_ROOT, nombre), (viejo, viejo))
+        return nombre, sha256
+
+    def test_borra_solo_huerfanos_vencidos(self):
+        usado, sha_usado = self.guardar(b'usado', 48)
+        huerfano, _ = self.guardar(b'huerfano', 48)
+        reciente, _ = self.guardar(b'reciente', 1)
+        Producto.objects.create(tipo_producto=self.tipo, nombre_archivo='FWI.png', foto=usado, sha256=sha_usado)
+
+        self.assertEqual(barrer_huerfanos(), 1)
+        self.assertTrue(os.path.exists(os.path.join(settings.MEDIA_ROOT, usado)))
+        self.assertFalse(os.path.exists(os.path.join(settings.MEDIA_ROOT, huerfano)))
+        self.assertTrue(os.path.exists(os.path.join(settings.MEDIA_ROOT, reciente)))
+
+    def test_reutilizar_renueva_el_periodo_de_gracia(self):
+        nombre, _ = self.guardar(b'contenido', 48)
+        # Un shard vuelve a descargar el mismo contenido y todavía no confirmó su producto
+        store_bytes(b'contenido', 'FWI.png')
+        self.assertEqual(barrer_huerfanos(), 0)
+        self.assertTrue(os.path.exists(os.path.join(settings.MEDIA_ROOT, nombre)))
+
+
+class EstadisticasDeltaTests(TestCase):
+    """Los deltas de la ingesta y la purga coinciden con un recálculo completo"""
+
+    def setUp(self):
+        self.tipo = TipoProducto.objects.create(nombre='wrf_cba', descripcion='', url='')
+        reconstruir_estadisticas()
+
+    def assertSinDeriva(self):
+        snapshot = datos_estadisticas(EstadisticaSnapshot.objects.get(pk=1))
+        self.assertEqual(snapshot, datos_estadisticas(reconstruir_estadisticas()))
+
+    def producto(self, variable):
+        productos, _ = ingest.upsert_productos(self.tipo, [
+            Producto(variable=variable, nombre_archivo=f'{variable}.png', url_imagen=f'https://example.com/{variable}.png')
+        ])
+        return productos[f'{variable}.png']
+
+    def test_fechas_insertadas_por_otro_shard_no_se_cuentan_dos_veces(self):
+        producto = self.producto('t2')
+        fechas = [FechaProducto(producto=producto, fecha=date(2025, 6, 26), hora=time(h)) for h in (0, 6)]
+        # Otro shard inserta una de las filas después de que ésta no la encontró
+        FechaProducto.objects.create(producto=producto, fecha=date(2025, 6, 26), hora=time(0))
+        sumar_estadisticas(fechas_por_dia={date(2025, 6, 26): 1})
+
+        filtro = FechaProducto.objects.filter
+
+        def sin_ver_la_fila(*args, **kwargs):
+            # Sólo la consulta de existentes de upsert_fechas llega tarde
+            return FechaProducto.objects.none() if 'producto_id__in' in kwargs else filtro(*args, **kwargs)
+
+        with mock.patch.object(FechaProducto.objects, 'filter', side_effect=sin_ver_la_fila):
+            self.assertEqual(ingest.upsert_fechas(fechas), 1)
+        self.assertSinDeriva()
+
+    def test_variables_purgadas_salen_del_snapshot(self):
+        for variable in ('t2', 'ppn'):
+            producto = self.producto(variable)
+            ingest.upsert_fechas([FechaProducto(producto=producto, fecha=date(2025, 6, 26), hora=time(h)) for h in (0, 6)])
+        self.assertEqual(EstadisticaSnapshot.objects.get(pk=1).variables_wrf, ['ppn', 't2'])
+
+        Producto.objects.filter(variable='ppn').delete()
+        refrescar_disponibilidad(self.tipo.pk)
+        sumar_estadisticas(productos_por_tipo={'wrf_cba': -1}, fechas_por_dia={date(2025, 6, 26): -2}, refrescar_wrf=True)
+        self.assertEqual(EstadisticaSnapshot.objects.get(pk=1).variables_wrf, ['t2'])
+        self.assertSinDeriva()
+
+
+@override_settings(CACHES=CACHES_LOCALES, WRF_ANIMACION_FORMATO='gif')
+class AnimacionTests(TestCase):
+    """La animación de una corrida no es un producto: sólo se expone en /api/wrf/animacion/"""
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        ajustes = override_settings(MEDIA_ROOT=media.name)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        caches['default'].clear()
+
+        tipo = TipoProducto.objects.create(nombre='wrf_cba', descripcion='', url='')
+        for lead, color in enumerate(('red', 'blue')):
+            buffer = BytesIO()
+            Image.new('RGB', (8, 8), color).save(buffer, format='PNG')
+            nombre, sha256, _ = store_bytes(buffer.getvalue(), f't2-{lead}.png')
+            producto = Producto.objects.create(
+                tipo_producto=tipo, variable='t2', nombre_archivo=f't2-{lead}.png',
+                url_imagen=f'https://example.com/t2-{lead}.png', foto=nombre, sha256=sha256,
+            )
+            ForecastFrame.objects.create(
+                producto=producto, variable='t2', fecha_corrida=date(2025, 6, 26), corrida=6, lead=lead,
+                valido=VALIDA, imagen=nombre,
+            )
+
+    def test_no_crea_productos_ni_tipos(self):
+        tipos, productos = TipoProducto.objects.count(), Producto.objects.count()
+        animacion = construir_animacion(date(2025, 6, 26), '06', 't2')
+
+        self.assertEqual(animacion.frames, 2)
+        self.assertTrue(os.path.exists(os.path.join(settings.MEDIA_ROOT, animacion.imagen)))
+        self.assertEqual((TipoProducto.objects.count(), Producto.objects.count()), (tipos, productos))
+
+        respuesta = self.client.get('/api/wrf/animacion/', {'variable': 't2', 'corrida': '2025-06-26T06'}).json()
+        self.assertTrue(respuesta['animacion_url'].endswith(animacion.imagen))
+        self.assertEqual(len(respuesta['frames']), 2)
+
+    def test_regenerar_actualiza_la_misma_fila(self):
+        construir_animacion(date(2025, 6, 26), '06', 't2')
+        ForecastFrame.objects.filter(lead=1).update(imagen='')
+        animacion = construir_animacion(date(2025, 6, 26), '06', 't2')
+        self.assertEqual(AnimacionWRF.objects.count(), 1)
+        self.assertEqual(animacion.frames, 1)
+
+
+class BackfillInicioTests(TestCase):
+    """Una sola pasada abierta; al reanudar no se saltean los candidatos publicados después del corte"""
+
+    def setUp(self):
+        self.tipo = TipoProducto.objects.create(nombre='wrf_cba', descripcion='', url='')
+        crear_productos(self.tipo, 3, fechas_por_producto=1, valida=VALIDA - timedelta(days=2))
+
+    def interrumpida(self):
+        progreso = BackfillProgreso.objects.create(cursor=cursor(candidatos().first()))
+        BackfillProgreso.objects.filter(pk=progreso.pk).update(actualizado=timezone.now() - timedelta(days=1))
+        return progreso
+
+    def test_no_abre_otra_pasada_si_hay_una_en_curso(self):
+        self.assertIsNotNone(iniciar())
+        self.assertIsNone(iniciar())
+        self.assertEqual(BackfillProgreso.objects.count(), 1)
+
+    def test_reanuda_desde_el_cursor(self):
+        anterior = self.interrumpida()
+        self.assertEqual(iniciar().pk, anterior.pk)
+        # Ya tomada: otro worker no la reanuda también
+        self.assertIsNone(iniciar())
+
+    def test_reinicia_si_hay_candidatos_mas_recientes(self):
+        anterior = self.interrumpida()
+        crear_productos(self.tipo, 1, fechas_por_producto=1)
+
+        progreso = iniciar()
+        self.assertNotEqual(progreso.pk, anterior.pk)
+        self.assertIsNone(progreso.cursor)
+        anterior.refresh_from_db()
+        self.assertEqual(anterior.motivo, 'reiniciado')
+        self.assertIsNotNone(anterior.terminado)
+
+
+@override_settings(CACHES=CACHES_LOCALES)
+class PurgaTests(TestCase):
+    """La purga no depende del ON DELETE CASCADE de la base y también alcanza a los productos sin fechas"""
+
+    def setUp(self):
+        # Como si una migración posterior hubiera recreado las FK sin la cascada
+        cascadas = importlib.import_module('productos.migrations.0015_cascadas_db')
+        with connection.cursor() as cursor:
+            cursor.execute(cascadas.FK_PRODUCTO.format(accion=''))
+
+        self.tipo = TipoProducto.objects.create(nombre='wrf_cba', descripcion='', url='', retencion_dias=7)
+        self.vencido = crear_productos(self.tipo, 1)[0]
+        ForecastFrame.objects.create(
+            producto=self.vencido, variable='t2', fecha_corrida=VALIDA.date(), corrida=12, lead=0, valido=VALIDA,
+        )
+        self.sin_fechas = Producto.objects.create(tipo_producto=self.tipo, nombre_archivo='sin-fechas.png', url_imagen='https://example.com/a.png')
+        hoy = timezone.now()
+        self.vigente = crear_productos(self.tipo, 1, fechas_por_producto=0, valida=hoy)[0]
+        FechaProducto.objects.create(producto=self.vigente, fecha=hoy.date(), hora=time(0))
+        reconstruir_estadisticas()
+
+    def test_purga_vencidos_y_sin_fechas(self):
+        self.assertEqual(purgar_tipo(self.tipo, dry_run=True)['productos'], 2)
+
+        resultado = purgar_tipo(self.tipo)
+
+        self.assertEqual(resultado['productos'], 2)
+        self.assertEqual(list(Producto.objects.values_list('pk', flat=True)), [self.vigente.pk])
+        self.assertFalse(ForecastFrame.objects.exists())
+        self.assertEqual(FechaProducto.objects.count(), 1)
+        snapshot = datos_estadisticas(EstadisticaSnapshot.objects.get(pk=1))
+        self.assertEqual(snapshot, datos_estadisticas(reconstruir_estadisticas()))
@@ -1,17 +1,26 @@
 from rest_framework import generics, filters
-from rest_framework.decorators import api_view
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAdminUser
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
-from django.db.models import Q, Count
-from datetime import datetime, date
-from .models import TipoProducto, Producto, FechaProducto
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db.models import Q, Count, Exists, F, OuterRef, Subquery, Sum
+from datetime import datetime, timezone as dt_timezone
+from .models import TipoProducto, Producto, FechaProducto, ForecastFrame, Disponibilidad, EstadisticaSnapshot
+from .animaciones import url_animacion
+from .cache import cached_endpoint
+from .pagination import ProductoPagination
+from .resumenes import calendario, datos_estadisticas, reconstruir_estadisticas
 from .serializers import (
     TipoProductoSerializer, 
     ProductoSerializer, 
     ProductoListSerializer,
     FechaProductoSerializer
 )
+from weather_api.db_pool.base import estadisticas as estadisticas_pool
 import logging
+import os
 
 logger = logging.getLogger(__name__)
 
@@ -20,16 +29,20 @@ class TipoProductoListView(generics.ListAPIView):
     serializer_class = TipoProductoSerializer
 
 class ProductoListView(generics.ListAPIView):
-    queryset = Producto.objects.select_related('tipo_producto').prefetch_related('fechas')
+    queryset = Producto.objects.select_related('tipo_producto').con_ultima_fecha()
     serializer_class = ProductoListSerializer
+    pagination_class = ProductoPagination
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter, filters.SearchFilter]
     filterset_fields = ['tipo_producto__nombre', 'variable']
     search_fields = ['nombre_archivo', 'tipo_producto__nombre']
-    ordering_fields = ['fechas__fecha', 'fechas__hora']
-    ordering = ['-fechas__fecha', '-fechas__hora']
+    # Ordenar por fechas__* haría un join con FechaProducto y repetiría cada
+    # producto una vez por fecha; ultima_valida ya resume la fecha y hora
+    ordering_fields = ['ultima_valida']
+    # Sin ?ordering se usa el orden del índice (ultima_valida, id); ver get_queryset
+    ordering = None
     
     def get_queryset(self):
-        queryset = super().get_queryset()
+        queryset = super().get_queryset().order_by(*ProductoPagination.ordering)
         
         # Log para debugging
         logger.info(f"ProductoListView - Query params: {self.request.query_params}")
@@ -40,12 +53,14 @@ class ProductoListView(generics.ListAPIView):
             queryset = queryset.filter(tipo_producto__nombre=tipo)
             logger.info(f"Filtered by tipo: {tipo}")
         
-        # Filtro por fecha
+        # Filtro por fecha (EXISTS: no duplica filas, así no hace falta distinct)
         fecha = self.request.query_params.get('fecha', None)
         if fecha:
             try:
                 fecha_obj = datetime.strptime(fecha, '%Y-%m-%d').date()
-                queryset = queryset.filter(fechas__fecha=fecha_obj)
+                queryset = queryset.filter(
+                    Exists(FechaProducto.objects.filter(producto=OuterRef('pk'), fecha=fecha_obj))
+                )
                 logger.info(f"Filtered by fecha: {fecha_obj}")
             except ValueError:
                 logger.warning(f"Invalid date format: {fecha}")
@@ -56,29 +71,29 @@ class ProductoListView(generics.ListAPIView):
             queryset = queryset.filter(variable=variable)
             logger.info(f"Filtered by variable: {variable}")
         
-        result_queryset = queryset.distinct()
-        logger.info(f"Final queryset count: {result_queryset.count()}")
-        
-        return result_queryset
+        return queryset
 
 class ProductoDetailView(generics.RetrieveAPIView):
-    queryset = Producto.objects.select_related('tipo_producto').prefetch_related('fechas')
+    queryset = Producto.objects.select_related('tipo_producto').prefetch_related('fechas').con_ultima_fecha()
     serializer_class = ProductoSerializer
 
 @api_view(['GET'])
+@cached_endpoint('ultimos')
 def ultimos_productos(request):
     """Endpoint para obtener los últimos productos de cada tipo"""
-    tipos = TipoProducto.objects.all()
-    resultados = []
+    # Un producto por tipo, el de hora válida más reciente: por cada tipo una
+    # subconsulta LIMIT 1 sobre el índice (tipo_producto, ultima_valida, id)
+    ultimo_por_tipo = Producto.objects.filter(
+        tipo_producto=OuterRef('pk')
+    ).order_by(F('ultima_valida').desc(nulls_last=True), '-id').values('pk')[:1]
+    ultimos_ids = TipoProducto.objects.annotate(
+        ultimo_id=Subquery(ultimo_por_tipo)
+    ).filter(ultimo_id__isnull=False).values('ultimo_id')
+    ultimos = Producto.objects.filter(pk__in=ultimos_ids).select_related(
+        'tipo_producto'
+    ).prefetch_related('fechas').con_ultima_fecha().order_by('tipo_producto')
     
-    for tipo in tipos:
-        ultimo_producto = Producto.objects.filter(
-            tipo_producto=tipo
-        ).prefetch_related('fechas').first()
-        
-        if ultimo_producto:
-            serializer = ProductoSerializer(ultimo_producto)
-            resultados.append(serializer.data)
+    resultados = ProductoSerializer(ultimos, many=True).data
     
     logger.info(f"ultimos_productos - Returning {len(resultados)} products")
     return Response(resultados)
@@ -101,36 +116,85 @@ def productos_por_fecha_hora(request):
     except ValueError:
         return Response({'error': 'Formato de fecha u hora inválido'}, status=400)
     
-    queryset = Producto.objects.filter(
-        fechas__fecha=fecha_obj,
-        fechas__hora=hora_obj,
-        tipo_producto__nombre='wrf_cba'
-    )
-    
+    # Los frames WRF guardan el instante válido tipado: un único index scan
+    frames = ForecastFrame.objects.filter(valido=datetime.combine(fecha_obj, hora_obj, tzinfo=dt_timezone.utc))
     if variable:
-        queryset = queryset.filter(variable=variable)
+        frames = frames.filter(variable=variable)
     
-    logger.info(f"productos_por_fecha_hora - Found {queryset.count()} products")
+    queryset = Producto.objects.filter(
+        pk__in=frames.values('producto_id')
+    ).select_related('tipo_producto').con_ultima_fecha()
     
     serializer = ProductoListSerializer(queryset, many=True)
+    logger.info(f"productos_por_fecha_hora - Found {len(serializer.data)} products")
     return Response(serializer.data)
 
 @api_view(['GET'])
+@cached_endpoint('animacion', default_tipo='wrf_cba')
+def animacion_wrf(request):
+    """Todos los frames de una corrida WRF para una variable, ordenados por plazo"""
+    variable = request.query_params.get('variable')
+    corrida = request.query_params.get('corrida')
+    
+    if not variable:
+        return Response({'error': 'Se requiere parámetro variable'}, status=400)
+    
+    frames = ForecastFrame.objects.filter(variable=variable)
+    if corrida:
+        try:
+            inicio = datetime.strptime(corrida, '%Y-%m-%dT%H')
+        except ValueError:
+            return Response({'error': 'Formato de corrida inválido (YYYY-MM-DDTHH)'}, status=400)
+    else:
+        # Sin corrida se usa la más reciente de la variable
+        inicio = frames.order_by('-fecha_corrida', '-corrida').values_list('fecha_corrida', 'corrida').first()
+        if inicio is None:
+            return Response({'error': f'No hay frames para {variable}'}, status=404)
+        inicio = datetime.combine(inicio[0], datetime.min.time()).replace(hour=inicio[1])
+    
+    # Un único range scan sobre el índice (variable, fecha_corrida, corrida, lead)
+    frames = list(frames.filter(
+        fecha_corrida=inicio.date(),
+        corrida=inicio.hour
+    ).order_by('lead').values_list('lead', 'valido', 'imagen', 'producto__url_imagen'))
+    
+    if not frames:
+        return Response({'error': f'No hay frames para {variable} en la corrida {inicio:%Y-%m-%dT%H}'}, status=404)
+    
+    animacion = url_animacion(inicio.date(), inicio.hour, variable)
+    
+    return Response({
+        'variable': variable,
+        'corrida': f"{inicio:%Y-%m-%dT%H}",
+        'animacion_url': request.build_absolute_uri(default_storage.url(animacion)) if animacion else None,
+        'frames': [
+            {
+                'lead': lead,
+                'valido': valido,
+                'imagen_url': request.build_absolute_uri(default_storage.url(imagen)) if imagen else url_imagen,
+            }
+            for lead, valido, imagen, url_imagen in frames
+        ],
+    })
+
+@api_view(['GET'])
+@cached_endpoint('fechas_disponibles', tipo_param='tipo', default_tipo='wrf_cba')
 def fechas_disponibles(request):
     """Endpoint para obtener todas las fechas disponibles por tipo de producto"""
     tipo = request.query_params.get('tipo', 'wrf_cba')
     
-    fechas = FechaProducto.objects.filter(
-        producto__tipo_producto__nombre=tipo
+    fechas = Disponibilidad.objects.filter(
+        tipo_producto__nombre=tipo
     ).values('fecha').annotate(
-        total_productos=Count('id'),
-        variables_count=Count('producto__variable', distinct=True),
+        total_productos=Sum('total'),
+        variables_count=Count('variable', distinct=True),
         horas_count=Count('hora', distinct=True)
     ).order_by('-fecha')
     
     return Response(list(fechas))
 
 @api_view(['GET'])
+@cached_endpoint('horas_disponibles', tipo_param='tipo', default_tipo='wrf_cba')
 def horas_disponibles(request):
     """Endpoint para obtener horas disponibles para una fecha específica"""
     fecha = request.query_params.get('fecha')
@@ -145,81 +209,71 @@ def horas_disponibles(request):
     except ValueError:
         return Response({'error': 'Formato de fecha inválido'}, status=400)
     
-    queryset = FechaProducto.objects.filter(
+    queryset = Disponibilidad.objects.filter(
         fecha=fecha_obj,
-        producto__tipo_producto__nombre=tipo
+        tipo_producto__nombre=tipo
     )
     
     if variable:
-        queryset = queryset.filter(producto__variable=variable)
+        queryset = queryset.filter(variable=variable)
     
     horas = queryset.values('hora').annotate(
-        total_productos=Count('id'),
-        variables_count=Count('producto__variable', distinct=True)
+        total_productos=Sum('total'),
+        variables_count=Count('variable', distinct=True)
     ).order_by('hora')
     
     return Response(list(horas))
 
 @api_view(['GET'])
+@cached_endpoint('variables_disponibles', default_tipo='wrf_cba')
 def variables_disponibles(request):
     """Endpoint para obtener variables disponibles para WRF"""
     fecha = request.query_params.get('fecha')
     
-    queryset = Producto.objects.filter(tipo_producto__nombre='wrf_cba')
+    queryset = Disponibilidad.objects.filter(tipo_producto__nombre='wrf_cba')
     
     if fecha:
         try:
             fecha_obj = datetime.strptime(fecha, '%Y-%m-%d').date()
-            queryset = queryset.filter(fechas__fecha=fecha_obj)
+            queryset = queryset.filter(fecha=fecha_obj)
         except ValueError:
             pass
     
     variables = queryset.values('variable').annotate(
-        total_productos=Count('id'),
-        fechas_count=Count('fechas__fecha', distinct=True),
-        horas_count=Count('fechas__hora', distinct=True)
+        total_productos=Sum('total'),
+        fechas_count=Count('fecha', distinct=True),
+        horas_count=Count('hora', distinct=True)
     ).order_by('variable')
     
     return Response(list(variables))
 
 @api_view(['GET'])
+@cached_endpoint('disponibilidad', tipo_param='tipo', default_tipo='wrf_cba')
+def disponibilidad(request):
+    """Calendario completo de un tipo (fechas, horas y variables) en una sola respuesta"""
+    nombre = request.query_params.get('tipo', 'wrf_cba')
+    tipo = TipoProducto.objects.filter(nombre=nombre).first()
+    if tipo is None:
+        return Response({'error': f'Tipo de producto desconocido: {nombre}'}, status=404)
+    
+    return Response(calendario(tipo))
+
+@api_view(['GET'])
+@cached_endpoint('estadisticas', diario=True)
 def estadisticas(request):
-    """Endpoint con estadísticas generales"""
-    from django.db.models import Count
-    from datetime import timedelta
-    
-    hoy = date.today()
-    hace_30_dias = hoy - timedelta(days=30)
-    
-    stats = {
-        'total_productos': Producto.objects.count(),
-        'total_tipos': TipoProducto.objects.count(),
-        'productos_ultimo_mes': FechaProducto.objects.filter(
-            fecha__gte=hace_30_dias
-        ).count(),
-        'productos_por_tipo': list(
-            TipoProducto.objects.annotate(
-                count=Count('producto')
-            ).values('nombre', 'count')
-        ),
-        'variables_wrf': list(
-            Producto.objects.filter(
-                tipo_producto__nombre='wrf_cba'
-            ).values_list('variable', flat=True).distinct()
-        ),
-        'fechas_disponibles': list(
-            FechaProducto.objects.values_list('fecha', flat=True).distinct().order_by('-fecha')[:30]
-        ),
-        'datos_por_fecha': list(
-            FechaProducto.objects.filter(
-                producto__tipo_producto__nombre='wrf_cba'
-            ).values('fecha').annotate(
-                total=Count('id'),
-                variables=Count('producto__variable', distinct=True),
-                horas=Count('hora', distinct=True)
-            ).order_by('-fecha')[:10]
-        )
-    }
-    
-    logger.info(f"estadisticas - {stats}")
+    """Endpoint con estadísticas generales (leídas del snapshot que mantiene la ingesta)"""
+    snapshot = EstadisticaSnapshot.objects.filter(pk=1).first() or reconstruir_estadisticas()
+    stats = datos_estadisticas(snapshot)
+    
+    logger.info(f"estadisticas - {stats['total_productos']} productos, snapshot {snapshot.actualizado}")
     return Response(stats)
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def metricas_db(request):
+    """Estado del pool de conexiones y tiempos de espera de checkout (de este proceso, sólo staff)"""
+    return Response({
+        'modo': settings.DB_POOL_MODE,
+        'pid': os.getpid(),
+        'pools': estadisticas_pool(),
+    })
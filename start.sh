@@ -157,9 +157,6 @@ done
 # Configurar Django
 section "CONFIGURANDO DJANGO"
 
-progress "Limpiando migraciones anteriores..."
-find productos/migrations -name "*.py" -not -name "__init__.py" -delete 2>/dev/null || true
-
 progress "Creando migraciones..."
 docker-compose exec -T web python manage.py makemigrations productos
 if [ $? -ne 0 ]; then
@@ -27,4 +27,8 @@ app.conf.beat_schedule = {
         'task': 'productos.tasks.sync_rutas_caminera',
         'schedule': crontab(minute=0, hour=11),  # 11:00 UTC
     },
+    'purge-expired-data': {
+        'task': 'productos.tasks.purge_expired_data',
+        'schedule': crontab(minute=30, hour=3),  # 03:30 UTC, fuera de las corridas
+    },
 }
@@ -0,0 +1,181 @@
+"""Backend PostgreSQL con pool de conexiones por proceso (DB_POOL_MODE=pool).
+
+Django 4.2 no trae pool propio: cada hilo abre su conexión y la cierra al
+terminar la petición o la tarea. Este backend mantiene las conexiones libres
+en un pool compartido por los hilos del proceso (workers gthread, Celery) y
+mide cuánto espera cada checkout cuando el pool está lleno.
+"""
+from collections import deque
+from django.db.backends.postgresql import base
+from psycopg2 import extensions
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class Pool:
+    """Conexiones libres de un alias, con un máximo de conexiones abiertas"""
+
+    def __init__(self, alias, maximo, max_libres, timeout, max_inactiva, health_checks):
+        self.alias = alias
+        self.maximo = maximo
+        self.max_libres = max_libres
+        self.timeout = timeout
+        self.max_inactiva = max_inactiva
+        self.health_checks = health_checks
+        self.cupos = threading.BoundedSemaphore(maximo)
+        self.lock = threading.Lock()
+        self.libres = deque()  # (conexión, devuelta en)
+        self.prestadas = set()
+        # Métricas del proceso
+        self.checkouts = 0
+        self.creadas = 0
+        self.descartadas = 0
+        self.timeouts = 0
+        self.espera_total = 0.0
+        self.espera_max = 0.0
+        self.esperas = deque(maxlen=1000)
+
+    def obtener(self, conectar):
+        """Sacar una conexión libre (o abrir una nueva), esperando si el pool está lleno"""
+        inicio = time.perf_counter()
+        if not self.cupos.acquire(timeout=self.timeout):
+            with self.lock:
+                self.timeouts += 1
+            raise base.Database.OperationalError(
+                f"Pool '{self.alias}' agotado: {self.maximo} conexiones en uso tras {self.timeout}s"
+            )
+        espera = time.perf_counter() - inicio
+        with self.lock:
+            self.checkouts += 1
+            self.espera_total += espera
+            self.espera_max = max(self.espera_max, espera)
+            self.esperas.append(espera)
+        if espera > 1:
+            logger.warning(f"Pool '{self.alias}': checkout esperó {espera:.2f}s")
+
+        try:
+            while True:
+                with self.lock:
+                    conexion, devuelta = self.libres.pop() if self.libres else (None, None)
+                if conexion is None:
+                    conexion = conectar()
+                    with self.lock:
+                        self.creadas += 1
+                    break
+                if self._sana(conexion, devuelta):
+                    break
+                self._descartar(conexion)
+        except BaseException:
+            self.cupos.release()
+            raise
+        with self.lock:
+            self.prestadas.add(id(conexion))
+        return conexion
+
+    def devolver(self, conexion):
+        """Devolver una conexión al pool en estado limpio, o cerrarla si sobra o está rota"""
+        with self.lock:
+            prestada = id(conexion) in self.prestadas
+            self.prestadas.discard(id(conexion))
+        if not prestada:
+            # Heredada del proceso padre: no ocupa cupo en este pool
+            self._descartar(conexion)
+            return
+        try:
+            estado = extensions.TRANSACTION_STATUS_UNKNOWN if conexion.closed else conexion.info.transaction_status
+            if estado == extensions.TRANSACTION_STATUS_UNKNOWN:
+                self._descartar(conexion)
+                return
+            if estado != extensions.TRANSACTION_STATUS_IDLE:
+                conexion.rollback()
+            with self.lock:
+                if len(self.libres) < self.max_libres:
+                    self.libres.append((conexion, time.monotonic()))
+                    return
+            self._descartar(conexion)
+        except base.Database.Error:
+            self._descartar(conexion)
+        finally:
+            self.cupos.release()
+
+    def _sana(self, conexion, devuelta):
+        if conexion.closed or time.monotonic() - devuelta > self.max_inactiva:
+            return False
+        if not self.health_checks:
+            return True
+        try:
+            with conexion.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            if conexion.info.transaction_status != extensions.TRANSACTION_STATUS_IDLE:
+                conexion.rollback()
+            return True
+        except base.Database.Error:
+            return False
+
+    def _descartar(self, conexion):
+        with self.lock:
+            self.descartadas += 1
+        try:
+            conexion.close()
+        except base.Database.Error:
+            pass
+
+    def estadisticas(self):
+        with self.lock:
+            esperas = sorted(self.esperas)
+            percentil = lambda p: round(esperas[min(len(esperas) - 1, int(len(esperas) * p))] * 1000, 2) if esperas else 0
+            return {
+                'maximo': self.maximo,
+                'en_uso': len(self.prestadas),
+                'libres': len(self.libres),
+                'checkouts': self.checkouts,
+                'creadas': self.creadas,
+                'descartadas': self.descartadas,
+                'timeouts': self.timeouts,
+                'espera_ms': {
+                    'media': round(self.espera_total / self.checkouts * 1000, 2) if self.checkouts else 0,
+                    'p50': percentil(0.5),
+                    'p95': percentil(0.95),
+                    'p99': percentil(0.99),
+                    'max': round(self.espera_max * 1000, 2),
+                },
+            }
+
+
+def pool_de(wrapper):
+    """Pool del alias en este proceso (tras un fork no se heredan las conexiones)"""
+    clave = (wrapper.alias, os.getpid())
+    with _pools_lock:
+        if clave not in _pools:
+            opciones = wrapper.settings_dict.get('POOL', {})
+            _pools[clave] = Pool(
+                wrapper.alias,
+                maximo=opciones.get('MAX_SIZE', 10),
+                max_libres=opciones.get('MAX_IDLE', 5),
+                timeout=opciones.get('TIMEOUT', 10),
+                max_inactiva=opciones.get('MAX_IDLE_TIME', 300),
+                health_checks=opciones.get('HEALTH_CHECKS', True),
+            )
+        return _pools[clave]
+
+
+def estadisticas():
+    """Métricas de los pools de este proceso, por alias"""
+    pid = os.getpid()
+    return {alias: pool.estadisticas() for (alias, dueno), pool in list(_pools.items()) if dueno == pid}
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def get_new_connection(self, conn_params):
+        return pool_de(self).obtener(lambda: super(DatabaseWrapper, self).get_new_connection(conn_params))
+
+    def _close(self):
+        if self.connection is not None:
+            pool_de(self).devolver(self.connection)
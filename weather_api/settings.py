@@ -54,14 +54,31 @@ TEMPLATES = [
 WSGI_APPLICATION = 'weather_api.wsgi.application'
 
 # Database
+# Conexiones: persistent = una conexión persistente por hilo (CONN_MAX_AGE);
+# pool = pool compartido por proceso (weather_api.db_pool, métricas en
+# /api/metricas/db/); pgbouncer = DB_HOST apunta a pgbouncer en modo transaction
+DB_POOL_MODE = config('DB_POOL_MODE', default='persistent')
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': 'weather_api.db_pool' if DB_POOL_MODE == 'pool' else 'django.db.backends.postgresql',
         'NAME': config('DB_NAME', default='weather_db'),
         'USER': config('DB_USER', default='postgres'),
         'PASSWORD': config('DB_PASSWORD', default='postgres'),
         'HOST': config('DB_HOST', default='db'),
         'PORT': config('DB_PORT', default='5432'),
+        # Con pool la conexión vuelve al pool al terminar cada petición o tarea
+        'CONN_MAX_AGE': 0 if DB_POOL_MODE == 'pool' else config('DB_CONN_MAX_AGE', default=60, cast=int),
+        'CONN_HEALTH_CHECKS': True,
+        # pgbouncer en modo transaction no admite cursores con nombre
+        'DISABLE_SERVER_SIDE_CURSORS': DB_POOL_MODE == 'pgbouncer',
+        'POOL': {
+            'MAX_SIZE': config('DB_POOL_MAX_SIZE', default=10, cast=int),
+            'MAX_IDLE': config('DB_POOL_MAX_IDLE', default=5, cast=int),
+            'TIMEOUT': config('DB_POOL_TIMEOUT', default=10, cast=float),
+            'MAX_IDLE_TIME': config('DB_POOL_MAX_IDLE_TIME', default=300, cast=int),
+            'HEALTH_CHECKS': config('DB_POOL_HEALTH_CHECKS', default=True, cast=bool),
+        },
     }
 }
 
@@ -84,6 +101,31 @@ CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = 'UTC'
 
+# Cache de respuestas (Redis, con caché en memoria local como respaldo)
+CACHE_URL = config('CACHE_URL', default=config('REDIS_URL', default='redis://redis:6379/0'))
+CACHE_TIMEOUT = config('CACHE_TIMEOUT', default=6 * 60 * 60, cast=int)
+CACHE_LOCAL_TIMEOUT = config('CACHE_LOCAL_TIMEOUT', default=60, cast=int)
+# Segundos sin intentar Redis después de un error (evita pagar el timeout en cada request)
+CACHE_FALLBACK_SECONDS = config('CACHE_FALLBACK_SECONDS', default=30, cast=int)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': CACHE_URL,
+        'KEY_PREFIX': 'skycast',
+        'OPTIONS': {
+            'socket_connect_timeout': 1,
+            'socket_timeout': 1,
+        },
+    } if CACHE_URL.startswith(('redis://', 'rediss://', 'unix://')) else {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'skycast-default',
+    },
+    'local': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'skycast-local',
+    },
+}
+
 # CORS
 CORS_ALLOW_ALL_ORIGINS = True
 
@@ -95,6 +137,12 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 # Media files
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# django: Django envía los bytes (con Range); x-accel: nginx (location internal
+# en MEDIA_ACCEL_PREFIX con alias a MEDIA_ROOT); x-sendfile: Apache/lighttpd
+MEDIA_SERVING = config('MEDIA_SERVING', default='django')
+MEDIA_ACCEL_PREFIX = config('MEDIA_ACCEL_PREFIX', default='/protected-media/')
+MEDIA_CACHE_MAX_AGE = config('MEDIA_CACHE_MAX_AGE', default=365 * 24 * 60 * 60, cast=int)
+MEDIA_CACHE_MAX_AGE_MUTABLE = config('MEDIA_CACHE_MAX_AGE_MUTABLE', default=300, cast=int)
 
 # Internationalization
 LANGUAGE_CODE = 'es-es'
@@ -107,3 +155,62 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # Weather API Configuration
 WEATHER_API_BASE_URL = 'https://yaku.ohmc.ar/public/'
 WEATHER_UPDATE_INTERVAL = 3600  # 1 hora en segundos
+
+# Descargas concurrentes de imágenes OHMC
+OHMC_DOWNLOAD_WORKERS = config('OHMC_DOWNLOAD_WORKERS', default=8, cast=int)
+OHMC_DOWNLOAD_PER_HOST = config('OHMC_DOWNLOAD_PER_HOST', default=4, cast=int)
+OHMC_DOWNLOAD_BATCH_SIZE = config('OHMC_DOWNLOAD_BATCH_SIZE', default=200, cast=int)
+OHMC_MAX_IMAGE_BYTES = config('OHMC_MAX_IMAGE_BYTES', default=25 * 1024 * 1024, cast=int)
+
+# Registro de descargas fallidas: espera base * 2^(intentos-1), con tope, y
+# se abandona la URL tras OHMC_FALLAS_MAX_INTENTOS fallos consecutivos
+OHMC_FALLAS_BACKOFF_BASE = config('OHMC_FALLAS_BACKOFF_BASE', default=15 * 60, cast=int)
+OHMC_FALLAS_BACKOFF_MAX = config('OHMC_FALLAS_BACKOFF_MAX', default=24 * 60 * 60, cast=int)
+OHMC_FALLAS_MAX_INTENTOS = config('OHMC_FALLAS_MAX_INTENTOS', default=8, cast=int)
+
+# Backfill de imágenes faltantes: presupuesto por pasada y tamaño de lote
+BACKFILL_MAX_BYTES = config('BACKFILL_MAX_BYTES', default=500 * 1024 * 1024, cast=int)
+BACKFILL_MAX_SEGUNDOS = config('BACKFILL_MAX_SEGUNDOS', default=15 * 60, cast=int)
+BACKFILL_CHUNK_SIZE = config('BACKFILL_CHUNK_SIZE', default=200, cast=int)
+
+# Retención de productos (TipoProducto.retencion_dias la ajusta por tipo)
+RETENCION_DIAS_DEFAULT = config('RETENCION_DIAS_DEFAULT', default=30, cast=int)
+RETENCION_LOTE = config('RETENCION_LOTE', default=5000, cast=int)
+# Horas sin uso antes de borrar una imagen huérfana (los shards pueden reutilizarla antes de confirmar)
+HUERFANOS_GRACIA_HORAS = config('HUERFANOS_GRACIA_HORAS', default=24, cast=int)
+
+# Cliente HTTP compartido para OHMC (keep-alive, reintentos con backoff)
+OHMC_HTTP_CONNECT_TIMEOUT = config('OHMC_HTTP_CONNECT_TIMEOUT', default=5, cast=float)
+OHMC_HTTP_READ_TIMEOUT = config('OHMC_HTTP_READ_TIMEOUT', default=30, cast=float)
+OHMC_HTTP_RETRIES = config('OHMC_HTTP_RETRIES', default=3, cast=int)
+OHMC_HTTP_BACKOFF = config('OHMC_HTTP_BACKOFF', default=0.5, cast=float)
+OHMC_HTTP_BACKOFF_JITTER = config('OHMC_HTTP_BACKOFF_JITTER', default=0.5, cast=float)
+OHMC_HTTP_POOL_CONNECTIONS = config('OHMC_HTTP_POOL_CONNECTIONS', default=4, cast=int)
+OHMC_HTTP_POOL_MAXSIZE = config('OHMC_HTTP_POOL_MAXSIZE', default=16, cast=int)
+
+# Descubrimiento de frames WRF publicados antes de programar descargas:
+# auto = índices de Apache (con sonda HEAD si no hay índice), head = sólo
+# sonda HEAD de un frame centinela por celda, off = enumerar todas las URLs
+OHMC_DISCOVERY = config('OHMC_DISCOVERY', default='auto')
+
+# Ingesta en bloque de productos y fechas
+PRODUCTOS_BULK_BATCH_SIZE = config('PRODUCTOS_BULK_BATCH_SIZE', default=1000, cast=int)
+
+# sync_all_data: celdas WRF (fecha, corrida, variable) por shard del chord
+SYNC_WRF_CELDAS_POR_SHARD = config('SYNC_WRF_CELDAS_POR_SHARD', default=1, cast=int)
+
+# Variantes reducidas de las imágenes (WebP, ancho máximo en px por tamaño)
+IMAGEN_DERIVADAS = {
+    'thumb': config('IMAGEN_DERIVADA_THUMB', default=160, cast=int),
+    'small': config('IMAGEN_DERIVADA_SMALL', default=480, cast=int),
+    'medium': config('IMAGEN_DERIVADA_MEDIUM', default=1024, cast=int),
+}
+IMAGEN_DERIVADAS_CALIDAD = config('IMAGEN_DERIVADAS_CALIDAD', default=80, cast=int)
+IMAGEN_DERIVADAS_LOTE = config('IMAGEN_DERIVADAS_LOTE', default=50, cast=int)
+
+# Animaciones WRF por corrida y variable (WebP animado o GIF). El formato es
+# fijo: de él depende el nombre guardado, que no debe variar según el Pillow instalado
+WRF_ANIMACION_FORMATO = config('WRF_ANIMACION_FORMATO', default='webp')  # webp | gif
+WRF_ANIMACION_FRAME_MS = config('WRF_ANIMACION_FRAME_MS', default=500, cast=int)
+WRF_ANIMACION_CALIDAD = config('WRF_ANIMACION_CALIDAD', default=80, cast=int)
+WRF_ANIMACION_ANCHO_MAX = config('WRF_ANIMACION_ANCHO_MAX', default=1024, cast=int)
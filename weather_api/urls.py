@@ -1,16 +1,15 @@
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, re_path, include
 from django.conf import settings
-from django.conf.urls.static import static
+from productos.media import serve_media
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('productos.urls')),
+    # Media en todos los entornos: en producción con X-Accel-Redirect/X-Sendfile
+    re_path(r'^%s(?P<path>.+)$' % settings.MEDIA_URL.lstrip('/'), serve_media, name='media'),
 ]
 
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
-
 # Personalizar el admin
 admin.site.site_header = "OHMC - Productos Meteorológicos"
 admin.site.site_title = "OHMC Admin"